@@ -0,0 +1,27 @@
+import os
+import cv2
+
+# cv2.dnn không đọc được Keras .h5/PyTorch .pth: thử file export cùng tên với các đuôi này
+EXPORT_EXTENSIONS = ('.onnx', '.pb', '.caffemodel', '.tflite')
+
+
+class ModelUnavailableError(RuntimeError):
+    """Không tải được trọng số model (thiếu file, file rỗng hoặc định dạng không hỗ trợ)"""
+
+
+def load_dnn_net(weights_path):
+    """Tải file trọng số OpenCV đọc được (chính file đó hoặc bản export cùng tên).
+
+    Returns:
+        tuple: (đường dẫn file đã tải, cv2.dnn.Net)
+    """
+    base = os.path.splitext(weights_path)[0]
+    candidates = [weights_path] + [base + ext for ext in EXPORT_EXTENSIONS]
+    for candidate in candidates:
+        if not os.path.isfile(candidate) or os.path.getsize(candidate) == 0:
+            continue
+        try:
+            return candidate, cv2.dnn.readNet(candidate)
+        except cv2.error:
+            continue
+    raise ModelUnavailableError(f"No readable model for {weights_path}")
@@ -0,0 +1,169 @@
+import math
+import warnings
+import numpy as np
+
+MAX_SHIFT_SECONDS = 3.0  # Độ lệch thời gian tối đa cho phép quanh đường chéo (bề rộng band)
+COST_CHUNK_ROWS = 1024  # Số hàng tính cost mỗi lần để giới hạn bộ nhớ tạm
+VELOCITY_CLIP = 5.0  # body/s
+
+DIAG, UP, LEFT = 0, 1, 2
+
+
+def frame_descriptors(features):
+    """Vector mô tả mỗi frame: góc khớp (/180) và tốc độ từng điểm (cắt ở VELOCITY_CLIP), shape (T, D)"""
+    angles = np.asarray(features.angles, dtype=np.float32) / 180.0
+    if angles.size:
+        # Góc thiếu (không thấy khớp) thay bằng trung bình của khớp đó để không làm lệch khoảng cách
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            column_mean = np.nanmean(angles, axis=0)
+        angles = np.where(np.isnan(angles), np.nan_to_num(column_mean, nan=0.5), angles)
+    velocity = np.clip(np.asarray(features.velocity, dtype=np.float32), 0.0, VELOCITY_CLIP) / VELOCITY_CLIP
+    return np.concatenate([angles, velocity], axis=1)
+
+
+def _band_starts(n, m, width):
+    """Cột bắt đầu band của mỗi hàng: band bám theo đường chéo (0,0)-(n-1,m-1)"""
+    centers = np.round(np.arange(n) * ((m - 1) / (n - 1) if n > 1 else 0.0)).astype(np.int64)
+    return np.clip(centers - width // 2, 0, m - width)
+
+
+def banded_dtw(x, y, max_shift):
+    """DTW trong band Sakoe-Chiba: bộ nhớ O(n·band) thay vì O(n·m).
+
+    Args:
+        x: (n, D) chuỗi học viên
+        y: (m, D) chuỗi mẫu
+        max_shift: số mẫu lệch tối đa mỗi phía của đường chéo
+
+    Returns:
+        tuple: (path_x (L,), path_y (L,), tổng cost)
+    """
+    n, m = x.shape[0], y.shape[0]
+    # Band phải đủ rộng để mỗi hàng nối được với hàng trước: band dịch tối đa ceil((m-1)/(n-1))
+    # cột mỗi hàng (clip mẫu ngắn so với video mẫu dài), cộng thêm max_shift mỗi phía
+    slope = (m - 1) / (n - 1) if n > 1 else m
+    width = min(m, 2 * max(int(max_shift), 1) + 1 + int(math.ceil(slope)))
+    starts = _band_starts(n, m, width)
+    offsets = np.arange(width)
+
+    # Cost cục bộ trong band, tính theo khối hàng bằng phép toán mảng
+    cost = np.empty((n, width), dtype=np.float32)
+    for begin in range(0, n, COST_CHUNK_ROWS):
+        end = min(begin + COST_CHUNK_ROWS, n)
+        cols = starts[begin:end, None] + offsets
+        cost[begin:end] = np.linalg.norm(x[begin:end, None, :] - y[cols], axis=-1)
+
+    direction = np.empty((n, width), dtype=np.int8)
+    inf_pad = np.full(width + 1, np.inf, dtype=np.float64)
+
+    # Hàng đầu: chỉ đi ngang từ (0, 0)
+    previous = np.cumsum(cost[0].astype(np.float64))
+    direction[0] = LEFT
+    direction[0, 0] = DIAG
+
+    for i in range(1, n):
+        shift = int(starts[i] - starts[i - 1])
+        # previous_ext[k] = D[i-1, starts[i-1] + k - 1] (k=0 là cột ngoài band bên trái)
+        previous_ext = inf_pad.copy()
+        previous_ext[1:] = previous
+        upper = np.full(width, np.inf)
+        diagonal = np.full(width, np.inf)
+        k = offsets + shift
+        valid_up = k < width
+        upper[valid_up] = previous_ext[k[valid_up] + 1]
+        valid_diag = k <= width
+        diagonal[valid_diag] = previous_ext[k[valid_diag]]
+
+        row_cost = cost[i].astype(np.float64)
+        from_prev = np.minimum(diagonal, upper) + row_cost
+        # Bước ngang trong cùng hàng: D[j] = C[j] + min_{k<=j}(from_prev[k] - C[k]), C là cumsum cost
+        csum = np.cumsum(row_cost)
+        current = csum + np.minimum.accumulate(from_prev - csum)
+
+        row_direction = np.where(diagonal <= upper, DIAG, UP).astype(np.int8)
+        row_direction[current < from_prev] = LEFT
+        direction[i] = row_direction
+        previous = current
+
+    total_cost = float(previous[m - 1 - starts[-1]])
+
+    # Lần ngược từ (n-1, m-1) về (0, 0)
+    path_x, path_y = [], []
+    i, j = n - 1, m - 1
+    while True:
+        path_x.append(i)
+        path_y.append(j)
+        if i == 0 and j == 0:
+            break
+        # Giữ j trong band của hàng (phòng trường hợp cost vô cực làm hướng đi không xác định)
+        j = min(max(j, int(starts[i])), int(starts[i]) + width - 1)
+        step = direction[i, j - starts[i]]
+        if step == DIAG:
+            i, j = i - 1, j - 1
+        elif step == UP:
+            i -= 1
+        else:
+            j -= 1
+        if i < 0 or j < 0:
+            break
+    return np.array(path_x[::-1]), np.array(path_y[::-1]), total_cost
+
+
+def align(features, reference, total_moves=1, max_shift_seconds=MAX_SHIFT_SECONDS):
+    """Căn chỉnh chuỗi chuyển động học viên theo video mẫu.
+
+    Video mẫu được chia đều thành `total_moves` động tác; với mỗi động tác, thời điểm bắt
+    đầu phía học viên lấy theo đường DTW. Độ lệch tính tương đối so với động tác đầu nên
+    thời gian chuẩn bị trước khi vào bài không bị tính là chậm.
+
+    Returns:
+        dict: path_x, path_y, cost, moves [{move, reference_start, student_start, offset, duration_ratio}],
+              timing_error, timing_score; None nếu không đủ dữ liệu
+    """
+    if features.frame_count < 2 or reference.frame_count < 2:
+        return None
+    if features.angles.shape[1] != reference.angles.shape[1]:
+        return None
+
+    x, y = frame_descriptors(features), frame_descriptors(reference)
+    fps = max(float(reference.sample_fps), 1.0)
+    path_x, path_y, cost = banded_dtw(x, y, max_shift=int(round(max_shift_seconds * fps)))
+
+    total_moves = max(int(total_moves or 1), 1)
+    ref_ts = np.asarray(reference.timestamps, dtype=np.float64)
+    stu_ts = np.asarray(features.timestamps, dtype=np.float64)
+    boundaries = np.linspace(0, y.shape[0], total_moves + 1).astype(np.int64)
+
+    # Frame học viên đầu tiên khớp với mỗi mốc (path_y không giảm nên searchsorted được)
+    ref_index = np.minimum(boundaries, y.shape[0] - 1)
+    student_index = path_x[np.minimum(np.searchsorted(path_y, ref_index, side='left'), path_x.shape[0] - 1)]
+    ref_start, stu_start = ref_ts[ref_index], stu_ts[student_index]
+    ref_end = np.append(ref_start[1:-1], ref_ts[-1])
+    stu_end = np.append(stu_start[1:-1], stu_ts[-1])
+
+    offsets = (stu_start[:-1] - stu_start[0]) - (ref_start[:-1] - ref_start[0])
+    ref_duration = np.maximum(ref_end - ref_start[:-1], 1e-3)
+    duration_ratio = np.maximum(stu_end - stu_start[:-1], 0.0) / ref_duration
+
+    move_duration = float(ref_duration.mean())
+    timing_error = float(np.mean(np.abs(offsets)) / move_duration + np.mean(np.abs(np.log(np.maximum(duration_ratio, 1e-3)))))
+
+    moves = [
+        {
+            'move': k + 1,
+            'reference_start': round(float(ref_start[k]), 2),
+            'student_start': round(float(stu_start[k]), 2),
+            'offset': round(float(offsets[k]), 2),
+            'duration_ratio': round(float(duration_ratio[k]), 2),
+        }
+        for k in range(total_moves)
+    ]
+    return {
+        'path_x': path_x,
+        'path_y': path_y,
+        'cost': cost / path_x.shape[0],
+        'moves': moves,
+        'timing_error': timing_error,
+        'timing_score': round(100.0 * math.exp(-timing_error), 2),
+    }
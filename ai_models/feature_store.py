@@ -0,0 +1,46 @@
+import json
+import os
+import numpy as np
+
+from ai_models.motion_analysis import MotionFeatures
+
+ARRAY_FIELDS = ('timestamps', 'keypoints', 'confidence', 'velocity', 'angles', 'stability', 'energy')
+META_FILE = 'meta.json'
+
+
+def save_features(features, directory, extra_meta=None):
+    """Ghi MotionFeatures ra thư mục: mỗi mảng một file .npy (mmap được), metadata ở meta.json"""
+    os.makedirs(directory, exist_ok=True)
+    for name in ARRAY_FIELDS:
+        np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(getattr(features, name)))
+
+    meta = {
+        'sample_fps': features.sample_fps,
+        'keypoint_names': list(features.keypoint_names),
+        'angle_names': list(features.angle_names),
+        'source': features.source,
+    }
+    meta.update(extra_meta or {})
+    with open(os.path.join(directory, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def load_meta(directory):
+    with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_features(directory, mmap=True):
+    """Đọc MotionFeatures; mặc định memory-map read-only nên không copy dữ liệu vào RAM"""
+    meta = load_meta(directory)
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r' if mmap else None)
+        for name in ARRAY_FIELDS
+    }
+    return MotionFeatures(
+        sample_fps=meta['sample_fps'],
+        keypoint_names=tuple(meta['keypoint_names']),
+        angle_names=tuple(meta['angle_names']),
+        source=meta['source'],
+        **arrays
+    )
@@ -0,0 +1,152 @@
+import multiprocessing
+import time
+
+from ai_models import ModelUnavailableError
+from ai_models import motion_analysis, score_calculator, alignment
+from ai_models.feature_store import load_features
+from ai_models.weapon_detection import get_weapon_detector, DEFAULT_WEIGHTS_PATH as DEFAULT_WEAPON_WEIGHTS_PATH
+
+# Cấu hình model của process hiện tại (được _init_worker gán khi process khởi động)
+_settings = {}
+
+
+def _init_worker(settings):
+    """Khởi động worker: tải trọng số một lần cho cả vòng đời process"""
+    _settings.clear()
+    _settings.update(settings)
+    try:
+        _weapon_detector()
+    except ModelUnavailableError as e:
+        print(f"Weapon model unavailable: {e}")
+    _motion_estimator()
+
+
+def _weapon_detector():
+    return get_weapon_detector(
+        _settings.get('weapon_model_path') or DEFAULT_WEAPON_WEIGHTS_PATH,
+        batch_size=_settings.get('weapon_batch_size', 16)
+    )
+
+
+def _motion_estimator():
+    return motion_analysis.get_motion_estimator(
+        _settings.get('motion_model_path') or motion_analysis.DEFAULT_WEIGHTS_PATH,
+        batch_size=_settings.get('motion_batch_size', 8)
+    )
+
+
+def motion_source():
+    """Nguồn keypoint ('pose' hoặc 'silhouette') của estimator trong worker"""
+    return _motion_estimator().source
+
+
+def analyze_motion(video_path):
+    return motion_analysis.analyze_video(
+        video_path,
+        estimator=_motion_estimator(),
+        sample_fps=_settings.get('motion_sample_fps', 10),
+        roi=_settings.get('roi')
+    )
+
+
+def detect_weapon(video_path, expected_weapon):
+    """Nhận diện binh khí; chưa có model thì trả về binh khí của bài võ với độ tin cậy 0"""
+    try:
+        detector = _weapon_detector()
+    except ModelUnavailableError:
+        return expected_weapon, 0.0
+
+    result = detector.detect(
+        video_path,
+        stride=_settings.get('weapon_frame_stride', 15),
+        max_frames=_settings.get('weapon_max_frames', 64),
+        roi=_settings.get('roi')
+    )
+    return result['label'], result['confidence']
+
+
+def analyze_training_video(job):
+    """Toàn bộ phân tích một video (chạy trong worker, không đụng tới database).
+
+    Args:
+        job: dict video_path, expected_weapon, reference_dir (thư mục cache đặc trưng video mẫu
+             hoặc None), difficulty_score, pass_threshold, duration_seconds, total_moves
+
+    Returns:
+        dict: weapon_detected, weapon_confidence, scores, key_frames, errors_detected,
+              timing (None nếu không có video mẫu), processing_time_seconds
+    """
+    started = time.monotonic()
+    weapon_detected, weapon_confidence = detect_weapon(job['video_path'], job['expected_weapon'])
+    motion = analyze_motion(job['video_path'])
+
+    reference = load_features(job['reference_dir']) if job.get('reference_dir') else None
+    aligned = None
+    if reference is not None:
+        aligned = alignment.align(motion, reference, total_moves=job.get('total_moves', 1))
+
+    scores = score_calculator.calculate_scores(
+        motion,
+        reference=reference,
+        difficulty_score=job.get('difficulty_score'),
+        pass_threshold=job.get('pass_threshold'),
+        expected_duration=job.get('duration_seconds'),
+        alignment=aligned
+    )
+
+    key_frames = motion_analysis.detect_key_frames(motion)
+    if _settings.get('key_frame_folder'):
+        motion_analysis.save_key_frame_images(job['video_path'], key_frames, _settings['key_frame_folder'])
+
+    return {
+        'weapon_detected': weapon_detected,
+        'weapon_confidence': weapon_confidence,
+        'scores': scores,
+        'key_frames': key_frames,
+        'errors_detected': motion_analysis.detect_errors(motion),
+        'timing': {'moves': aligned['moves'], 'timing_score': aligned['timing_score']} if aligned else None,
+        'processing_time_seconds': max(round(time.monotonic() - started, 2), 0.01),
+    }
+
+
+class InferencePool:
+    """Pool process chạy suy luận, tách khỏi process web.
+
+    Mỗi worker tải model một lần khi khởi động (_init_worker) và được thay mới sau
+    `max_jobs_per_worker` job để chặn bộ nhớ phình dần. processes=0 chạy ngay trong
+    process hiện tại (dev/debug).
+    """
+
+    def __init__(self, settings, processes=1, max_jobs_per_worker=50, timeout=None):
+        self.processes = max(int(processes), 0)
+        self.timeout = timeout
+        self._motion_source = None
+        if self.processes:
+            # spawn: không fork process web đang chạy nhiều thread
+            context = multiprocessing.get_context('spawn')
+            self._pool = context.Pool(
+                self.processes,
+                initializer=_init_worker,
+                initargs=(dict(settings),),
+                maxtasksperchild=max_jobs_per_worker or None
+            )
+        else:
+            self._pool = None
+            _init_worker(dict(settings))
+
+    def call(self, func, *args):
+        """Chạy func(*args) trên một worker và chờ kết quả (ném lại lỗi của worker)"""
+        if self._pool is None:
+            return func(*args)
+        return self._pool.apply_async(func, args).get(self.timeout)
+
+    def motion_source(self):
+        if self._motion_source is None:
+            self._motion_source = self.call(motion_source)
+        return self._motion_source
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
@@ -0,0 +1,453 @@
+import os
+import threading
+import uuid
+import warnings
+from dataclasses import dataclass, field
+import cv2
+import numpy as np
+
+from ai_models import ModelUnavailableError, load_dnn_net
+from ai_models.video_reader import VideoReader, iter_frames
+
+WEIGHTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights')
+DEFAULT_WEIGHTS_PATH = os.path.join(WEIGHTS_DIR, 'motion_model.pth')
+
+# Layout COCO-17 của model pose (heatmap, thứ tự kênh như dưới)
+POSE_KEYPOINTS = (
+    'nose', 'left_eye', 'right_eye', 'left_ear', 'right_ear',
+    'left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
+    'left_wrist', 'right_wrist', 'left_hip', 'right_hip',
+    'left_knee', 'right_knee', 'left_ankle', 'right_ankle',
+)
+# Góc khớp: (tên, điểm đầu, đỉnh góc, điểm cuối)
+POSE_ANGLES = (
+    ('left_elbow', 5, 7, 9),
+    ('right_elbow', 6, 8, 10),
+    ('left_shoulder', 11, 5, 7),
+    ('right_shoulder', 12, 6, 8),
+    ('left_hip', 5, 11, 13),
+    ('right_hip', 6, 12, 14),
+    ('left_knee', 11, 13, 15),
+    ('right_knee', 12, 14, 16),
+)
+POSE_INPUT_SIZE = (192, 256)  # (width, height)
+POSE_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(1, 3, 1, 1)
+POSE_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(1, 3, 1, 1)
+MIN_KEYPOINT_CONFIDENCE = 0.2
+
+# Layout rút gọn khi không có model pose: điểm cực của bóng người (background subtraction)
+SILHOUETTE_KEYPOINTS = ('head', 'left_hand', 'right_hand', 'left_foot', 'right_foot', 'center')
+SILHOUETTE_ANGLES = (
+    ('arm_spread', 1, 5, 2),
+    ('stance', 3, 5, 4),
+)
+SILHOUETTE_WIDTH = 320
+MIN_SILHOUETTE_AREA = 0.01  # Tỷ lệ diện tích khung hình
+
+# Ngưỡng phát hiện lỗi (đơn vị: chiều cao cơ thể, giây)
+STABILITY_ACC_LIMIT = 8.0  # Gia tốc trọng tâm (body/s²) coi như mất thăng bằng hoàn toàn
+UNSTABLE_THRESHOLD = 0.5
+MIN_ERROR_SECONDS = 0.5
+IDLE_ENERGY = 0.05  # body/s
+MIN_IDLE_SECONDS = 2.0
+JERK_SIGMA = 4.0
+
+
+@dataclass
+class MotionFeatures:
+    """Đặc trưng chuyển động của cả clip, mỗi mảng có trục đầu là thời gian (T mẫu)"""
+    sample_fps: float
+    timestamps: np.ndarray  # (T,) giây
+    keypoints: np.ndarray  # (T, K, 2) tọa độ chuẩn hóa [0, 1], NaN nếu không thấy
+    confidence: np.ndarray  # (T, K)
+    velocity: np.ndarray  # (T, K) tốc độ từng điểm, đơn vị chiều cao cơ thể / giây
+    angles: np.ndarray  # (T, J) độ, NaN nếu thiếu điểm
+    stability: np.ndarray  # (T,) 0-1, 1 là trọng tâm ổn định
+    energy: np.ndarray  # (T,) tốc độ trung bình các điểm
+    keypoint_names: tuple = field(default=())
+    angle_names: tuple = field(default=())
+    source: str = 'silhouette'
+
+    @property
+    def frame_count(self):
+        return int(self.timestamps.shape[0])
+
+    @property
+    def tracked(self):
+        """(T,) bool: frame có thấy người tập"""
+        return np.any(self.confidence >= MIN_KEYPOINT_CONFIDENCE, axis=1)
+
+
+class PoseEstimator:
+    """Keypoint COCO-17 từ model heatmap chạy bằng cv2.dnn (bản export ONNX của motion_model)"""
+
+    keypoint_names = POSE_KEYPOINTS
+    angle_triples = POSE_ANGLES
+    source = 'pose'
+    reader_options = {'size': POSE_INPUT_SIZE}  # Decoder thu nhỏ sẵn về kích thước đầu vào
+
+    def __init__(self, weights_path=DEFAULT_WEIGHTS_PATH, batch_size=8):
+        self.weights_path, self.net = load_dnn_net(weights_path)
+        self.batch_size = max(int(batch_size), 1)
+        self._lock = threading.Lock()
+
+    def new_stream(self):
+        return _BatchedPoseStream(self)
+
+    def predict_batch(self, frames):
+        """(N, K, 2) tọa độ chuẩn hóa và (N, K) độ tin cậy cho một batch frame"""
+        blob = cv2.dnn.blobFromImages(frames, scalefactor=1.0 / 255, size=POSE_INPUT_SIZE, swapRB=True, crop=False)
+        blob = (blob - POSE_MEAN) / POSE_STD
+        with self._lock:
+            self.net.setInput(blob)
+            heatmaps = self.net.forward()
+
+        n, k = len(frames), len(POSE_KEYPOINTS)
+        heatmaps = heatmaps[:, :k]
+        height, width = heatmaps.shape[2:]
+        flat = heatmaps.reshape(n, k, -1)
+        peak = flat.argmax(axis=2)
+        confidence = np.take_along_axis(flat, peak[..., None], axis=2)[..., 0]
+        points = np.stack([(peak % width + 0.5) / width, (peak // width + 0.5) / height], axis=-1)
+        return points.astype(np.float32), confidence.astype(np.float32)
+
+
+class _BatchedPoseStream:
+    """Gom frame thành batch cho PoseEstimator trong một buffer cấp phát sẵn"""
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.batch = np.empty((estimator.batch_size, POSE_INPUT_SIZE[1], POSE_INPUT_SIZE[0], 3), dtype=np.uint8)
+        self.filled = 0
+
+    def push(self, frame):
+        self.batch[self.filled] = frame
+        self.filled += 1
+        if self.filled >= self.estimator.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        if not self.filled:
+            return []
+        points, confidence = self.estimator.predict_batch(list(self.batch[:self.filled]))
+        self.filled = 0
+        return list(zip(points, confidence))
+
+
+class SilhouetteEstimator:
+    """Điểm cực của bóng người (đầu, hai tay, hai chân, trọng tâm) qua background subtraction.
+
+    Dùng khi chưa có model pose; chỉ chính xác với camera đặt cố định.
+    """
+
+    keypoint_names = SILHOUETTE_KEYPOINTS
+    angle_triples = SILHOUETTE_ANGLES
+    source = 'silhouette'
+    reader_options = {'max_width': SILHOUETTE_WIDTH}
+
+    def new_stream(self):
+        return _SilhouetteStream()
+
+
+class _SilhouetteStream:
+
+    def __init__(self):
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(history=200, varThreshold=25, detectShadows=False)
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+
+    def push(self, frame):
+        mask = self.subtractor.apply(frame)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.kernel)
+
+        k = len(SILHOUETTE_KEYPOINTS)
+        points = np.full((k, 2), np.nan, dtype=np.float32)
+        confidence = np.zeros(k, dtype=np.float32)
+
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+        if contours:
+            contour = max(contours, key=cv2.contourArea)
+            area_ratio = cv2.contourArea(contour) / float(mask.shape[0] * mask.shape[1])
+            if MIN_SILHOUETTE_AREA <= area_ratio < 0.9:
+                pts = contour[:, 0, :].astype(np.float32)
+                xs, ys = pts[:, 0], pts[:, 1]
+                # Điểm chân: phần thấp nhất 10% chiều cao bóng người
+                y_min, y_max = ys.min(), ys.max()
+                feet = pts[ys >= y_max - 0.1 * (y_max - y_min)]
+                points[0] = pts[ys.argmin()]
+                points[1] = pts[xs.argmin()]
+                points[2] = pts[xs.argmax()]
+                points[3] = feet[feet[:, 0].argmin()]
+                points[4] = feet[feet[:, 0].argmax()]
+                moments = cv2.moments(contour)
+                points[5] = (moments['m10'] / moments['m00'], moments['m01'] / moments['m00'])
+                points /= np.array([mask.shape[1], mask.shape[0]], dtype=np.float32)
+                confidence[:] = 1.0
+        return [(points, confidence)]
+
+    def flush(self):
+        return []
+
+
+_pose_estimator = None
+_pose_error = None
+_pose_lock = threading.Lock()
+
+
+def get_motion_estimator(weights_path=DEFAULT_WEIGHTS_PATH, batch_size=8):
+    """PoseEstimator dùng chung trong process (tải trọng số một lần), hoặc SilhouetteEstimator nếu không có model"""
+    global _pose_estimator, _pose_error
+    if _pose_estimator is None and _pose_error is None:
+        with _pose_lock:
+            if _pose_estimator is None and _pose_error is None:
+                try:
+                    _pose_estimator = PoseEstimator(weights_path, batch_size=batch_size)
+                except (ModelUnavailableError, cv2.error) as e:
+                    _pose_error = e
+    if _pose_estimator is not None:
+        return _pose_estimator
+    return SilhouetteEstimator()
+
+
+def extract_keypoints(video_path, estimator, sample_fps=10, roi=None):
+    """Stream frame qua estimator; chỉ giữ keypoint, không giữ frame.
+
+    Decoder cắt `roi` và thu nhỏ theo estimator.reader_options trước khi trả frame.
+
+    Returns:
+        tuple: (timestamps (T,), keypoints (T, K, 2), confidence (T, K))
+    """
+    timestamps, points, confidences = [], [], []
+    stream = estimator.new_stream()
+    for _, timestamp, frame in iter_frames(video_path, sample_fps=sample_fps, roi=roi, **estimator.reader_options):
+        timestamps.append(timestamp)
+        for p, c in stream.push(frame):
+            points.append(p)
+            confidences.append(c)
+    for p, c in stream.flush():
+        points.append(p)
+        confidences.append(c)
+
+    k = len(estimator.keypoint_names)
+    if not timestamps:
+        raise IOError(f"No frames decoded from video: {video_path}")
+    keypoints = np.asarray(points, dtype=np.float32).reshape(-1, k, 2)
+    confidence = np.asarray(confidences, dtype=np.float32).reshape(-1, k)
+    keypoints[confidence < MIN_KEYPOINT_CONFIDENCE] = np.nan
+    return np.asarray(timestamps, dtype=np.float64), keypoints, confidence
+
+
+def _smooth(values, window=3):
+    """Trung bình trượt theo trục thời gian (cumsum), bỏ qua NaN"""
+    if values.shape[0] < window:
+        return values
+    valid = ~np.isnan(values)
+    pad = [(window // 2, window - 1 - window // 2)] + [(0, 0)] * (values.ndim - 1)
+
+    def moving_sum(arr):
+        csum = np.cumsum(np.pad(arr, pad, mode='edge'), axis=0)
+        csum = np.concatenate([np.zeros_like(csum[:1]), csum])
+        return csum[window:] - csum[:-window]
+
+    sums = moving_sum(np.where(valid, values, 0.0))
+    counts = moving_sum(valid.astype(np.float64))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def _joint_angles(keypoints, triples):
+    """(T, J) góc tại đỉnh của từng bộ ba điểm, tính một lần cho cả clip"""
+    if not triples:
+        return np.empty((keypoints.shape[0], 0), dtype=np.float32)
+    idx = np.array([t[1:] for t in triples])
+    a, b, c = keypoints[:, idx[:, 0]], keypoints[:, idx[:, 1]], keypoints[:, idx[:, 2]]
+    v1, v2 = a - b, c - b
+    dot = np.sum(v1 * v2, axis=-1)
+    norm = np.linalg.norm(v1, axis=-1) * np.linalg.norm(v2, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cosine = np.clip(dot / norm, -1.0, 1.0)
+    return np.degrees(np.arccos(cosine)).astype(np.float32)
+
+
+def compute_features(timestamps, keypoints, confidence, estimator):
+    """Tính velocity, góc khớp, độ ổn định trên toàn clip bằng phép toán mảng"""
+    t = keypoints.shape[0]
+    sample_fps = (t - 1) / (timestamps[-1] - timestamps[0]) if t > 1 and timestamps[-1] > timestamps[0] else 1.0
+
+    smoothed = _smooth(keypoints)
+
+    # Chuẩn hóa theo chiều cao cơ thể (trung vị theo clip) để không phụ thuộc khoảng cách camera
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # Frame không thấy người: toàn NaN
+        heights = np.nanmax(smoothed[..., 1], axis=1) - np.nanmin(smoothed[..., 1], axis=1)
+        center = np.nanmean(smoothed, axis=1)
+    heights = heights[np.isfinite(heights) & (heights > 0)]
+    body_height = float(np.median(heights)) if heights.size else 1.0
+
+    displacement = np.zeros((t, keypoints.shape[1]), dtype=np.float32)
+    if t > 1:
+        displacement[1:] = np.linalg.norm(np.diff(smoothed, axis=0), axis=-1)
+    velocity = np.nan_to_num(displacement * sample_fps / body_height)
+
+    acceleration = np.zeros(t, dtype=np.float32)
+    if t > 2:
+        acceleration[1:-1] = np.linalg.norm(np.diff(center, n=2, axis=0), axis=-1) * sample_fps ** 2 / body_height
+    stability = np.clip(1.0 - np.nan_to_num(acceleration, nan=STABILITY_ACC_LIMIT) / STABILITY_ACC_LIMIT, 0.0, 1.0)
+
+    tracked = np.any(confidence >= MIN_KEYPOINT_CONFIDENCE, axis=1)
+    energy = np.where(tracked, velocity.mean(axis=1), 0.0)
+    stability = np.where(tracked, stability, 0.0)
+
+    return MotionFeatures(
+        sample_fps=float(sample_fps),
+        timestamps=timestamps,
+        keypoints=keypoints,
+        confidence=confidence,
+        velocity=velocity.astype(np.float32),
+        angles=_joint_angles(smoothed, estimator.angle_triples),
+        stability=stability.astype(np.float32),
+        energy=energy.astype(np.float32),
+        keypoint_names=tuple(estimator.keypoint_names),
+        angle_names=tuple(a[0] for a in estimator.angle_triples),
+        source=estimator.source,
+    )
+
+
+def analyze_video(video_path, estimator=None, sample_fps=10, roi=None):
+    """Phân tích chuyển động cả video, bộ nhớ chỉ tỷ lệ với số keypoint chứ không với số frame ảnh"""
+    estimator = estimator or get_motion_estimator()
+    timestamps, keypoints, confidence = extract_keypoints(video_path, estimator, sample_fps=sample_fps, roi=roi)
+    return compute_features(timestamps, keypoints, confidence, estimator)
+
+
+def _segments(mask, min_length):
+    """Các đoạn liên tiếp True dài ít nhất min_length mẫu: [(start, end_exclusive)]"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    keep = ends - starts >= max(int(min_length), 1)
+    return list(zip(starts[keep], ends[keep]))
+
+
+def _format_seconds(seconds):
+    return f"{seconds:.1f}".rstrip('0').rstrip('.')
+
+
+def detect_key_frames(features, max_frames=8, min_gap_seconds=1.0):
+    """Key frame là các đỉnh năng lượng chuyển động, cách nhau ít nhất min_gap_seconds"""
+    energy = _smooth(features.energy.astype(np.float64))
+    if energy.shape[0] < 3:
+        return []
+
+    # Cực đại địa phương, so sánh cả mảng một lần
+    middle = energy[1:-1]
+    peaks = np.flatnonzero(
+        (middle > energy[:-2]) & (middle >= energy[2:]) & (middle > IDLE_ENERGY) & features.tracked[1:-1]
+    ) + 1
+    peaks = peaks[np.argsort(-energy[peaks])]
+
+    min_gap = max(int(round(min_gap_seconds * features.sample_fps)), 1)
+    selected = []
+    for idx in peaks:
+        if all(abs(idx - s) >= min_gap for s in selected):
+            selected.append(int(idx))
+        if len(selected) >= max_frames:
+            break
+
+    key_frames = []
+    for idx in sorted(selected):
+        stability = float(features.stability[idx])
+        score = round(100 * (0.6 * stability + 0.4 * float(np.mean(features.confidence[idx] >= MIN_KEYPOINT_CONFIDENCE))), 2)
+        timestamp = round(float(features.timestamps[idx]), 1)
+        if stability >= 0.8:
+            note = "Tư thế vững"
+        elif stability >= UNSTABLE_THRESHOLD:
+            note = "Cần giữ trọng tâm ổn định hơn"
+        else:
+            note = "Mất thăng bằng"
+        key_frames.append({
+            "timestamp": timestamp,
+            "description": f"Động tác mạnh tại giây {_format_seconds(timestamp)}",
+            "score": score,
+            "note": note
+        })
+    return key_frames
+
+
+def save_key_frame_images(video_path, key_frames, folder, max_width=480):
+    """Seek tới từng key frame và lưu ảnh JPEG; gán đường dẫn vào key_frame['image']"""
+    if not key_frames:
+        return key_frames
+    os.makedirs(folder, exist_ok=True)
+    by_time = {frame['timestamp']: frame for frame in key_frames}
+    prefix = uuid.uuid4().hex
+    with VideoReader(video_path, max_width=max_width) as reader:
+        for timestamp, image in reader.read_at(list(by_time)):
+            path = os.path.join(folder, f"{prefix}_{int(timestamp * 1000)}.jpg")
+            if cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 80]):
+                by_time[timestamp]['image'] = path.replace(os.sep, '/')
+    return key_frames
+
+
+def detect_errors(features):
+    """Lỗi có mốc thời gian: mất thăng bằng, động tác giật, ngừng quá lâu, không thấy người tập"""
+    if features.frame_count == 0:
+        return []
+
+    fps = features.sample_fps
+    ts = features.timestamps
+    tracked = features.tracked
+    errors = []
+
+    def span(start, end):
+        return f"{_format_seconds(ts[start])}-{_format_seconds(ts[end - 1])}"
+
+    if not tracked.any():
+        return [{"type": "visibility", "description": "Không phát hiện người tập trong video", "severity": "high", "start": 0.0, "end": round(float(ts[-1]), 1)}]
+
+    for start, end in _segments(~tracked, MIN_ERROR_SECONDS * fps):
+        errors.append({
+            "type": "visibility",
+            "description": f"Không thấy rõ người tập tại giây {span(start, end)}",
+            "severity": "medium",
+            "start": round(float(ts[start]), 1),
+            "end": round(float(ts[end - 1]), 1)
+        })
+
+    unstable = tracked & (features.stability < UNSTABLE_THRESHOLD)
+    for start, end in _segments(unstable, MIN_ERROR_SECONDS * fps):
+        severity = "high" if float(features.stability[start:end].mean()) < UNSTABLE_THRESHOLD / 2 else "medium"
+        errors.append({
+            "type": "posture",
+            "description": f"Tư thế chưa vững tại giây {span(start, end)}",
+            "severity": severity,
+            "start": round(float(ts[start]), 1),
+            "end": round(float(ts[end - 1]), 1)
+        })
+
+    # Chỉ xét đoạn dừng nằm giữa bài (đầu/cuối video thường là chuẩn bị và kết thúc)
+    active = np.flatnonzero(tracked & (features.energy > IDLE_ENERGY))
+    if active.size:
+        idle = np.zeros_like(tracked)
+        idle[active[0]:active[-1] + 1] = tracked[active[0]:active[-1] + 1] & (features.energy[active[0]:active[-1] + 1] <= IDLE_ENERGY)
+        for start, end in _segments(idle, MIN_IDLE_SECONDS * fps):
+            errors.append({
+                "type": "timing",
+                "description": f"Ngừng động tác quá lâu tại giây {span(start, end)}",
+                "severity": "low",
+                "start": round(float(ts[start]), 1),
+                "end": round(float(ts[end - 1]), 1)
+            })
+
+    jerk = np.abs(np.diff(features.energy))
+    if jerk.size > 1 and jerk.std() > 0:
+        spikes = np.flatnonzero((jerk > jerk.mean() + JERK_SIGMA * jerk.std()) & tracked[1:] & tracked[:-1]) + 1
+        for idx in spikes[:5]:
+            errors.append({
+                "type": "movement",
+                "description": f"Động tác giật, chưa mượt mà tại giây {_format_seconds(ts[idx])}",
+                "severity": "low",
+                "start": round(float(ts[idx]), 1),
+                "end": round(float(ts[idx]), 1)
+            })
+
+    return sorted(errors, key=lambda e: e["start"])
@@ -0,0 +1,143 @@
+import math
+import warnings
+import numpy as np
+
+MODEL_VERSION = '1.0'
+
+# Số điểm lấy mẫu lại khi so sánh chuỗi có độ dài khác nhau
+RESAMPLE_POINTS = 100
+ANGLE_TOLERANCE = 30.0  # Lệch góc khớp trung bình (độ) ứng với sai số 1.0
+JERK_TOLERANCE = 2.0  # Độ giật tương đối ứng với sai số 1.0 khi không có video mẫu
+
+
+def model_version(features):
+    """Chuỗi ghi vào AIAnalysisResult.ai_model_version (tối đa 20 ký tự)"""
+    return f"wrts-{MODEL_VERSION}-{features.source}"[:20]
+
+
+def routine_weights(difficulty_score=1.0, pass_threshold=70.0):
+    """Trọng số (technique, posture, timing) và độ khắt khe theo bài võ.
+
+    Bài khó dồn trọng số vào kỹ thuật; ngưỡng đạt cao thì điểm giảm nhanh hơn theo sai số.
+
+    Returns:
+        tuple: (weights ndarray (3,), strictness float)
+    """
+    difficulty = min(max(float(difficulty_score or 1.0), 1.0), 10.0)
+    level = (difficulty - 1.0) / 9.0
+    weights = np.array([0.40 + 0.15 * level, 0.35 - 0.05 * level, 0.25 - 0.10 * level])
+    weights /= weights.sum()
+
+    threshold = min(max(float(pass_threshold or 70.0), 0.0), 100.0)
+    strictness = (0.5 + threshold / 100.0) * (0.9 + 0.02 * difficulty)
+    return weights, strictness
+
+
+def _resample(values, points=RESAMPLE_POINTS):
+    """Nội suy tuyến tính chuỗi (T, ...) về `points` mẫu theo trục thời gian (NaN được giữ nguyên)"""
+    values = np.asarray(values, dtype=np.float64)
+    if values.shape[0] == 1:
+        return np.repeat(values, points, axis=0)
+    position = np.linspace(0.0, values.shape[0] - 1, points)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, values.shape[0] - 1)
+    frac = (position - lower).reshape((points,) + (1,) * (values.ndim - 1))
+    return values[lower] * (1.0 - frac) + values[upper] * frac
+
+
+def _nanmean(values, default):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        result = float(np.nanmean(values)) if np.size(values) else math.nan
+    return default if math.isnan(result) else result
+
+
+def _duration(features):
+    ts = features.timestamps
+    return float(ts[-1] - ts[0]) if ts.shape[0] > 1 else 0.0
+
+
+def _errors(features, reference=None, expected_duration=None, alignment=None):
+    """Sai số chuẩn hóa (technique, posture, timing); 0 là khớp hoàn toàn"""
+    tracked = features.tracked
+    if not tracked.any():
+        return np.array([math.inf, math.inf, math.inf])
+
+    has_reference = (
+        reference is not None
+        and reference.frame_count > 1
+        and reference.angles.shape[1] == features.angles.shape[1]
+        and reference.tracked.any()
+    )
+
+    if has_reference:
+        # Posture: trọng tâm kém ổn định hơn video mẫu (từng cặp frame) + thiếu frame thấy người tập so với mẫu;
+        # ổn định bằng/hơn mẫu không bị trừ
+        if alignment is not None:
+            stability = features.stability[alignment['path_x']].astype(np.float64)
+            ref_stability = reference.stability[alignment['path_y']].astype(np.float64)
+        else:
+            stability, ref_stability = _resample(features.stability), _resample(reference.stability)
+        stability_gap = _nanmean(np.clip(ref_stability - stability, 0.0, None), 0.0)
+        posture = stability_gap * 2.0 + max(reference.tracked.mean() - tracked.mean(), 0.0)
+    else:
+        # Posture: trọng tâm không ổn định + tỷ lệ frame không thấy người tập
+        posture = (1.0 - _nanmean(features.stability[tracked], 0.0)) * 2.0 + (1.0 - tracked.mean())
+
+    if has_reference and alignment is not None:
+        # So góc khớp từng cặp frame đã căn chỉnh DTW, nhịp lấy từ độ lệch từng động tác
+        angle_diff = np.abs(features.angles[alignment['path_x']] - reference.angles[alignment['path_y']])
+        technique = _nanmean(angle_diff, ANGLE_TOLERANCE * 2) / ANGLE_TOLERANCE
+        timing = alignment['timing_error']
+    elif has_reference:
+        angle_diff = np.abs(_resample(features.angles) - _resample(reference.angles))
+        technique = _nanmean(angle_diff, ANGLE_TOLERANCE * 2) / ANGLE_TOLERANCE
+
+        energy, ref_energy = _resample(features.energy), _resample(reference.energy)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            correlation = np.corrcoef(energy, ref_energy)[0, 1]
+        correlation = 0.0 if math.isnan(correlation) else correlation
+        ref_duration = _duration(reference)
+        duration_ratio = _duration(features) / ref_duration if ref_duration > 0 else 1.0
+        timing = (1.0 - correlation) + abs(math.log(max(duration_ratio, 1e-3)))
+    else:
+        # Không có video mẫu: kỹ thuật theo độ mượt, nhịp theo thời lượng chuẩn của bài
+        jerk = np.abs(np.diff(features.energy[tracked]))
+        mean_energy = _nanmean(features.energy[tracked], 0.0)
+        technique = (_nanmean(jerk, 0.0) / mean_energy / JERK_TOLERANCE) if mean_energy > 0 else 1.0
+        duration = _duration(features)
+        if expected_duration and duration > 0:
+            timing = abs(math.log(duration / float(expected_duration)))
+        else:
+            timing = 0.5
+
+    return np.array([technique, posture, timing], dtype=np.float64)
+
+
+def calculate_scores(features, reference=None, difficulty_score=1.0, pass_threshold=70.0, expected_duration=None,
+                     alignment=None):
+    """Tính cả bốn điểm trong một lượt: điểm thành phần = 100·exp(-sai số·độ khắt khe), tổng = trung bình có trọng số.
+
+    Args:
+        features: MotionFeatures của video học viên
+        reference: MotionFeatures của video mẫu (None nếu không có)
+        alignment: kết quả alignment.align(features, reference) nếu đã tính
+
+    Returns:
+        dict: technique_score, posture_score, timing_score, overall_score, passed, model_version
+    """
+    weights, strictness = routine_weights(difficulty_score, pass_threshold)
+    errors = _errors(features, reference, expected_duration, alignment)
+    components = 100.0 * np.exp(-np.clip(errors, 0.0, None) * strictness)
+    overall = float(weights @ components)
+    technique, posture, timing = np.round(components, 2).tolist()
+
+    return {
+        'technique_score': technique,
+        'posture_score': posture,
+        'timing_score': timing,
+        'overall_score': round(overall, 2),
+        'passed': overall >= float(pass_threshold or 70.0),
+        'model_version': model_version(features),
+    }
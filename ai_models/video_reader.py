@@ -0,0 +1,145 @@
+import cv2
+import numpy as np
+
+# Khoảng cách (số frame) tối đa đi tiếp bằng grab() thay vì seek: seek trên video GOP dài
+# phải decode lại từ keyframe trước đó nên với khoảng ngắn đọc tiếp rẻ hơn
+MAX_GRAB_GAP = 90
+
+
+class VideoReader:
+    """Decode video cho phân tích: lấy mẫu theo fps, cắt ROI và thu nhỏ trước khi trả frame.
+
+    Frame trả về là buffer NumPy cấp phát một lần và được ghi đè ở lần đọc sau
+    (decode thẳng vào buffer gốc, cv2.resize ghi vào buffer đích), nên đọc video dài
+    không cấp phát mảng mới cho mỗi frame. Cần giữ frame thì phải .copy().
+
+    Args:
+        size: (width, height) đầu ra cố định
+        max_width: thu nhỏ giữ tỷ lệ nếu rộng hơn (bỏ qua khi có size)
+        roi: (x, y, w, h) theo tỷ lệ [0, 1] của khung hình, cắt trước khi thu nhỏ
+    """
+
+    def __init__(self, video_path, size=None, max_width=None, roi=None):
+        self.video_path = video_path
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise IOError(f"Cannot open video: {video_path}")
+
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        self._roi = self._roi_pixels(roi)
+        roi_w, roi_h = self._roi[2], self._roi[3]
+        if size:
+            self.output_size = (int(size[0]), int(size[1]))
+        elif max_width and roi_w > max_width:
+            self.output_size = (int(max_width), max(int(round(roi_h * max_width / roi_w)), 1))
+        else:
+            self.output_size = (roi_w, roi_h)
+
+        self._raw = None
+        self._out = None
+        self._position = 0  # Chỉ số frame sẽ được decode tiếp theo
+
+    def _roi_pixels(self, roi):
+        if not roi:
+            return (0, 0, self.width, self.height)
+        x, y, w, h = roi
+        left = min(max(int(x * self.width), 0), self.width - 1)
+        top = min(max(int(y * self.height), 0), self.height - 1)
+        right = min(max(int((x + w) * self.width), left + 1), self.width)
+        bottom = min(max(int((y + h) * self.height), top + 1), self.height)
+        return (left, top, right - left, bottom - top)
+
+    @property
+    def duration(self):
+        return self.frame_count / self.fps if self.fps > 0 else 0.0
+
+    def _retrieve(self):
+        """Decode frame vừa grab() vào buffer gốc rồi cắt/thu nhỏ vào buffer đầu ra"""
+        ret, raw = self.cap.retrieve(self._raw)
+        if not ret or raw is None:
+            return None
+        self._raw = raw  # Lần đầu OpenCV cấp phát, các lần sau ghi đè vào đây
+
+        x, y, w, h = self._roi
+        view = raw[y:y + h, x:x + w]
+        if (w, h) == self.output_size:
+            return view
+        if self._out is None:
+            self._out = np.empty((self.output_size[1], self.output_size[0], 3), dtype=np.uint8)
+        cv2.resize(view, self.output_size, dst=self._out, interpolation=cv2.INTER_AREA)
+        return self._out
+
+    def frames(self, stride=1, sample_fps=None, max_frames=None):
+        """Yield (frame_index, timestamp_seconds, frame) mỗi `stride` frame từ vị trí hiện tại.
+
+        Frame bị bỏ qua chỉ grab() (không chuyển sang BGR). Nếu có `sample_fps`, stride
+        được tính theo fps thật của video.
+        """
+        if sample_fps:
+            stride = round(self.fps / sample_fps)
+        stride = max(int(stride or 1), 1)
+
+        yielded = 0
+        while max_frames is None or yielded < max_frames:
+            index = self._position
+            if not self.cap.grab():
+                break
+            self._position += 1
+            if index % stride:
+                continue
+
+            frame = self._retrieve()
+            if frame is None:
+                break
+            yield index, index / self.fps, frame
+            yielded += 1
+
+    def read_at(self, timestamps):
+        """Yield (timestamp, frame) tại các mốc thời gian (giây), dùng để lấy ảnh key frame.
+
+        Mốc gần vị trí hiện tại thì đọc tiếp bằng grab(), mốc xa thì seek.
+        """
+        for timestamp in sorted(timestamps):
+            target = int(round(timestamp * self.fps))
+            if self.frame_count:
+                target = min(target, self.frame_count - 1)
+
+            if target < self._position or target - self._position > MAX_GRAB_GAP:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                self._position = target
+            while self._position < target:
+                if not self.cap.grab():
+                    return
+                self._position += 1
+
+            if not self.cap.grab():
+                return
+            self._position += 1
+            frame = self._retrieve()
+            if frame is None:
+                return
+            yield timestamp, frame
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_frames(video_path, stride=1, max_frames=None, sample_fps=None, size=None, max_width=None, roi=None):
+    """Đọc tuần tự video, yield (frame_index, timestamp_seconds, frame) mỗi `stride` frame.
+
+    Frame là buffer dùng lại của VideoReader (xem VideoReader).
+    """
+    with VideoReader(video_path, size=size, max_width=max_width, roi=roi) as reader:
+        yield from reader.frames(stride=stride, sample_fps=sample_fps, max_frames=max_frames)
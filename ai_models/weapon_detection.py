@@ -0,0 +1,133 @@
+import os
+import threading
+import cv2
+import numpy as np
+
+from ai_models import ModelUnavailableError, load_dnn_net
+from ai_models.video_reader import VideoReader
+
+WEIGHTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights')
+DEFAULT_WEIGHTS_PATH = os.path.join(WEIGHTS_DIR, 'weapon_model.h5')
+
+# Thứ tự lớp đầu ra của model (trùng Weapon.weapon_name_en); ghi đè bằng file <weights>.labels.txt
+DEFAULT_LABELS = ('Sword', 'Spear', 'Staff', 'Halberd')
+
+INPUT_SIZE = (224, 224)
+
+
+class WeaponDetector:
+    """Nhận diện binh khí trong video: lấy mẫu frame, suy luận theo batch, bỏ phiếu.
+
+    Một instance giữ một cv2.dnn.Net; Net không thread-safe nên forward() được khóa,
+    các worker dùng chung một instance qua get_weapon_detector().
+    """
+
+    def __init__(self, weights_path=DEFAULT_WEIGHTS_PATH, labels=None, batch_size=16):
+        self.weights_path, self.net = load_dnn_net(weights_path)
+        self.labels = tuple(labels or WeaponDetector._load_labels(weights_path))
+        self.batch_size = max(int(batch_size), 1)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_labels(weights_path):
+        labels_path = os.path.splitext(weights_path)[0] + '.labels.txt'
+        if os.path.isfile(labels_path):
+            with open(labels_path, encoding='utf-8') as f:
+                labels = [line.strip() for line in f if line.strip()]
+            if labels:
+                return labels
+        return DEFAULT_LABELS
+
+    def predict_batch(self, frames):
+        """Xác suất theo lớp cho một batch frame BGR, shape (len(frames), len(labels))"""
+        blob = cv2.dnn.blobFromImages(frames, scalefactor=1.0 / 255, size=INPUT_SIZE, swapRB=True, crop=False)
+        with self._lock:
+            self.net.setInput(blob)
+            output = self.net.forward()
+
+        scores = output.reshape(len(frames), -1)[:, :len(self.labels)].astype(np.float32)
+        # Model xuất logits thì chuẩn hóa bằng softmax; đã là xác suất thì giữ nguyên
+        if scores.min() < 0 or not np.allclose(scores.sum(axis=1), 1.0, atol=1e-3):
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            scores /= scores.sum(axis=1, keepdims=True)
+        return scores
+
+    @staticmethod
+    def _sample_frames(reader, stride, max_frames):
+        """Frame lấy mẫu: biết số frame thì seek tới các mốc cách đều (giữa mỗi đoạn),
+        không biết thì đọc tuần tự mỗi `stride` frame"""
+        stride = max(int(stride or 1), 1)
+        if not reader.frame_count or not max_frames:
+            for _, _, frame in reader.frames(stride=stride, max_frames=max_frames):
+                yield frame
+            return
+
+        count = min(max_frames, max(reader.frame_count // stride, 1))
+        step = reader.frame_count / count
+        timestamps = [int((i + 0.5) * step) / reader.fps for i in range(count)]
+        for _, frame in reader.read_at(timestamps):
+            yield frame
+
+    def detect(self, video_path, stride=15, max_frames=64, roi=None):
+        """Nhận diện binh khí chính trong video.
+
+        Mỗi frame lấy mẫu bỏ một phiếu cho lớp có xác suất cao nhất. Độ tin cậy là
+        xác suất trung bình của lớp thắng trên mọi frame, nên video mà các frame
+        không thống nhất sẽ có confidence thấp. `roi` (x, y, w, h theo tỷ lệ) giới hạn
+        vùng khung hình được phân tích.
+
+        Tối đa max_frames frame, cách nhau ít nhất `stride` frame, trải đều trên cả video
+        (bài võ dài tới hàng chục phút, không chỉ lấy đoạn mở đầu).
+
+        Returns:
+            dict: label, confidence (0-100), frames_analyzed, votes {label: số phiếu}
+        """
+        batches = []
+        # Buffer batch cấp phát một lần; reader đã thu nhỏ frame về INPUT_SIZE trước khi trả
+        batch = np.empty((self.batch_size, INPUT_SIZE[1], INPUT_SIZE[0], 3), dtype=np.uint8)
+        filled = 0
+        with VideoReader(video_path, size=INPUT_SIZE, roi=roi) as reader:
+            for frame in WeaponDetector._sample_frames(reader, stride, max_frames):
+                batch[filled] = frame
+                filled += 1
+                if filled == self.batch_size:
+                    batches.append(self.predict_batch(list(batch)))
+                    filled = 0
+        if filled:
+            batches.append(self.predict_batch(list(batch[:filled])))
+
+        if not batches:
+            raise IOError(f"No frames decoded from video: {video_path}")
+
+        probs = np.concatenate(batches)
+        votes = np.bincount(probs.argmax(axis=1), minlength=len(self.labels))
+        winner = int(votes.argmax())
+        return {
+            'label': self.labels[winner],
+            'confidence': round(float(probs[:, winner].mean()) * 100, 2),
+            'frames_analyzed': int(probs.shape[0]),
+            'votes': {label: int(count) for label, count in zip(self.labels, votes) if count},
+        }
+
+
+_detector = None
+_detector_error = None
+_detector_lock = threading.Lock()
+
+
+def get_weapon_detector(weights_path=DEFAULT_WEIGHTS_PATH, batch_size=16):
+    """Detector dùng chung trong process; trọng số chỉ tải một lần.
+
+    Lỗi tải model cũng được nhớ lại để không thử đọc file hỏng ở mỗi job.
+    """
+    global _detector, _detector_error
+    if _detector is None and _detector_error is None:
+        with _detector_lock:
+            if _detector is None and _detector_error is None:
+                try:
+                    _detector = WeaponDetector(weights_path, batch_size=batch_size)
+                except (ModelUnavailableError, cv2.error) as e:
+                    _detector_error = ModelUnavailableError(str(e))
+    if _detector_error is not None:
+        raise _detector_error
+    return _detector
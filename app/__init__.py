@@ -1,9 +1,13 @@
-from flask import Flask
+from flask import Flask, url_for
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
 from app.models import db
 from app.config import Config
 from datetime import datetime
+import click
+import os
+import posixpath
+import threading
 
 
 migrate = Migrate()
@@ -30,6 +34,15 @@ def create_app():
             'now': lambda: get_vietnam_time_naive()
         }
     
+    # Jinja global: hls_js() -> (src, integrity) của hls.js cho trình phát
+    @app.context_processor
+    def inject_hls_js():
+        def hls_js():
+            if os.path.isfile(os.path.join(app.static_folder, 'js', 'hls.min.js')):
+                return url_for('static', filename='js/hls.min.js'), None
+            return app.config['HLS_JS_CDN_URL'], app.config.get('HLS_JS_INTEGRITY')
+        return {'hls_js': hls_js}
+    
     # Jinja filters
     from app.utils.helpers import nl2br
     app.jinja_env.filters['nl2br'] = nl2br
@@ -53,6 +66,9 @@ def create_app():
     from app.routes.admin import admin_bp
     from app.routes.manager import manager_bp
     from app.routes.shared import shared_bp
+    from app.routes.uploads import uploads_bp
+    from app.routes.media import media_bp
+    from app.routes.monitor import monitor_bp
     
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(student_bp, url_prefix='/student')
@@ -61,5 +77,211 @@ def create_app():
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(manager_bp, url_prefix='/manager')
     app.register_blueprint(shared_bp)
+    app.register_blueprint(uploads_bp)
+    app.register_blueprint(media_bp)
+    app.register_blueprint(monitor_bp)
+    
+    # Video/ảnh upload chỉ phục vụ qua /media (kiểm tra quyền). File cũ chưa chạy
+    # `flask media-migrate` vẫn nằm trong static/uploads: không cho tải thẳng.
+    @app.before_request
+    def block_legacy_uploads():
+        from flask import request, abort
+        if request.endpoint == 'static':
+            filename = posixpath.normpath((request.view_args or {}).get('filename', '').replace('\\', '/'))
+            if filename.lstrip('/').split('/', 1)[0].lower() == 'uploads':
+                abort(404)
+    
+    # Đo độ trễ request / SQL cho /metrics
+    if app.config.get('MONITOR_ENABLED', True):
+        from app.services.system_monitor_service import SystemMonitorService
+        SystemMonitorService.init_app(app)
+    
+    # Cache số liệu thống kê, tự xóa khi commit video/điểm/ghi danh/lớp/user mới
+    from app.utils.cache import AnalyticsCache
+    AnalyticsCache.init_app(app)
+    
+    # Profiler SQL / phát hiện N+1 (chỉ hoạt động khi debug hoặc SQL_PROFILER_ENABLED)
+    from app.utils.sql_profiler import SQLProfiler
+    SQLProfiler.init_app(app)
+    
+    # AI analysis workers: khởi động ở request đầu tiên (không chạy khi `flask db ...`
+    # hay ở process cha của reloader)
+    workers_lock = threading.Lock()
+    
+    @app.before_request
+    def start_analysis_workers():
+        if app.extensions.get('analysis_workers') is not None:
+            return
+        with workers_lock:
+            if app.extensions.get('analysis_workers') is not None:
+                return
+            if not app.config.get('ANALYSIS_WORKER_AUTOSTART') or app.config.get('ANALYSIS_WORKERS', 0) <= 0:
+                app.extensions['analysis_workers'] = False
+                return
+            from app.services.analysis_queue_service import AnalysisWorkerPool
+            app.extensions['analysis_workers'] = AnalysisWorkerPool(app).start()
+    
+    @app.cli.command('analysis-worker')
+    def analysis_worker():
+        """Chạy worker phân tích AI riêng (foreground)"""
+        from app.services.analysis_queue_service import AnalysisWorkerPool
+        pool = AnalysisWorkerPool(app).start()
+        print(f"Analysis worker đang chạy với {pool.size} thread...")
+        try:
+            pool.join()
+        except KeyboardInterrupt:
+            pool.stop(timeout=30)
+    
+    @app.cli.command('media-migrate')
+    def media_migrate():
+        """Chuyển file upload cũ ở static/uploads sang UPLOAD_FOLDER (chỉ phục vụ qua /media)"""
+        from app.services.storage_service import StorageService
+        stats = StorageService.migrate_legacy_uploads()
+        print(f"Đã chuyển {stats['files_moved']} file, sửa {stats['rows_updated']} đường dẫn trong database"
+              + (f", bỏ qua {stats['files_skipped']} file đã có ở thư mục mới" if stats['files_skipped'] else ''))
+    
+    @app.cli.command('upload-cleanup')
+    @click.option('--hours', type=int, default=None, help='Xóa phiên upload không hoạt động quá N giờ (mặc định UPLOAD_SESSION_TTL_HOURS)')
+    def upload_cleanup(hours):
+        """Dọn phiên upload dang dở/bỏ dở cùng file tạm của chúng (chạy định kỳ bằng cron)"""
+        from app.services.upload_service import UploadService
+        removed = UploadService.cleanup_stale_uploads(hours)
+        print(f"Đã xóa {removed} phiên upload quá hạn")
+    
+    @app.cli.command('storage-dedup')
+    def storage_dedup():
+        """Chuyển video cũ vào kho theo nội dung, gộp file trùng và dọn blob không còn dùng"""
+        from app.services.storage_service import StorageService
+        imported = StorageService.import_existing()
+        print(f"Đã chuyển {imported['files_imported']} file vào kho ({imported['duplicates_removed']} file trùng đã gộp)")
+        collected = StorageService.collect_garbage()
+        print(f"Đã xóa {collected['blobs_removed']} blob và {collected['files_removed']} file không còn dùng "
+              f"({collected['bytes_freed'] / (1024 * 1024):.1f}MB)")
+    
+    @app.cli.command('storage-tier')
+    @click.option('--days', type=int, default=None, help='Chuyển video đã chấm cũ hơn N ngày (mặc định COLD_ARCHIVE_AFTER_DAYS)')
+    def storage_tier(days):
+        """Chuyển video gốc đã chấm, lâu không xem sang tầng cold (chạy định kỳ bằng cron)"""
+        from app.services.tiering_service import TieringService
+        stats = TieringService.run_lifecycle(days)
+        print(f"Đã chuyển {stats['blobs_archived']} video sang tầng cold: "
+              f"{stats['bytes_archived'] / (1024 * 1024):.1f}MB -> {stats['bytes_compressed'] / (1024 * 1024):.1f}MB")
+    
+    @app.cli.command('score-summary-rebuild')
+    def score_summary_rebuild():
+        """Tính lại bảng tổng hợp điểm học viên (student_score_summary) từ video/kết quả AI/điểm chấm"""
+        from app.services.score_summary_service import ScoreSummaryService
+        rows = ScoreSummaryService.rebuild()
+        print(f"Đã tính lại {rows} dòng tổng hợp điểm")
+    
+    @app.cli.command('analytics-rollup')
+    @click.option('--rebuild', is_flag=True, help='Xóa và tính lại toàn bộ từ bảng gốc')
+    def analytics_rollup(rebuild):
+        """Gom số liệu xu hướng theo ngày/tuần cho biểu đồ (chạy định kỳ bằng cron)"""
+        from app.services.trend_rollup_service import TrendRollupService
+        days = TrendRollupService.rebuild() if rebuild else TrendRollupService.refresh(force=True)
+        print(f"Đã tính lại rollup của {days} ngày")
+    
+    @app.cli.command('sql-report')
+    @click.option('--top', type=int, default=20, help='Số nhóm N+1 hiển thị')
+    def sql_report(top):
+        """Tổng hợp các N+1 đã ghi trong SQL_PROFILER_REPORT, nặng nhất trước"""
+        import json
+        path = app.config.get('SQL_PROFILER_REPORT')
+        if not path or not os.path.exists(path):
+            print('Chưa có báo cáo SQL (chạy app ở chế độ debug hoặc đặt SQL_PROFILER_ENABLED=1)')
+            return
+        groups = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                report = json.loads(line)
+                for suspect in report['n_plus_one']:
+                    key = (report['endpoint'], suspect['origins'][0].rsplit(' x', 1)[0])
+                    group = groups.setdefault(key, {'requests': 0, 'max_count': 0, 'statement': suspect['statement']})
+                    group['requests'] += 1
+                    group['max_count'] = max(group['max_count'], suspect['count'])
+        for (endpoint, origin), group in sorted(groups.items(), key=lambda item: item[1]['max_count'], reverse=True)[:top]:
+            print(f"{endpoint}  {origin}  tối đa {group['max_count']} lần/request, {group['requests']} request")
+            print(f"    {group['statement'][:160]}")
+    
+    @app.cli.command('query-budget-check')
+    def query_budget_check():
+        """Mở các trang danh sách bằng tài khoản nhiều dữ liệu nhất, so số query với SQL_QUERY_BUDGETS"""
+        from sqlalchemy import func
+        from app.models import db, TrainingVideo, Class, ClassEnrollment
+        
+        # Số query của trang danh sách phải như nhau dù có 10 hay 10.000 dòng: thử với tài khoản nặng nhất
+        student_id = db.session.query(TrainingVideo.student_id).group_by(
+            TrainingVideo.student_id
+        ).order_by(func.count(TrainingVideo.video_id).desc()).limit(1).scalar()
+        instructor_id = db.session.query(Class.instructor_id).join(
+            ClassEnrollment, ClassEnrollment.class_id == Class.class_id
+        ).group_by(Class.instructor_id).order_by(func.count(ClassEnrollment.enrollment_id).desc()).limit(1).scalar()
+        pages = (
+            ('student_videos.history', '/student/videos/history', student_id, 'STUDENT'),
+            ('instructor.pending_evaluations', '/instructor/evaluations/pending?show_all=true', instructor_id, 'INSTRUCTOR'),
+        )
+        
+        app.config['SQL_PROFILER_ENABLED'] = True
+        budgets = app.config.get('SQL_QUERY_BUDGETS') or {}
+        client = app.test_client()
+        failed = False
+        for endpoint, url, user_id, role_code in pages:
+            if user_id is None:
+                print(f"{endpoint}: bỏ qua (chưa có dữ liệu)")
+                continue
+            # Request dùng chung app context của lệnh: bỏ session cũ để không đọc object đã nạp
+            db.session.remove()
+            with client.session_transaction() as sess:
+                sess['user_id'] = user_id
+                sess['role_code'] = role_code
+            response = client.get(url)
+            queries = int(response.headers.get('X-SQL-Queries', 0))
+            budget = budgets.get(endpoint, app.config.get('SQL_QUERY_BUDGET'))
+            ok = response.status_code == 200 and (budget is None or queries <= budget)
+            failed = failed or not ok
+            print(f"{'OK  ' if ok else 'FAIL'} {endpoint} (user {user_id}): HTTP {response.status_code}, "
+                  f"{queries} query, ngân sách {budget}")
+        if failed:
+            raise SystemExit(1)
+    
+    @app.cli.command('backup-create')
+    @click.option('--workers', type=int, default=None, help='Số thread nén chunk')
+    def backup_create(workers):
+        """Sao lưu database + video (tăng dần, chỉ chép file mới)"""
+        from app.services.backup_service import BackupService
+        stats = BackupService.create_backup(workers)
+        print(f"Snapshot {stats['snapshot_id']}: {stats['tables']} bảng, {stats['files']} file "
+              f"({stats['files_changed']} file mới/đổi, đọc {stats['bytes_read'] / (1024 * 1024):.1f}MB, "
+              f"ghi {stats['chunks_written']} chunk {stats['bytes_written'] / (1024 * 1024):.1f}MB)")
+    
+    @app.cli.command('backup-list')
+    def backup_list():
+        """Liệt kê các snapshot sao lưu"""
+        from app.services.backup_service import BackupService
+        for snapshot in BackupService.list_snapshots():
+            print(f"{snapshot['snapshot_id']}  {snapshot['created_at']}  {snapshot['file_count']} file  "
+                  f"{snapshot['total_bytes'] / (1024 * 1024):.1f}MB")
+    
+    @app.cli.command('backup-restore')
+    @click.argument('target_dir')
+    @click.option('--snapshot', 'snapshot_id', default=None, help='ID snapshot (mặc định: mới nhất)')
+    @click.option('--at', default=None, help='Khôi phục trạng thái tại thời điểm, vd 2025-01-31T23:00')
+    @click.option('--prefix', default=None, help='Chỉ khôi phục file có đường dẫn bắt đầu bằng prefix')
+    def backup_restore(target_dir, snapshot_id, at, prefix):
+        """Khôi phục snapshot ra thư mục TARGET_DIR (không ghi đè dữ liệu đang chạy)"""
+        from app.services.backup_service import BackupService
+        at = datetime.fromisoformat(at) if at else None
+        result = BackupService.restore(target_dir, snapshot_id=snapshot_id, at=at, prefix=prefix)
+        print(result['message'])
+    
+    @app.cli.command('backup-prune')
+    @click.option('--keep', type=int, default=None, help='Số snapshot giữ lại (mặc định BACKUP_KEEP)')
+    def backup_prune(keep):
+        """Xóa snapshot cũ và chunk không còn dùng"""
+        from app.services.backup_service import BackupService
+        stats = BackupService.prune(keep)
+        print(f"Đã xóa {stats['snapshots_removed']} snapshot, {stats['chunks_removed']} chunk "
+              f"({stats['bytes_freed'] / (1024 * 1024):.1f}MB)")
     
     return app
\ No newline at end of file
@@ -17,11 +17,116 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here-change-in-production')
     
     # Upload
-    UPLOAD_FOLDER = 'static/uploads'
+    UPLOAD_FOLDER = 'instance/media'  # Ngoài static/: video/ảnh chỉ phục vụ qua /media (có kiểm tra quyền)
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB
     MAX_VIDEO_SIZE = 500 * 1024 * 1024  # 500MB for videos (updated for exam videos)
     ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
+    ALLOWED_EXAM_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'webm'}  # Bài thi: có cả webm ghi từ trình duyệt
     ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Kích thước chunk client nên gửi
+    UPLOAD_CHUNK_MAX_SIZE = 16 * 1024 * 1024  # Chunk lớn nhất server chấp nhận
+    UPLOAD_SESSION_TTL_HOURS = 24  # Phiên upload dang dở quá hạn sẽ bị dọn
+    BLOB_FOLDER = 'instance/media/blobs'  # Kho video theo nội dung (StorageService), mỗi nội dung lưu một lần
+
+    # Nơi lưu kho video: 'local' (đĩa web node) hoặc 's3' (S3/MinIO, cần boto3)
+    STORAGE_DRIVER = os.getenv('STORAGE_DRIVER', 'local')
+    STORAGE_S3_BUCKET = os.getenv('STORAGE_S3_BUCKET')
+    STORAGE_S3_PREFIX = os.getenv('STORAGE_S3_PREFIX', '')
+    STORAGE_S3_ENDPOINT_URL = os.getenv('STORAGE_S3_ENDPOINT_URL')  # vd 'http://minio:9000'; bỏ trống = AWS S3
+    STORAGE_S3_REGION = os.getenv('STORAGE_S3_REGION')
+    STORAGE_S3_ACCESS_KEY = os.getenv('STORAGE_S3_ACCESS_KEY')
+    STORAGE_S3_SECRET_KEY = os.getenv('STORAGE_S3_SECRET_KEY')
+    STORAGE_PART_SIZE = 8 * 1024 * 1024  # Kích thước part khi multipart upload (tối thiểu 5MB)
+    STORAGE_URL_EXPIRES = 3600  # Thời hạn URL ký sẵn (giây)
+    STORAGE_CACHE_FOLDER = 'instance/storage_cache'  # Bản tải về cho OpenCV/ffmpeg khi dùng s3
+    STORAGE_CACHE_MAX_MB = int(os.getenv('STORAGE_CACHE_MAX_MB', 10240))
+
+    # Tầng cold (TieringService, `flask storage-tier`): video gốc đã chấm, lâu không xem được nén và chuyển đi
+    COLD_STORAGE_FOLDER = os.getenv('COLD_STORAGE_FOLDER', 'instance/cold_storage')  # Nên là ổ rẻ/NAS mount riêng
+    COLD_ARCHIVE_AFTER_DAYS = int(os.getenv('COLD_ARCHIVE_AFTER_DAYS', 90))
+    COLD_STORAGE_COMPRESSLEVEL = 6  # gzip 1-9
+    STORAGE_HOT_MAX_MB = int(os.getenv('STORAGE_HOT_MAX_MB', 0))  # > 0: chuyển thêm video đã chấm khi tầng hot vượt mức này
+
+    # Sao lưu (BackupService, `flask backup-create`): database + UPLOAD_FOLDER + COLD_STORAGE_FOLDER
+    BACKUP_FOLDER = os.getenv('BACKUP_FOLDER', 'instance/backups')  # Nên đặt trên ổ khác với dữ liệu
+    BACKUP_CHUNK_SIZE = 4 * 1024 * 1024  # Đổi giá trị này thì lần sao lưu kế tiếp phải đọc lại toàn bộ file
+    BACKUP_WORKERS = int(os.getenv('BACKUP_WORKERS', 0))  # Thread nén chunk (0 = số CPU)
+    BACKUP_COMPRESSLEVEL = 3  # zlib 1-9
+    BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', 30))  # Số snapshot giữ lại khi prune
+
+    # Stream video qua /media (Range, ETag)
+    MEDIA_CACHE_MAX_AGE = 3600  # Trình duyệt dùng lại bản đã tải trong khoảng này (giây)
+    MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX')  # vd '/protected' nếu nginx phục vụ file (internal location)
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', '0') == '1'  # Apache/lighttpd mod_xsendfile
+    
+    # AI analysis job queue (worker chạy nền, không cần broker ngoài)
+    ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', 2))
+    ANALYSIS_WORKER_AUTOSTART = os.getenv('ANALYSIS_WORKER_AUTOSTART', '1') == '1'  # Tắt nếu chạy `flask analysis-worker` riêng
+    ANALYSIS_MAX_ATTEMPTS = 3
+    ANALYSIS_RETRY_BASE_SECONDS = 30
+    ANALYSIS_RETRY_MAX_SECONDS = 1800
+    ANALYSIS_POLL_INTERVAL = 2
+    ANALYSIS_JOB_TIMEOUT = 1800  # Job 'running' quá thời gian này được coi là treo
+    
+    # Weapon detection (ai_models/weapon_detection.py)
+    WEAPON_MODEL_PATH = os.getenv('WEAPON_MODEL_PATH')  # Mặc định ai_models/weights/weapon_model.h5 (+ bản export .onnx)
+    WEAPON_FRAME_STRIDE = int(os.getenv('WEAPON_FRAME_STRIDE', 15))  # Lấy 1 frame mỗi N frame
+    WEAPON_MAX_FRAMES = 64  # Số frame tối đa mỗi video, trải đều trên cả video (stride là khoảng cách tối thiểu)
+    WEAPON_BATCH_SIZE = 16
+    
+    # Motion analysis (ai_models/motion_analysis.py)
+    MOTION_MODEL_PATH = os.getenv('MOTION_MODEL_PATH')  # Mặc định ai_models/weights/motion_model.pth (+ bản export .onnx)
+    MOTION_SAMPLE_FPS = 10  # Số frame phân tích mỗi giây video
+    MOTION_BATCH_SIZE = 8
+    ANALYSIS_ROI = None  # (x, y, w, h) theo tỷ lệ khung hình; None = cả khung hình
+    KEY_FRAME_FOLDER = 'instance/media/keyframes'  # Ảnh key frame trích từ video
+    
+    # Inference process pool: model chỉ được tải trong các process này, không trong process web
+    INFERENCE_PROCESSES = int(os.getenv('INFERENCE_PROCESSES', os.cpu_count() or 1))  # 0 = chạy ngay trong process hiện tại
+    INFERENCE_MAX_JOBS_PER_WORKER = int(os.getenv('INFERENCE_MAX_JOBS_PER_WORKER', 50))  # Thay process mới sau N job
+    REFERENCE_FEATURE_FOLDER = 'instance/reference_features'  # Cache đặc trưng video mẫu (.npy memory-map)
+
+    # Chuyển mã sau upload (app/utils/transcoder.py): HLS 360p/720p + proxy cho AI
+    TRANSCODE_ENABLED = os.getenv('TRANSCODE_ENABLED', '1') == '1'  # Không có ffmpeg thì tự bỏ qua
+    TRANSCODE_FOLDER = 'instance/media/renditions'
+    TRANSCODE_WORKERS = int(os.getenv('TRANSCODE_WORKERS', 2))  # Số process ffmpeg chạy đồng thời
+    TRANSCODE_THREADS = int(os.getenv('TRANSCODE_THREADS', 0))  # Thread mỗi process ffmpeg (0 = ffmpeg tự chọn)
+    TRANSCODE_TIMEOUT = 1200
+    FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+    FFPROBE_BINARY = os.getenv('FFPROBE_BINARY', 'ffprobe')
+    # hls.js cho trình phát: dùng static/js/hls.min.js nếu đã vendor, nếu không tải bản cố định từ CDN
+    HLS_JS_CDN_URL = 'https://cdn.jsdelivr.net/npm/hls.js@1.5.17/dist/hls.min.js'
+    HLS_JS_INTEGRITY = os.getenv('HLS_JS_INTEGRITY')  # SRI (sha384-...) của file trên CDN
+    
+    # Giám sát (SystemMonitorService, /metrics định dạng Prometheus)
+    MONITOR_ENABLED = os.getenv('MONITOR_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # Bearer token cho Prometheus; không đặt thì chỉ admin đăng nhập xem được
+    MONITOR_DISK_CACHE_SECONDS = 300  # Duyệt dung lượng thư mục upload tối đa một lần mỗi khoảng này
+    
+    # Profiler SQL (app/utils/sql_profiler.py): luôn bật khi chạy debug
+    SQL_PROFILER_ENABLED = os.getenv('SQL_PROFILER_ENABLED', '0') == '1'
+    SQL_PROFILER_N1_THRESHOLD = 5  # Cùng một dạng SELECT lặp từ N lần trong một request thì báo N+1
+    SQL_PROFILER_REPORT = 'instance/sql_profile.jsonl'  # Mỗi request có vấn đề ghi một dòng JSON
+    SQL_QUERY_BUDGET = None  # Số query tối đa mỗi request (None = không giới hạn)
+    SQL_QUERY_BUDGETS = {  # Ngân sách riêng theo endpoint; trang danh sách dùng loader profile nên không tăng theo số dòng
+        'student_videos.history': 5,
+        'instructor.pending_evaluations': 5,
+    }
+    SQL_PROFILER_FAIL_ON_BUDGET = False  # Bật trong test: vượt ngân sách thì raise QueryBudgetExceeded
+    
+    # Bảng rollup xu hướng theo ngày/tuần (TrendRollupService)
+    ANALYTICS_ROLLUP_MAX_AGE = int(os.getenv('ANALYTICS_ROLLUP_MAX_AGE', 300))  # Biểu đồ tự cập nhật rollup nếu lần gần nhất cũ hơn N giây
+    ANALYTICS_ROLLUP_LOOKBACK_SECONDS = 600  # Quét lại thay đổi trước mốc lần trước (bản ghi commit trễ)
+    
+    # Cache số liệu thống kê (app/utils/cache.py): request -> process (TTL + LRU) -> Redis (tùy chọn)
+    # Không có Redis thì phiên bản tag lưu ở bảng cache_tag_versions để mọi process cùng thấy
+    CACHE_ENABLED = os.getenv('CACHE_ENABLED', '1') == '1'
+    CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', 300))  # Giây; entry còn bị xóa sớm khi dữ liệu liên quan thay đổi
+    CACHE_MAX_ENTRIES = 2048  # Số entry tối đa trong mỗi process (LRU)
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')  # vd redis://localhost:6379/0; không đặt thì giá trị chỉ cache trong process
+    
+    # Phân trang keyset các trang danh sách (app/utils/pagination.py)
+    LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', 50))  # Số dòng mỗi trang
     
     # Session
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
@@ -2,7 +2,8 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
 from wtforms import SelectField, DateTimeField, TextAreaField, BooleanField, SubmitField, StringField
-from wtforms.validators import DataRequired, Optional
+from wtforms.validators import DataRequired, Optional, Length
+from app.utils.validators import http_url
 
 class AssignmentCreateForm(FlaskForm):
     routine_id = SelectField('Bài võ (*)', coerce=int, validators=[DataRequired()])
@@ -33,7 +34,7 @@ class AssignmentCreateForm(FlaskForm):
     is_mandatory = BooleanField('Bắt buộc', default=True)
     
     # BẮT BUỘC: Phải upload video hoặc nhập URL
-    instructor_video_url = StringField('Link Video Demo')
+    instructor_video_url = StringField('Link Video Demo', validators=[Optional(), Length(max=500), http_url()])
     
     instructor_video_file = FileField('Upload Video Demo (*)', 
         validators=[
@@ -1,7 +1,7 @@
 from flask_wtf import FlaskForm
 from datetime import datetime
 from flask_wtf.file import FileField, FileAllowed  # THÊM import
-from wtforms import StringField, TextAreaField, SelectField, DateTimeField, IntegerField, DecimalField, RadioField  # THÊM RadioField
+from wtforms import StringField, TextAreaField, SelectField, DateTimeField, IntegerField, DecimalField, RadioField, HiddenField  # THÊM RadioField
 from wtforms.validators import DataRequired, Length, NumberRange, Optional, ValidationError
 
 
@@ -40,6 +40,9 @@ class ExamCreateForm(FlaskForm):
         ]
     )
     
+    # ID phiên upload theo chunk (thay cho reference_video)
+    upload_id = HiddenField('Upload ID', validators=[Optional(), Length(max=32)])
+    
     exam_type = SelectField('Loại kiểm tra', choices=[
         ('practice', 'Thi thử'),
         ('midterm', 'Giữa kỳ'),
@@ -75,7 +78,7 @@ class ExamCreateForm(FlaskForm):
         
         # Nếu chọn upload thì phải có file
         if self.video_source.data == 'upload':
-            if not self.reference_video.data:
+            if not self.reference_video.data and not self.upload_id.data:
                 self.reference_video.errors.append('Vui lòng upload video mẫu')
                 return False
         
@@ -2,6 +2,7 @@ from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, TextAreaField, SelectField, IntegerField, DecimalField
 from wtforms.validators import DataRequired, Length, NumberRange, Optional, ValidationError
+from app.utils.validators import http_url
 
 
 class RoutineCreateForm(FlaskForm):
@@ -41,7 +42,8 @@ class RoutineCreateForm(FlaskForm):
     # GIỮ LẠI cả 2 options
     reference_video_url = StringField('URL video mẫu (YouTube, Vimeo...)', validators=[
         Optional(),
-        Length(max=500, message='URL tối đa 500 ký tự')
+        Length(max=500, message='URL tối đa 500 ký tự'),
+        http_url()
     ])
     
     reference_video_file = FileField('HOẶC upload video từ máy', validators=[
@@ -98,7 +100,8 @@ class RoutineEditForm(FlaskForm):
     # Video fields - both optional for editing
     reference_video_url = StringField('URL video mẫu (YouTube, Vimeo...)', validators=[
         Optional(),
-        Length(max=500, message='URL tối đa 500 ký tự')
+        Length(max=500, message='URL tối đa 500 ký tự'),
+        http_url()
     ])
     
     reference_video_file = FileField('HOẶC upload video từ máy', validators=[
@@ -1,17 +1,22 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileRequired, FileAllowed
+from flask_wtf.file import FileField, FileAllowed
 from wtforms import TextAreaField, SelectField, HiddenField
-from wtforms.validators import DataRequired, Optional, Length
+from wtforms.validators import DataRequired, Optional, Length, ValidationError
 
 class VideoUploadForm(FlaskForm):
     routine_id = SelectField('Chọn bài võ', coerce=int, validators=[DataRequired(message="Vui lòng chọn bài võ")])
     assignment_id = HiddenField('Assignment ID', validators=[Optional()])
+    # ID phiên upload theo chunk (JS upload trước rồi chỉ gửi ID); nếu trống thì dùng video_file
+    upload_id = HiddenField('Upload ID', validators=[Optional(), Length(max=32)])
     video_file = FileField('Chọn video bài tập', validators=[
-        FileRequired(message="Vui lòng chọn file video"),
         FileAllowed(['mp4', 'avi', 'mov', 'mkv'], 'Chỉ chấp nhận file video (mp4, avi, mov, mkv)')
     ])
     notes = TextAreaField('Ghi chú (tùy chọn)', validators=[Optional(), Length(max=500)])
 
+    def validate_video_file(self, field):
+        if not field.data and not self.upload_id.data:
+            raise ValidationError("Vui lòng chọn file video")
+
 class VideoFilterForm(FlaskForm):
     routine_id = SelectField('Lọc theo bài võ', coerce=int, validators=[Optional()])
     status = SelectField('Trạng thái', validators=[Optional()])
\ No newline at end of file
@@ -21,3 +21,9 @@ from .exam import Exam
 from .exam_result import ExamResult
 from .feedback import Feedback
 from .auth_token import AuthToken
+from .analysis_job import AnalysisJob
+from .upload_session import UploadSession
+from .stored_blob import StoredBlob
+from .student_score_summary import StudentScoreSummary
+from .analytics_rollup import AnalyticsRollup
+from .cache_tag_version import CacheTagVersion
@@ -0,0 +1,35 @@
+from . import db
+from datetime import datetime
+
+class AnalysisJob(db.Model):
+    __tablename__ = 'analysis_jobs'
+
+    job_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    job_type = db.Column(db.Enum('video_analysis', 'reference_features', name='job_type_enum'), nullable=False, default='video_analysis')
+    video_id = db.Column(db.Integer, db.ForeignKey('training_videos.video_id', ondelete='CASCADE'))  # Bắt buộc với video_analysis
+    target_url = db.Column(db.String(500))  # Video mẫu cần tính trước đặc trưng (job reference_features)
+    job_status = db.Column(db.Enum('pending', 'running', 'completed', 'failed', name='job_status_enum'), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Thời điểm sớm nhất được chạy (backoff)
+    locked_by = db.Column(db.String(100))  # Worker đang giữ job
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    # Thời gian từng bước của lần chạy cuối (giây), /metrics đọc lại lúc scrape
+    transcode_seconds = db.Column(db.Float)
+    inference_seconds = db.Column(db.Float)  # Job reference_features: thời gian tính đặc trưng
+    total_seconds = db.Column(db.Float)
+
+    # Relationships
+    video = db.relationship('TrainingVideo', backref=db.backref('analysis_jobs', lazy=True, cascade='all, delete-orphan'))
+
+    # Constraints
+    __table_args__ = (
+        db.CheckConstraint(attempts >= 0, name='chk_jobs_attempts'),
+        db.CheckConstraint(max_attempts > 0, name='chk_jobs_max_attempts'),
+        db.CheckConstraint(db.or_(job_type != 'video_analysis', video_id.isnot(None)), name='chk_jobs_video'),
+        db.Index('idx_jobs_status_run_after', 'job_status', 'run_after'),
+        db.Index('idx_jobs_video', 'video_id'),
+    )
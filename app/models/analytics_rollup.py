@@ -0,0 +1,24 @@
+from . import db
+from datetime import datetime
+
+class AnalyticsRollup(db.Model):
+    """Số liệu đã gom theo ngày/tuần cho biểu đồ xu hướng (TrendRollupService)"""
+    __tablename__ = 'analytics_rollups'
+
+    bucket_type = db.Column(db.Enum('day', 'week', name='rollup_bucket_enum'), primary_key=True)
+    bucket_start = db.Column(db.Date, primary_key=True)  # Ngày, hoặc thứ Hai đầu tuần
+    scope = db.Column(db.Enum('system', 'class', 'routine', 'instructor', name='rollup_scope_enum'), primary_key=True)
+    scope_id = db.Column(db.Integer, primary_key=True, default=0)  # class_id/routine_id/instructor_id; 0 = toàn hệ thống
+    student_id = db.Column(db.Integer, primary_key=True, default=0)  # Chỉ scope 'class': tách theo học viên; 0 = cả lớp
+    upload_count = db.Column(db.Integer, nullable=False, default=0)
+    evaluation_count = db.Column(db.Integer, nullable=False, default=0)  # Theo ngày chấm
+    # Điểm video upload trong bucket: lượt chấm đầu tiên, chưa chấm thì điểm AI
+    score_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Constraints
+    __table_args__ = (
+        db.Index('idx_rollups_scope', 'scope', 'scope_id', 'bucket_type', 'bucket_start'),
+        db.Index('idx_rollups_updated', 'updated_at'),
+    )
@@ -53,4 +53,5 @@ class Assignment(db.Model):
         db.Index('idx_assignments_student', 'assigned_to_student'),
         db.Index('idx_assignments_class', 'assigned_to_class'),
         db.Index('idx_assignments_deadline', 'deadline'),
+        db.Index('idx_assignments_creator_created', 'assigned_by', 'created_at', 'assignment_id'),
     )
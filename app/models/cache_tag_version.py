@@ -0,0 +1,8 @@
+from . import db
+
+class CacheTagVersion(db.Model):
+    """Phiên bản tag của cache thống kê (app/utils/cache.py) khi không có Redis, mọi process cùng đọc"""
+    __tablename__ = 'cache_tag_versions'
+
+    tag = db.Column(db.String(191), primary_key=True)  # vd 'student:12', 'scores'
+    version = db.Column(db.BigInteger, nullable=False, default=0)
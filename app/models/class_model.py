@@ -41,6 +41,7 @@ class Class(db.Model):
         db.Index('idx_classes_active', 'is_active'),
         db.Index('idx_classes_level', 'level'),
         db.Index('idx_approval_status', 'approval_status'),
+        db.Index('idx_classes_created', 'created_at', 'class_id'),
     )
 
     @property
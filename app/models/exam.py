@@ -20,7 +20,7 @@ class Exam(db.Model):
         nullable=False, 
         default='routine'
     )
-    reference_video_path = db.Column(db.String(500))  # Path video upload
+    reference_video_path = db.Column(db.String(500))  # Path blob (StorageService); bản cũ: tên file trong exam_videos
     video_duration = db.Column(db.Integer)  # Độ dài video (seconds)
     
     exam_type = db.Column(db.Enum('midterm', 'final', 'practice', 'certification', name='exam_type_enum'), nullable=False)
@@ -42,7 +42,11 @@ class Exam(db.Model):
         if self.video_upload_method == 'routine' and self.routine:
             return self.routine.reference_video_url
         elif self.video_upload_method == 'upload' and self.reference_video_path:
-            return f'/static/uploads/exam_videos/{self.reference_video_path}'
+            if '/' in self.reference_video_path:
+                return f'/{self.reference_video_path}'
+            from flask import current_app
+            folder = current_app.config.get('UPLOAD_FOLDER', 'instance/media')
+            return f"/{folder}/exam_videos/{self.reference_video_path}"
         return None
     
     def has_video(self):
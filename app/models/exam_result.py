@@ -22,4 +22,5 @@ class ExamResult(db.Model):
         db.Index('idx_results_exam', 'exam_id'),
         db.Index('idx_results_student', 'student_id'),
         db.Index('idx_results_status', 'result_status'),
+        db.Index('idx_results_exam_submitted', 'exam_id', 'submitted_at', 'result_id'),
     )
@@ -22,4 +22,5 @@ class Feedback(db.Model):
         db.Index('idx_feedback_user', 'user_id'),
         db.Index('idx_feedback_status', 'feedback_status'),
         db.Index('idx_feedback_type', 'feedback_type'),
+        db.Index('idx_feedback_created', 'created_at', 'feedback_id'),
     )
@@ -0,0 +1,26 @@
+from . import db
+from datetime import datetime
+
+class StoredBlob(db.Model):
+    __tablename__ = 'stored_blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)  # Nội dung giống nhau chỉ lưu một file
+    file_path = db.Column(db.String(500), nullable=False, unique=True)
+    size_bytes = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # Số bản ghi TrainingVideo/Exam đang dùng
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Lần gần nhất được dùng lại/gắn/bỏ khỏi bản ghi: collect_garbage chỉ xóa blob đã lâu không đụng tới
+    last_used_at = db.Column(db.DateTime)
+    # Tầng lưu trữ (TieringService): 'cold' = bản gốc đã nén vào cold_path, không còn ở file_path
+    storage_tier = db.Column(db.Enum('hot', 'cold', name='storage_tier_enum'), nullable=False, default='hot')
+    cold_path = db.Column(db.String(500))
+    archived_at = db.Column(db.DateTime)
+    last_accessed_at = db.Column(db.DateTime)  # Lần gần nhất được lấy lại từ tầng cold
+
+    # Constraints
+    __table_args__ = (
+        db.CheckConstraint(size_bytes >= 0, name='chk_blobs_size'),
+        db.CheckConstraint(ref_count >= 0, name='chk_blobs_ref_count'),
+        db.Index('idx_blobs_ref_count', 'ref_count'),
+        db.Index('idx_blobs_tier', 'storage_tier'),
+    )
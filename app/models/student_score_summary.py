@@ -0,0 +1,32 @@
+from . import db
+from datetime import datetime
+
+class StudentScoreSummary(db.Model):
+    """Tổng hợp điểm của học viên, cập nhật dần khi có kết quả AI/điểm chấm mới (ScoreSummaryService)"""
+    __tablename__ = 'student_score_summary'
+
+    student_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    class_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 = mọi video; khác 0 = video thuộc bài tập của lớp
+    video_count = db.Column(db.Integer, nullable=False, default=0)
+    # Kết quả AI (mỗi video tối đa một kết quả)
+    ai_count = db.Column(db.Integer, nullable=False, default=0)
+    ai_score_sum = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    technique_count = db.Column(db.Integer, nullable=False, default=0)
+    technique_sum = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    posture_count = db.Column(db.Integer, nullable=False, default=0)
+    posture_sum = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    timing_count = db.Column(db.Integer, nullable=False, default=0)
+    timing_sum = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    # Điểm giảng viên chấm (mọi lượt chấm)
+    manual_count = db.Column(db.Integer, nullable=False, default=0)
+    manual_score_sum = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    passed_count = db.Column(db.Integer, nullable=False, default=0)
+    # Điểm mỗi video: lượt chấm đầu tiên, chưa chấm thì dùng điểm AI
+    scored_count = db.Column(db.Integer, nullable=False, default=0)
+    scored_sum = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Constraints
+    __table_args__ = (
+        db.Index('idx_score_summary_class', 'class_id'),
+    )
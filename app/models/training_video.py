@@ -9,10 +9,17 @@ class TrainingVideo(db.Model):
     routine_id = db.Column(db.Integer, db.ForeignKey('martial_routines.routine_id', ondelete='RESTRICT'), nullable=False)
     assignment_id = db.Column(db.Integer, db.ForeignKey('assignments.assignment_id', ondelete='SET NULL'))
     video_url = db.Column(db.String(500), nullable=False)
+    content_sha256 = db.Column(db.String(64))  # Blob trong StorageService (video trùng nội dung dùng chung file)
     thumbnail_url = db.Column(db.String(500))
     file_size_mb = db.Column(db.Numeric(10, 2))
     duration_seconds = db.Column(db.Integer, nullable=False)
     resolution = db.Column(db.String(20))
+    fps = db.Column(db.Numeric(6, 2))
+    codec = db.Column(db.String(20))
+    # Bản chuyển mã (TranscodeService): HLS cho trình phát, proxy độ phân giải thấp cho AI
+    hls_url = db.Column(db.String(500))
+    proxy_url = db.Column(db.String(500))
+    transcode_status = db.Column(db.Enum('pending', 'processing', 'completed', 'failed', 'skipped', name='transcode_status_enum'), nullable=False, default='pending')
     upload_status = db.Column(db.Enum('uploading', 'completed', 'failed', name='upload_status_enum'), nullable=False, default='uploading')
     processing_status = db.Column(db.Enum('pending', 'processing', 'completed', 'failed', name='processing_status_enum'), nullable=False, default='pending')
     uploaded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -33,4 +40,6 @@ class TrainingVideo(db.Model):
         db.Index('idx_videos_assignment', 'assignment_id'),
         db.Index('idx_videos_status', 'processing_status'),
         db.Index('idx_videos_uploaded', 'uploaded_at'),
+        db.Index('idx_videos_student_uploaded', 'student_id', 'uploaded_at', 'video_id'),
+        db.Index('idx_videos_content', 'content_sha256'),
     )
@@ -0,0 +1,30 @@
+from . import db
+from datetime import datetime
+
+class UploadSession(db.Model):
+    __tablename__ = 'upload_sessions'
+
+    upload_id = db.Column(db.String(32), primary_key=True)  # uuid4().hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    purpose = db.Column(db.Enum('training', 'exam', 'exam_reference', name='upload_purpose_enum'), nullable=False, default='training')
+    original_filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)  # Đường dẫn đích cuối cùng, chunk được ghi nối thẳng vào đây
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    expected_sha256 = db.Column(db.String(64))  # Checksum client gửi lúc init (tùy chọn)
+    checksum_sha256 = db.Column(db.String(64))  # Checksum server tính lúc finalize
+    upload_status = db.Column(db.Enum('uploading', 'completed', 'consumed', 'failed', name='upload_session_status_enum'), nullable=False, default='uploading')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+    # Relationships
+    user = db.relationship('User', backref=db.backref('upload_sessions', lazy=True))
+
+    # Constraints
+    __table_args__ = (
+        db.CheckConstraint(total_size > 0, name='chk_uploads_total_size'),
+        db.CheckConstraint(db.and_(received_bytes >= 0, received_bytes <= total_size), name='chk_uploads_received'),
+        db.Index('idx_uploads_user', 'user_id'),
+        db.Index('idx_uploads_status', 'upload_status', 'updated_at'),
+    )
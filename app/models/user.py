@@ -53,4 +53,5 @@ class User(db.Model):
         db.Index('idx_users_role', 'role_id'),
         db.Index('idx_users_active', 'is_active'),
         db.Index('idx_users_email', 'email'),
+        db.Index('idx_users_created', 'created_at', 'user_id'),
     )
\ No newline at end of file
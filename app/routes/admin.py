@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from app.services.user_service import UserService
 from app.utils.decorators import login_required, role_required
+from app.utils.pagination import cursor_args
 from app.forms.admin_forms import CreateUserForm, EditUserForm
 from app.forms.feedback_forms import FeedbackResponseForm
 from app.services.feedback_service import FeedbackService
@@ -111,8 +112,8 @@ def dashboard():
 @login_required
 @role_required('ADMIN')
 def users():
-    users = UserService.get_all_users()
-    return render_template('admin/users.html', users=users)
+    users = UserService.get_all_users(profile='user_list', **cursor_args())
+    return render_template('admin/users.html', users=users, total_users=UserService.count_all_users())
 
 @admin_bp.route('/users/create', methods=['GET', 'POST'])
 @login_required
@@ -206,8 +207,9 @@ def feedback_list():
     if feedback_type:
         filters['type'] = feedback_type
     
-    feedbacks = FeedbackService.get_all_feedback(filters)
-    return render_template('admin/feedback_list.html', feedbacks=feedbacks)
+    feedbacks = FeedbackService.get_all_feedback(filters, profile='feedback_list', **cursor_args())
+    counts = FeedbackService.get_feedback_counts(filters)
+    return render_template('admin/feedback_list.html', feedbacks=feedbacks, counts=counts)
 
 @admin_bp.route('/feedback/<int:feedback_id>', methods=['GET', 'POST'])
 @login_required
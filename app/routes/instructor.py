@@ -10,7 +10,9 @@ from app.services.exam_service import ExamService
 from app.services.evaluation_service import EvaluationService
 from app.services.analytics_service import AnalyticsService
 from app.services.report_service import ReportService
+from app.services.media_service import MediaService
 from app.utils.decorators import login_required, role_required
+from app.utils.pagination import cursor_args
 from app.forms.class_forms import ClassCreateForm, ClassEditForm, EnrollStudentForm
 from app.forms.routine_forms import RoutineCreateForm, RoutineEditForm
 from app.forms.assignment_forms import AssignmentCreateForm
@@ -69,57 +71,11 @@ def class_detail(class_id: int):
     class_overview = AnalyticsService.get_class_overview(class_id)
     
     # Lấy điểm trung bình từng học viên (chỉ trong phạm vi assignment của lớp)
-    student_scores = {}
-    for enrollment in enrollments:
-        student_scores[enrollment.student_id] = AnalyticsService.get_student_avg_for_class(enrollment.student_id, class_id)
+    student_scores = AnalyticsService.get_student_avgs_for_class(class_id, [e.student_id for e in enrollments])
     
     # Tiến độ 4 tuần gần nhất: trung bình theo tuần, tính trung bình mỗi học viên/tuần để không bị lệch
-    from datetime import timedelta
-    from app.models.training_video import TrainingVideo
-    now = datetime.now()
-    cutoff = now - timedelta(days=30)
-    start_of_week = (now - timedelta(days=now.weekday())).date()
-    week_starts = [start_of_week - timedelta(weeks=3), start_of_week - timedelta(weeks=2), start_of_week - timedelta(weeks=1), start_of_week]
     week_labels = [f"Tuần {i+1}" for i in range(4)]
-    week_student_scores = {i: {} for i in range(4)}
-
-    student_ids = [e.student_id for e in enrollments]
-    if student_ids:
-        # Chỉ lấy video thuộc assignment của lớp này
-        from app.models.assignment import Assignment
-        videos = (
-            TrainingVideo.query
-            .join(Assignment, TrainingVideo.assignment_id == Assignment.assignment_id)
-            .filter(
-                TrainingVideo.student_id.in_(student_ids),
-                TrainingVideo.uploaded_at >= cutoff,
-                Assignment.assigned_to_class == class_id
-            ).all()
-        )
-        for v in videos:
-            manual_score = v.manual_evaluations[0].overall_score if v.manual_evaluations else None
-            ai_score = v.ai_analysis.overall_score if v.ai_analysis else None
-            score_val = manual_score if manual_score is not None else ai_score
-            if score_val is None:
-                continue
-            vid_date = v.uploaded_at.date()
-            idx = None
-            for i, ws in enumerate(week_starts):
-                we = ws + timedelta(days=6)
-                if ws <= vid_date <= we:
-                    idx = i
-                    break
-            if idx is not None and 0 <= idx < 4:
-                sid = v.student_id
-                week_student_scores[idx].setdefault(sid, []).append(float(score_val))
-
-    class_progress_scores = []
-    for i in range(4):
-        per_student = []
-        for sid, vals in week_student_scores[i].items():
-            if vals:
-                per_student.append(sum(vals) / len(vals))
-        class_progress_scores.append(round(sum(per_student) / len(per_student), 1) if per_student else 0)
+    class_progress_scores = AnalyticsService.get_class_weekly_progress(class_id, [e.student_id for e in enrollments], weeks=4)
 
     return render_template('instructor/class_detail.html', 
                          class_obj=class_obj, 
@@ -425,7 +381,7 @@ def create_routine():
             filepath = os.path.join(upload_path, filename)
             video_file.save(filepath)
             
-            video_url = f"/static/uploads/routines/{filename}"
+            video_url = filepath.replace(os.sep, '/')  # Phục vụ qua /media/routines/<id>/reference
             
         # PHƯƠNG ÁN 2: Dùng URL nếu không upload file
         elif form.reference_video_url.data:
@@ -474,6 +430,8 @@ def edit_routine(routine_id: int):
         flash('Không tìm thấy bài võ', 'error')
         return redirect(url_for('instructor.routines'))
     form = RoutineEditForm(obj=routine)
+    if request.method == 'GET' and not MediaService.is_external_url(routine.reference_video_url):
+        form.reference_video_url.data = ''  # Video đã upload: ô link để trống = giữ nguyên
     weapons = RoutineService.get_all_weapons()
     form.weapon_id.choices = [(w.weapon_id, w.weapon_name_vi) for w in weapons]
     
@@ -493,7 +451,7 @@ def edit_routine(routine_id: int):
             filepath = os.path.join(upload_path, filename)
             video_file.save(filepath)
             
-            video_url = f"/static/uploads/routines/{filename}"
+            video_url = filepath.replace(os.sep, '/')  # Phục vụ qua /media/routines/<id>/reference
             
         # PHƯƠNG ÁN 2: Dùng URL nếu không upload file
         elif form.reference_video_url.data:
@@ -571,9 +529,11 @@ def assignments():
     if priority in ['low', 'normal', 'high', 'urgent']:
         filters['priority'] = priority
 
-    assignments = AssignmentService.get_assignments_by_instructor(session['user_id'], filters)
+    assignments = AssignmentService.get_assignments_by_instructor(session['user_id'], filters,
+                                                                 profile='assignment_list', **cursor_args())
     return render_template('instructor/assignments.html', 
                            assignments=assignments,
+                           total_assignments=AssignmentService.count_assignments_by_instructor(session['user_id'], filters),
                            assignment_type=assignment_type or '',
                            priority=priority or '')
 
@@ -623,13 +583,13 @@ def create_assignment():
                 ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'mp4'
                 filename = f"{uuid.uuid4().hex}.{ext}"
                 
-                upload_path = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'static/uploads'), 'assignments')
+                upload_path = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'instance/media'), 'assignments')
                 os.makedirs(upload_path, exist_ok=True)
                 
                 filepath = os.path.join(upload_path, filename)
                 video_file.save(filepath)
                 
-                instructor_video_url = f"/static/uploads/assignments/{filename}"
+                instructor_video_url = filepath.replace(os.sep, '/')  # Phục vụ qua /media/assignments/<id>/video
                 
             except Exception as e:
                 flash(f'Lỗi khi upload video: {str(e)}', 'error')
@@ -727,9 +687,10 @@ def create_exam():
         
         # Lấy video file nếu có
         video_file = form.reference_video.data if form.video_source.data == 'upload' else None  # THÊM
+        upload_id = form.upload_id.data if form.video_source.data == 'upload' else None
         
         # Tạo exam với video file
-        result = ExamService.create_exam(data, session['user_id'], video_file)  # SỬA: thêm video_file
+        result = ExamService.create_exam(data, session['user_id'], video_file, upload_id=upload_id)  # SỬA: thêm video_file
         
         if result['success']:
             flash('Tạo bài kiểm tra thành công! (Trạng thái: Nháp)', 'success')
@@ -748,8 +709,9 @@ def exam_detail(exam_id: int):
     if not exam or exam.instructor_id != session['user_id']:
         flash('Không tìm thấy bài kiểm tra', 'error')
         return redirect(url_for('instructor.exams'))
-    results = ExamService.get_exam_results(exam_id)
-    return render_template('instructor/exam_detail.html', exam=exam, results=results)
+    results = ExamService.get_exam_results(exam_id, profile='exam_result_list', **cursor_args())
+    result_stats = ExamService.get_exam_result_stats(exam_id, exam.pass_score)
+    return render_template('instructor/exam_detail.html', exam=exam, results=results, result_stats=result_stats)
 
 
 @instructor_bp.route('/exams/<int:exam_id>/publish', methods=['POST'])
@@ -787,15 +749,15 @@ def pending_evaluations():
     # Get filter parameter
     show_all = request.args.get('show_all', 'false').lower() == 'true'
     
+    # Một lần nạp (kèm học viên/bài võ/điểm) dùng cho cả danh sách và thống kê
+    all_videos = EvaluationService.get_all_submissions(session['user_id'], profile='submission_list')
+    
     if show_all:
         # Show all videos (both pending and completed)
-        videos = EvaluationService.get_all_submissions(session['user_id'])
+        videos = all_videos
     else:
         # Show only pending videos
-        videos = EvaluationService.get_pending_submissions(session['user_id'])
-    
-    # Calculate statistics
-    all_videos = EvaluationService.get_all_submissions(session['user_id'])
+        videos = [v for v in all_videos if not v.manual_evaluations]
     
     # Count pending videos
     pending_count = len([v for v in all_videos if not v.manual_evaluations])
@@ -869,7 +831,7 @@ def evaluate_video(video_id):
         flash('Assignment này chưa có video demo!', 'error')
         return redirect(url_for('instructor.pending_evaluations'))
     
-    reference_video_url = video.assignment.instructor_video_url
+    reference_video_url = url_for('media.training_video_reference', video_id=video.video_id)
     video_source = f"Video demo Assignment #{video.assignment.assignment_id}"
     
     form = ManualEvaluationForm()
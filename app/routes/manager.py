@@ -3,6 +3,7 @@ from app.services.class_service import ClassService
 from app.services.analytics_service import AnalyticsService
 from app.services.report_service import ReportService
 from app.utils.decorators import login_required, role_required
+from app.utils.pagination import cursor_args
 from app.forms.class_forms import ClassApprovalForm
 
 
@@ -59,7 +60,7 @@ def review_class(class_id: int):
 @login_required
 @role_required('MANAGER')
 def all_classes():
-    classes = ClassService.get_all_classes()
+    classes = ClassService.get_all_classes(profile='class_list', **cursor_args())
     return render_template('manager/all_classes.html', classes=classes)
 
 
@@ -0,0 +1,154 @@
+from flask import Blueprint, session, send_file, redirect, abort, current_app
+from werkzeug.security import safe_join
+from app.services.media_service import MediaService
+from app.services.ai_service import AIService
+from app.services.storage_service import StorageService
+from app.services.tiering_service import TieringService
+from app.utils.decorators import login_required
+import os
+
+media_bp = Blueprint('media', __name__, url_prefix='/media')
+
+
+def _send_media(path):
+    """Trả file video/ảnh hỗ trợ Range (206), ETag/Last-Modified (304).
+
+    Có MEDIA_ACCEL_REDIRECT_PREFIX thì chỉ trả header X-Accel-Redirect để nginx gửi file
+    (sendfile, đã kiểm tra quyền ở đây); nếu không, Werkzeug gửi bằng wsgi.file_wrapper
+    của server (hoặc X-Sendfile khi bật USE_X_SENDFILE).
+    """
+    accel_prefix = current_app.config.get('MEDIA_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        response = current_app.response_class(mimetype=MediaService.mimetype(path))
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{path.replace(os.sep, '/')}"
+        response.headers['Cache-Control'] = 'private'
+        return response
+
+    response = send_file(
+        os.path.abspath(path),
+        mimetype=MediaService.mimetype(path),
+        conditional=True,
+        etag=True,
+        max_age=current_app.config.get('MEDIA_CACHE_MAX_AGE', 3600)
+    )
+    # Video chỉ người có quyền được xem: không cho proxy dùng chung lưu lại
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _send_url(url):
+    """Video lưu trên server thì stream qua endpoint này, link ngoài thì chuyển hướng.
+
+    File trong kho ở driver s3 (không có trên đĩa) thì chuyển hướng sang presigned URL:
+    trình duyệt tải thẳng từ bucket (Range do S3 xử lý), web node không chuyển tiếp byte.
+    """
+    path = MediaService.local_path(url)
+    if path:
+        return _send_media(path)
+    if MediaService.is_external_url(url):
+        return redirect(url)
+    blob = StorageService.get_blob_by_path(url.lstrip('/')) if url and '://' not in url else None
+    if blob:
+        # Bản gốc đã chuyển sang tầng cold: lấy lại trước khi gửi
+        if blob.storage_tier == 'cold' and not TieringService.rehydrate(blob):
+            abort(404)
+        path = MediaService.local_path(url)
+        if path:
+            return _send_media(path)
+        response = redirect(StorageService.signed_url(blob.file_path))
+        response.headers['Cache-Control'] = 'private, no-store'  # URL ký có hạn, không lưu lại chuyển hướng
+        return response
+    abort(404)
+
+
+@media_bp.route('/signed/<token>')
+def signed_file(token):
+    """File trong kho qua URL ký có thời hạn (driver local), không cần đăng nhập"""
+    driver = StorageService.driver()
+    key = driver.verify_token(token) if not driver.remote else None
+    if not key or not os.path.isfile(key):
+        abort(404)
+    return _send_media(key)
+
+
+@media_bp.route('/videos/<int:video_id>')
+@login_required
+def training_video(video_id):
+    video = MediaService.get_training_video(video_id, session['user_id'], session.get('role_code'))
+    if not video:
+        abort(404)
+    return _send_url(video.video_url)
+
+
+@media_bp.route('/videos/<int:video_id>/hls/<path:filename>')
+@login_required
+def training_video_hls(video_id, filename):
+    """Playlist/segment HLS của video (đường dẫn tương đối trong playlist trỏ về đây)"""
+    video = MediaService.get_training_video(video_id, session['user_id'], session.get('role_code'))
+    if not video or not video.hls_url:
+        abort(404)
+    path = safe_join(os.path.dirname(video.hls_url), filename)
+    if not path or not os.path.isfile(path) or not MediaService.is_media_path(path):
+        abort(404)
+    return _send_media(path)
+
+
+@media_bp.route('/videos/<int:video_id>/thumbnail')
+@login_required
+def training_video_thumbnail(video_id):
+    video = MediaService.get_training_video(video_id, session['user_id'], session.get('role_code'))
+    if not video:
+        abort(404)
+    return _send_url(video.thumbnail_url)
+
+
+@media_bp.route('/videos/<int:video_id>/keyframes/<int:index>')
+@login_required
+def training_video_keyframe(video_id, index):
+    """Ảnh key frame thứ index trong kết quả AI của video"""
+    video = MediaService.get_training_video(video_id, session['user_id'], session.get('role_code'))
+    key_frames = (video.ai_analysis.key_frames or []) if video and video.ai_analysis else []
+    if index >= len(key_frames) or not key_frames[index].get('image'):
+        abort(404)
+    return _send_url(key_frames[index]['image'])
+
+
+@media_bp.route('/videos/<int:video_id>/reference')
+@login_required
+def training_video_reference(video_id):
+    """Video mẫu (demo bài tập hoặc video chuẩn của bài võ) của một video luyện tập"""
+    video = MediaService.get_training_video(video_id, session['user_id'], session.get('role_code'))
+    if not video:
+        abort(404)
+    return _send_url(AIService.get_reference_video_url(video))
+
+
+@media_bp.route('/exams/<int:exam_id>/reference')
+@login_required
+def exam_reference(exam_id):
+    exam = MediaService.get_exam(exam_id, session['user_id'], session.get('role_code'))
+    if not exam:
+        abort(404)
+    return _send_url(exam.get_video_url())
+
+
+@media_bp.route('/routines/<int:routine_id>/reference')
+@login_required
+def routine_reference(routine_id):
+    """Video chuẩn của bài võ (file trên server hoặc chuyển hướng tới link ngoài)"""
+    routine = MediaService.get_routine(routine_id, session['user_id'], session.get('role_code'))
+    if not routine or not routine.reference_video_url:
+        abort(404)
+    return _send_url(routine.reference_video_url)
+
+
+@media_bp.route('/assignments/<int:assignment_id>/video')
+@login_required
+def assignment_video(assignment_id):
+    """Video demo của giảng viên cho bài tập"""
+    assignment = MediaService.get_assignment(assignment_id, session['user_id'], session.get('role_code'))
+    if not assignment:
+        abort(404)
+    return _send_url(assignment.instructor_video_url)
@@ -0,0 +1,21 @@
+from flask import Blueprint, session, request, abort, current_app
+from app.services.system_monitor_service import SystemMonitorService
+import hmac
+
+monitor_bp = Blueprint('monitor', __name__)
+
+
+@monitor_bp.route('/metrics')
+def metrics():
+    """Số liệu Prometheus: admin đã đăng nhập, hoặc Prometheus gửi `Authorization: Bearer <METRICS_TOKEN>`"""
+    token = current_app.config.get('METRICS_TOKEN')
+    authorized = session.get('role_code') == 'ADMIN' or (
+        token and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+    )
+    if not authorized:
+        abort(403)
+
+    return current_app.response_class(
+        SystemMonitorService.render_metrics(),
+        mimetype='text/plain; version=0.0.4; charset=utf-8'
+    )
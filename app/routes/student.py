@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, session, flash, redirect, url_for, request
+from flask import Blueprint, render_template, session, flash, redirect, url_for, request, current_app
 from app.utils.decorators import login_required, role_required
 from app.utils.helpers import get_vietnam_time, get_vietnam_time_naive
 from app.models.class_enrollment import ClassEnrollment
@@ -10,7 +10,7 @@ from app.services.routine_service import RoutineService
 from app.services.assignment_service import AssignmentService
 from app.services.exam_service import ExamService
 from app.services.video_service import VideoService
-from app.services.ai_service import AIService
+from app.services.analysis_queue_service import AnalysisQueueService
 from app.services.analytics_service import AnalyticsService
 
 
@@ -21,20 +21,9 @@ student_bp = Blueprint('student', __name__, url_prefix='/student')
 @login_required
 @role_required('STUDENT')
 def dashboard():
-    # Thống kê nhanh
+    # Thống kê nhanh (cache, tự làm mới khi có ghi danh/video/kết quả thi mới)
     student_id = session['user_id']
-
-    # Đếm lớp đang học
-    active_classes = ClassEnrollment.query.filter_by(
-        student_id=student_id,
-        enrollment_status='active'
-    ).count()
-
-    # Đếm lớp đã hoàn thành
-    completed_classes = ClassEnrollment.query.filter_by(
-        student_id=student_id,
-        enrollment_status='completed'
-    ).count()
+    stats = AnalyticsService.get_student_dashboard_stats(student_id)
 
     # Lấy lịch học hôm nay (lấy 5 lịch gần nhất)
     today = get_vietnam_time_naive()
@@ -58,51 +47,9 @@ def dashboard():
         ClassSchedule.is_active == True
     ).order_by(ClassSchedule.time_start).limit(5).all()
 
-    # Exams stats
-    exams = ExamService.get_exams_for_student(student_id)
-    now = get_vietnam_time_naive()
-    exams_upcoming = 0
-    exams_available = 0  # trong thời gian thi và chưa thi
-    exams_completed = 0
-    for exam in exams:
-        results = ExamService.get_student_exam_result(exam.exam_id, student_id)
-        attempts_used = len(results)
-        if attempts_used >= 1:
-            exams_completed += 1
-        elif now < exam.start_time:
-            exams_upcoming += 1
-        elif now <= exam.end_time:
-            exams_available += 1
-
-    # Assignments stats
-    assignments = AssignmentService.get_active_assignments_for_student(student_id)
-    try:
-        from app.models.training_video import TrainingVideo
-    except Exception:
-        TrainingVideo = None
-    assignments_pending = 0
-    assignments_completed = 0
-    for a in assignments:
-        submitted = None
-        if TrainingVideo is not None:
-            submitted = TrainingVideo.query.filter_by(
-                student_id=student_id,
-                assignment_id=a.assignment_id,
-            ).first()
-        if submitted:
-            assignments_completed += 1
-        else:
-            assignments_pending += 1
-
     return render_template('student/dashboard.html',
-                         active_classes=active_classes,
-                         completed_classes=completed_classes,
                          today_schedules=today_schedules,
-                         exams_upcoming=exams_upcoming,
-                         exams_available=exams_available,
-                         exams_completed=exams_completed,
-                         assignments_pending=assignments_pending,
-                         assignments_completed=assignments_completed)
+                         **stats)
 
 
 @student_bp.route('/classes')
@@ -285,40 +232,54 @@ def submit_assignment(assignment_id):
             flash(check['message'], 'error')
             return redirect(url_for('student.my_assignments'))
         
-        # Validate file upload
-        if 'video_file' not in request.files:
-            flash('Không tìm thấy file video', 'error')
-            return redirect(url_for('student.submit_assignment', assignment_id=assignment_id))
-        
-        video_file = request.files['video_file']
-        
-        if video_file.filename == '':
-            flash('Chưa chọn file', 'error')
-            return redirect(url_for('student.submit_assignment', assignment_id=assignment_id))
-        
-        # Kiểm tra định dạng file
-        allowed_extensions = {'mp4', 'avi', 'mov', 'mkv'}
-        file_ext = video_file.filename.rsplit('.', 1)[1].lower() if '.' in video_file.filename else ''
+        # File đã upload theo chunk (chỉ gửi upload_id) hoặc upload trực tiếp
+        upload_id = request.form.get('upload_id')
+        video_file = None
         
-        if file_ext not in allowed_extensions:
-            flash(f'Định dạng không hợp lệ. Chỉ chấp nhận: {", ".join(allowed_extensions)}', 'error')
-            return redirect(url_for('student.submit_assignment', assignment_id=assignment_id))
+        if not upload_id:
+            # Validate file upload
+            if 'video_file' not in request.files:
+                flash('Không tìm thấy file video', 'error')
+                return redirect(url_for('student.submit_assignment', assignment_id=assignment_id))
+            
+            video_file = request.files['video_file']
+            
+            if video_file.filename == '':
+                flash('Chưa chọn file', 'error')
+                return redirect(url_for('student.submit_assignment', assignment_id=assignment_id))
+            
+            # Kiểm tra định dạng file
+            allowed_extensions = {'mp4', 'avi', 'mov', 'mkv'}
+            file_ext = video_file.filename.rsplit('.', 1)[1].lower() if '.' in video_file.filename else ''
+            
+            if file_ext not in allowed_extensions:
+                flash(f'Định dạng không hợp lệ. Chỉ chấp nhận: {", ".join(allowed_extensions)}', 'error')
+                return redirect(url_for('student.submit_assignment', assignment_id=assignment_id))
         
         try:
             # Lấy thông tin assignment
             assignment = AssignmentService.get_assignment_by_id(assignment_id)
             
             # Lưu video với assignment_id
-            video = VideoService.save_video(
-                file=video_file,
-                student_id=session['user_id'],
-                routine_id=assignment.routine_id,
-                assignment_id=assignment_id,
-                notes=request.form.get('notes', '')
-            )
+            if upload_id:
+                video = VideoService.save_uploaded_video(
+                    upload_id=upload_id,
+                    student_id=session['user_id'],
+                    routine_id=assignment.routine_id,
+                    assignment_id=assignment_id,
+                    notes=request.form.get('notes', '')
+                )
+            else:
+                video = VideoService.save_video(
+                    file=video_file,
+                    student_id=session['user_id'],
+                    routine_id=assignment.routine_id,
+                    assignment_id=assignment_id,
+                    notes=request.form.get('notes', '')
+                )
             
-            # Trigger AI phân tích (nếu có)
-            AIService.process_video_mock(video.video_id)
+            # Đưa vào hàng đợi phân tích AI (xử lý nền)
+            AnalysisQueueService.enqueue(video.video_id)
             
             flash('Nộp bài thành công! Hệ thống đang phân tích video...', 'success')
             return redirect(url_for('student.my_assignments'))
@@ -394,13 +355,8 @@ def analytics():
     if TrainingVideo is not None:
         try:
             from sqlalchemy import func
-            # distinct routines
-            routines_practiced = (
-                TrainingVideo.query
-                .with_entities(func.count(func.distinct(TrainingVideo.routine_id)))
-                .filter(TrainingVideo.student_id == student_id)
-                .scalar() or 0
-            )
+            # distinct routines (get_routine_completion đã đếm)
+            routines_practiced = completion_stats.get('completed', 0)
             # distinct practice days
             distinct_days = (
                 TrainingVideo.query
@@ -496,6 +452,8 @@ def take_exam(exam_id: int):
     
     # Lấy video URL
     video_url = exam.get_video_url()
+    if video_url:
+        video_url = url_for('media.exam_reference', exam_id=exam.exam_id)
     
     return render_template(
         'student/take_exam.html',
@@ -521,23 +479,28 @@ def submit_exam(exam_id: int):
         flash(message, 'error')
         return redirect(url_for('student.my_exams'))
     
-    # Lấy video file
-    if 'student_video' not in request.files:
-        flash('Vui lòng ghi video làm bài', 'error')
-        return redirect(url_for('student.take_exam', exam_id=exam_id))
+    # File đã upload theo chunk (chỉ gửi upload_id) hoặc upload trực tiếp
+    upload_id = request.form.get('upload_id')
+    video_file = None
     
-    video_file = request.files['student_video']
-    if not video_file or video_file.filename == '':
-        flash('Vui lòng chọn video', 'error')
-        return redirect(url_for('student.take_exam', exam_id=exam_id))
-    
-    # Validate video format
-    allowed_extensions = {'mp4', 'avi', 'mov', 'webm'}
-    file_ext = video_file.filename.rsplit('.', 1)[1].lower() if '.' in video_file.filename else ''
-    
-    if file_ext not in allowed_extensions:
-        flash(f'Định dạng không hợp lệ. Chỉ chấp nhận: {", ".join(allowed_extensions)}', 'error')
-        return redirect(url_for('student.take_exam', exam_id=exam_id))
+    if not upload_id:
+        # Lấy video file
+        if 'student_video' not in request.files:
+            flash('Vui lòng ghi video làm bài', 'error')
+            return redirect(url_for('student.take_exam', exam_id=exam_id))
+        
+        video_file = request.files['student_video']
+        if not video_file or video_file.filename == '':
+            flash('Vui lòng chọn video', 'error')
+            return redirect(url_for('student.take_exam', exam_id=exam_id))
+        
+        # Validate video format
+        allowed_extensions = current_app.config['ALLOWED_EXAM_VIDEO_EXTENSIONS']
+        file_ext = video_file.filename.rsplit('.', 1)[1].lower() if '.' in video_file.filename else ''
+        
+        if file_ext not in allowed_extensions:
+            flash(f'Định dạng không hợp lệ. Chỉ chấp nhận: {", ".join(allowed_extensions)}', 'error')
+            return redirect(url_for('student.take_exam', exam_id=exam_id))
     
     try:
         # Nộp bài và lưu kết quả
@@ -545,7 +508,8 @@ def submit_exam(exam_id: int):
             exam_id=exam_id,
             student_id=session['user_id'],
             video_file=video_file,
-            notes=request.form.get('notes', '')
+            notes=request.form.get('notes', ''),
+            upload_id=upload_id
         )
         
         if result['success']:
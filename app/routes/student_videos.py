@@ -1,9 +1,12 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, session
 from app.forms.video_forms import VideoUploadForm, VideoFilterForm
 from app.services.video_service import VideoService
+from app.services.analysis_queue_service import AnalysisQueueService
 from app.services.ai_service import AIService
+from app.services.tiering_service import TieringService
 from app.models.martial_routine import MartialRoutine
 from app.models.assignment import Assignment
+from app.utils.pagination import cursor_args
 from functools import wraps
 
 student_videos_bp = Blueprint('student_videos', __name__, url_prefix='/student/videos')
@@ -49,17 +52,26 @@ def upload():
     
     if form.validate_on_submit():
         try:
-            # Lưu video
-            video = VideoService.save_video(
-                file=form.video_file.data,
-                student_id=session.get('user_id'),
-                routine_id=form.routine_id.data,
-                assignment_id=form.assignment_id.data if form.assignment_id.data else None,
-                notes=form.notes.data
-            )
+            # Lưu video (file đã upload theo chunk hoặc upload trực tiếp)
+            if form.upload_id.data:
+                video = VideoService.save_uploaded_video(
+                    upload_id=form.upload_id.data,
+                    student_id=session.get('user_id'),
+                    routine_id=form.routine_id.data,
+                    assignment_id=form.assignment_id.data if form.assignment_id.data else None,
+                    notes=form.notes.data
+                )
+            else:
+                video = VideoService.save_video(
+                    file=form.video_file.data,
+                    student_id=session.get('user_id'),
+                    routine_id=form.routine_id.data,
+                    assignment_id=form.assignment_id.data if form.assignment_id.data else None,
+                    notes=form.notes.data
+                )
             
-            # Trigger AI processing (mock)
-            AIService.process_video_mock(video.video_id)
+            # Đưa vào hàng đợi phân tích AI (xử lý nền)
+            AnalysisQueueService.enqueue(video.video_id)
             
             flash('Upload video thành công! Hệ thống đang phân tích...', 'success')
             return redirect(url_for('student_videos.history'))
@@ -107,11 +119,15 @@ def history():
     videos = VideoService.get_student_videos(
         student_id=session.get('user_id'),
         routine_id=routine_id,
-        status=status
+        status=status,
+        profile='video_history',
+        **cursor_args()
     )
+    total_videos = VideoService.count_student_videos(session.get('user_id'), routine_id, status)
     
     return render_template('student/video_history.html', 
                          videos=videos, 
+                         total_videos=total_videos,
                          filter_form=filter_form)
 
 @student_videos_bp.route('/result/<int:video_id>')
@@ -129,6 +145,10 @@ def view_result(video_id):
         flash('Bạn không có quyền xem video này', 'danger')
         return redirect(url_for('student_videos.history'))
     
+    # Video gốc cũ đã chấm có thể đã chuyển sang tầng cold: lấy lại để xem/tải bản gốc
+    if not TieringService.ensure_hot(result['video'].video_url):
+        flash('Không lấy lại được video gốc từ kho lưu trữ, đang phát bản chuyển mã (nếu có)', 'warning')
+    
     return render_template('student/video_result.html', **result)
 
 @student_videos_bp.route('/compare/<int:video_id>')
@@ -146,9 +166,18 @@ def compare(video_id):
         flash('Bạn không có quyền xem video này', 'danger')
         return redirect(url_for('student_videos.history'))
     
-    # Lấy video mẫu chuẩn
-    reference_video = video.routine.reference_video_url if video.routine else None
+    # Lấy video mẫu chuẩn (demo của bài tập nếu có)
+    reference_video = AIService.get_reference_video_url(video)
+    if reference_video:
+        # Stream qua /media (hỗ trợ Range) để tua video không phải tải lại từ đầu
+        reference_video = url_for('media.training_video_reference', video_id=video.video_id)
+    
+    # Độ lệch nhịp từng động tác (DTW) do worker phân tích tính sẵn
+    timing = None
+    if video.ai_analysis and video.ai_analysis.detailed_feedback:
+        timing = video.ai_analysis.detailed_feedback.get('timing')
     
     return render_template('student/video_compare.html', 
                          student_video=video, 
-                         reference_video=reference_video)
\ No newline at end of file
+                         reference_video=reference_video,
+                         timing=timing)
\ No newline at end of file
@@ -0,0 +1,111 @@
+from flask import Blueprint, request, session, jsonify, current_app
+from app.services.upload_service import UploadService
+from app.utils.decorators import login_required
+import re
+
+uploads_bp = Blueprint('uploads', __name__, url_prefix='/uploads')
+
+# Vai trò được phép theo mục đích upload
+PURPOSE_ROLES = {
+    'training': {'STUDENT'},
+    'exam': {'STUDENT'},
+    'exam_reference': {'INSTRUCTOR'},
+}
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+def _upload_json(upload, offset=None):
+    return {
+        'upload_id': upload.upload_id,
+        'offset': UploadService.current_offset(upload) if offset is None else offset,
+        'total_size': upload.total_size,
+        'status': upload.upload_status,
+        'sha256': upload.checksum_sha256,
+    }
+
+
+@uploads_bp.route('', methods=['POST'])
+@login_required
+def init_upload():
+    """Khởi tạo phiên upload theo chunk"""
+    data = request.get_json(silent=True) or {}
+    purpose = data.get('purpose', 'training')
+
+    if session.get('role_code') not in PURPOSE_ROLES.get(purpose, set()):
+        return jsonify({'message': 'Bạn không có quyền upload'}), 403
+
+    try:
+        size = int(data.get('size') or 0)
+    except (TypeError, ValueError):
+        size = 0
+
+    result = UploadService.init_upload(
+        user_id=session['user_id'],
+        filename=data.get('filename'),
+        total_size=size,
+        purpose=purpose,
+        expected_sha256=data.get('sha256')
+    )
+    if not result['success']:
+        return jsonify({'message': result['message']}), 400
+
+    payload = _upload_json(result['upload'], offset=0)
+    payload['chunk_size'] = current_app.config.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+    return jsonify(payload), 201
+
+
+@uploads_bp.route('/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    """Trạng thái phiên upload (client dùng offset để resume)"""
+    upload = UploadService.get_upload(upload_id, session['user_id'])
+    if not upload:
+        return jsonify({'message': 'Không tìm thấy phiên upload'}), 404
+    return jsonify(_upload_json(upload))
+
+
+@uploads_bp.route('/<upload_id>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id):
+    """Nhận một chunk. Offset lấy từ header Content-Range hoặc query ?offset="""
+    offset = request.args.get('offset', type=int)
+    content_range = request.headers.get('Content-Range')
+    if content_range:
+        match = CONTENT_RANGE_RE.match(content_range.strip())
+        if not match:
+            return jsonify({'message': 'Content-Range không hợp lệ'}), 400
+        offset = int(match.group(1))
+    if offset is None:
+        return jsonify({'message': 'Thiếu offset'}), 400
+
+    result = UploadService.append_chunk(
+        upload_id=upload_id,
+        user_id=session['user_id'],
+        offset=offset,
+        stream=request.stream,
+        length=request.content_length,
+        chunk_sha256=request.headers.get('X-Chunk-SHA256')
+    )
+    if not result['success']:
+        body = {'message': result['message']}
+        if 'offset' in result:
+            body['offset'] = result['offset']
+        return jsonify(body), result.get('status', 400)
+
+    return jsonify(_upload_json(result['upload'], offset=result['offset']))
+
+
+@uploads_bp.route('/<upload_id>/finalize', methods=['POST'])
+@login_required
+def finalize_upload(upload_id):
+    """Kết thúc upload: kiểm tra đủ byte và checksum toàn file (JSON {"sha256": ...})"""
+    data = request.get_json(silent=True) or {}
+    result = UploadService.finalize_upload(upload_id, session['user_id'], sha256=data.get('sha256'))
+    if not result['success']:
+        body = {'message': result['message']}
+        if 'offset' in result:
+            body['offset'] = result['offset']
+        return jsonify(body), result.get('status', 400)
+
+    return jsonify(_upload_json(result['upload']))
@@ -1,17 +1,30 @@
 from app.models.ai_analysis import AIAnalysisResult
 from app.models.training_video import TrainingVideo
+from app.services.score_summary_service import ScoreSummaryService
 from app import db
 from app.utils.helpers import get_vietnam_time
+from ai_models import inference_pool
+from ai_models.inference_pool import InferencePool
 from datetime import datetime
-import random
+from flask import current_app
+import atexit
+import os
+import threading
 import time
 import json
 
+_pool_lock = threading.Lock()
+
 class AIService:
     
     @staticmethod
     def process_video_mock(video_id):
-        """Xử lý video bằng AI (Mock/Giả lập)"""
+        """Xử lý video bằng AI.
+
+        Được gọi bởi worker của AnalysisQueueService, không gọi trực tiếp trong request.
+        Phần suy luận chạy trên InferencePool; ở đây chỉ đọc/ghi database.
+        """
+        video = None
         try:
             video = TrainingVideo.query.get(video_id)
             if not video:
@@ -21,30 +34,78 @@ class AIService:
             video.processing_status = 'processing'
             db.session.commit()
             
-            # Giả lập thời gian xử lý (2-5 giây)
-            time.sleep(random.uniform(2, 5))
-            
             # Lấy thông tin bài võ để tạo kết quả
             routine = video.routine
             weapon_name = routine.weapon.weapon_name_en if routine.weapon else "Unknown"
             
-            # Generate mock results
+            # So với video mẫu (demo của bài tập nếu có, ngược lại video mẫu của bài võ)
+            from app.services.reference_feature_service import ReferenceFeatureService
+            from app.services.transcode_service import TranscodeService
+            reference_url = AIService.get_reference_video_url(video)
+            
+            # Cùng nội dung đã được phân tích với cùng video mẫu: dùng lại kết quả, không suy luận lại
+            previous = AIService.find_reusable_analysis(video, reference_url)
+            if previous is not None:
+                analysis_result = AIAnalysisResult(
+                    video_id=video_id,
+                    weapon_detected=previous.weapon_detected,
+                    weapon_confidence=previous.weapon_confidence,
+                    overall_score=previous.overall_score,
+                    technique_score=previous.technique_score,
+                    posture_score=previous.posture_score,
+                    timing_score=previous.timing_score,
+                    detailed_feedback=previous.detailed_feedback,
+                    key_frames=previous.key_frames,
+                    errors_detected=previous.errors_detected,
+                    ai_model_version=previous.ai_model_version,
+                    processing_time_seconds=0.01,
+                    analyzed_at=get_vietnam_time()
+                )
+                ScoreSummaryService.record_ai_analysis(video, analysis_result)
+                db.session.add(analysis_result)
+                video.processing_status = 'completed'
+                video.processed_at = get_vietnam_time()
+                db.session.commit()
+                return analysis_result
+            
+            reference_dir = None
+            try:
+                reference_dir = ReferenceFeatureService.get_entry(reference_url)
+            except Exception as e:
+                print(f"Error loading reference features for {reference_url}: {e}")
+            
+            result = AIService.get_inference_pool().call(inference_pool.analyze_training_video, {
+                'video_path': TranscodeService.analysis_path(video),
+                'expected_weapon': weapon_name,
+                'reference_dir': reference_dir,
+                'difficulty_score': float(routine.difficulty_score or 1.0),
+                'pass_threshold': float(routine.pass_threshold or 70.0),
+                'duration_seconds': routine.duration_seconds,
+                'total_moves': routine.total_moves,
+            })
+            scores = result['scores']
+            
+            detailed_feedback = AIService.generate_mock_feedback(weapon_name)
+            if result['timing']:
+                detailed_feedback['timing'] = result['timing']
+            
             analysis_result = AIAnalysisResult(
                 video_id=video_id,
-                weapon_detected=weapon_name,
-                weapon_confidence=round(random.uniform(85, 98), 2),
-                overall_score=round(random.uniform(60, 95), 2),
-                technique_score=round(random.uniform(55, 95), 2),
-                posture_score=round(random.uniform(60, 95), 2),
-                timing_score=round(random.uniform(65, 95), 2),
-                detailed_feedback=AIService.generate_mock_feedback(weapon_name),
-                key_frames=AIService.generate_mock_keyframes(video.duration_seconds),
-                errors_detected=AIService.generate_mock_errors(),
-                ai_model_version="v1.0.0-mock",
-                processing_time_seconds=round(random.uniform(2, 5), 2),
+                weapon_detected=result['weapon_detected'],
+                weapon_confidence=result['weapon_confidence'],
+                overall_score=scores['overall_score'],
+                technique_score=scores['technique_score'],
+                posture_score=scores['posture_score'],
+                timing_score=scores['timing_score'],
+                detailed_feedback=detailed_feedback,
+                key_frames=result['key_frames'],
+                errors_detected=result['errors_detected'],
+                ai_model_version=scores['model_version'],
+                processing_time_seconds=result['processing_time_seconds'],
                 analyzed_at=get_vietnam_time()
             )
             
+            ScoreSummaryService.record_ai_analysis(video, analysis_result)
             db.session.add(analysis_result)
             
             # Cập nhật trạng thái video
@@ -60,10 +121,69 @@ class AIService:
         except Exception as e:
             db.session.rollback()
             # Cập nhật trạng thái thất bại
-            video.processing_status = 'failed'
-            db.session.commit()
+            if video is not None:
+                video.processing_status = 'failed'
+                db.session.commit()
             raise Exception(f"Lỗi khi xử lý AI: {str(e)}")
     
+    @staticmethod
+    def get_inference_pool():
+        """InferencePool dùng chung của app, tạo lần đầu khi cần (model nằm trong các process con)"""
+        app = current_app._get_current_object()
+        pool = app.extensions.get('inference_pool')
+        if pool is None:
+            with _pool_lock:
+                pool = app.extensions.get('inference_pool')
+                if pool is None:
+                    config = app.config
+                    settings = {
+                        'weapon_model_path': config.get('WEAPON_MODEL_PATH'),
+                        'weapon_batch_size': config.get('WEAPON_BATCH_SIZE', 16),
+                        'weapon_frame_stride': config.get('WEAPON_FRAME_STRIDE', 15),
+                        'weapon_max_frames': config.get('WEAPON_MAX_FRAMES', 64),
+                        'motion_model_path': config.get('MOTION_MODEL_PATH'),
+                        'motion_batch_size': config.get('MOTION_BATCH_SIZE', 8),
+                        'motion_sample_fps': config.get('MOTION_SAMPLE_FPS', 10),
+                        'roi': config.get('ANALYSIS_ROI'),
+                        'key_frame_folder': config.get('KEY_FRAME_FOLDER'),
+                    }
+                    pool = InferencePool(
+                        settings,
+                        processes=config.get('INFERENCE_PROCESSES', os.cpu_count() or 1),
+                        max_jobs_per_worker=config.get('INFERENCE_MAX_JOBS_PER_WORKER', 50),
+                        timeout=config.get('ANALYSIS_JOB_TIMEOUT')
+                    )
+                    app.extensions['inference_pool'] = pool
+                    atexit.register(pool.close)
+        return pool
+    
+    @staticmethod
+    def find_reusable_analysis(video, reference_url):
+        """Kết quả AI của video khác cùng nội dung (StorageService) và chấm theo cùng video mẫu"""
+        if not video.content_sha256:
+            return None
+        
+        candidates = AIAnalysisResult.query.join(
+            TrainingVideo, AIAnalysisResult.video_id == TrainingVideo.video_id
+        ).filter(
+            TrainingVideo.content_sha256 == video.content_sha256,
+            TrainingVideo.video_id != video.video_id
+        ).order_by(AIAnalysisResult.analyzed_at.desc()).all()
+        
+        for result in candidates:
+            if AIService.get_reference_video_url(result.video) == reference_url:
+                return result
+        return None
+    
+    @staticmethod
+    def get_reference_video_url(video):
+        """URL video mẫu để chấm: demo của bài tập nếu có, ngược lại video mẫu của bài võ"""
+        if video.assignment and video.assignment.instructor_video_url:
+            return video.assignment.instructor_video_url
+        if video.routine:
+            return video.routine.reference_video_url
+        return None
+    
     @staticmethod
     def generate_mock_feedback(weapon_name):
         """Tạo feedback giả lập"""
@@ -130,40 +250,3 @@ class AIService:
             "suggestions": feedback["suggestions"],
             "overall_comment": "Bạn đã có sự tiến bộ rõ rệt. Hãy tiếp tục luyện tập và cải thiện những điểm yếu."
         }
-    
-    @staticmethod
-    def generate_mock_keyframes(duration_seconds):
-        """Tạo key frames giả lập"""
-        num_frames = random.randint(5, 10)
-        key_frames = []
-        
-        for i in range(num_frames):
-            timestamp = random.randint(0, duration_seconds)
-            key_frames.append({
-                "timestamp": timestamp,
-                "description": f"Động tác quan trọng tại giây {timestamp}",
-                "score": round(random.uniform(60, 95), 2),
-                "note": random.choice([
-                    "Tư thế tốt",
-                    "Cần cải thiện",
-                    "Động tác chuẩn",
-                    "Lực chưa đủ",
-                    "Tốc độ hợp lý"
-                ])
-            })
-        
-        return sorted(key_frames, key=lambda x: x['timestamp'])
-    
-    @staticmethod
-    def generate_mock_errors():
-        """Tạo lỗi phát hiện giả lập"""
-        possible_errors = [
-            {"type": "posture", "description": "Tư thế đứng chưa vững tại giây 15", "severity": "medium"},
-            {"type": "technique", "description": "Động tác tay chưa chính xác tại giây 23", "severity": "high"},
-            {"type": "timing", "description": "Nhịp độ chưa đồng đều tại giây 30-35", "severity": "low"},
-            {"type": "weapon_grip", "description": "Cầm binh khí chưa đúng kỹ thuật", "severity": "medium"},
-            {"type": "movement", "description": "Di chuyển chưa mượt mà tại giây 42", "severity": "low"}
-        ]
-        
-        num_errors = random.randint(0, 3)
-        return random.sample(possible_errors, num_errors)
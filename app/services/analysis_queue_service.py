@@ -0,0 +1,274 @@
+from app.models import db
+from app.models.analysis_job import AnalysisJob
+from app.models.training_video import TrainingVideo
+from app.utils.helpers import get_vietnam_time_naive
+from datetime import timedelta
+from flask import current_app
+import os
+import socket
+import threading
+import time
+
+
+class AnalysisQueueService:
+    """Hàng đợi phân tích AI lưu trong DB (không cần broker ngoài).
+
+    Route chỉ ghi file + enqueue; worker (thread trong process web hoặc
+    `flask analysis-worker`) nhận job, chạy phân tích và retry có backoff.
+    """
+
+    # Đánh thức worker trong cùng process ngay khi có job mới (tránh chờ poll)
+    _wakeup = threading.Event()
+
+    @staticmethod
+    def enqueue(video_id):
+        """Đưa video vào hàng đợi phân tích, trả về job"""
+        existing = AnalysisJob.query.filter(
+            AnalysisJob.job_type == 'video_analysis',
+            AnalysisJob.video_id == video_id,
+            AnalysisJob.job_status.in_(['pending', 'running'])
+        ).first()
+        if existing:
+            return existing
+
+        job = AnalysisJob(
+            job_type='video_analysis',
+            video_id=video_id,
+            job_status='pending',
+            max_attempts=current_app.config.get('ANALYSIS_MAX_ATTEMPTS', 3),
+            run_after=get_vietnam_time_naive(),
+            created_at=get_vietnam_time_naive()
+        )
+        db.session.add(job)
+
+        video = TrainingVideo.query.get(video_id)
+        if video:
+            video.processing_status = 'pending'
+
+        db.session.commit()
+        AnalysisQueueService._wakeup.set()
+        return job
+
+    @staticmethod
+    def enqueue_reference_features(video_url):
+        """Đưa việc tính trước đặc trưng video mẫu vào hàng đợi.
+
+        Worker phân tích tính trên pool suy luận của nó; process web không tạo pool.
+        """
+        existing = AnalysisJob.query.filter(
+            AnalysisJob.job_type == 'reference_features',
+            AnalysisJob.target_url == video_url,
+            AnalysisJob.job_status == 'pending'
+        ).first()
+        if existing:
+            return existing
+
+        job = AnalysisJob(
+            job_type='reference_features',
+            target_url=video_url,
+            job_status='pending',
+            max_attempts=current_app.config.get('ANALYSIS_MAX_ATTEMPTS', 3),
+            run_after=get_vietnam_time_naive(),
+            created_at=get_vietnam_time_naive()
+        )
+        db.session.add(job)
+        db.session.commit()
+        AnalysisQueueService._wakeup.set()
+        return job
+
+    @staticmethod
+    def claim_next(worker_id):
+        """Nhận job kế tiếp đến hạn chạy. Dùng UPDATE có điều kiện để nhiều worker không nhận trùng."""
+        now = get_vietnam_time_naive()
+        candidates = db.session.query(AnalysisJob.job_id).filter(
+            AnalysisJob.job_status == 'pending',
+            AnalysisJob.run_after <= now
+        ).order_by(AnalysisJob.run_after, AnalysisJob.job_id).limit(5).all()
+
+        for (job_id,) in candidates:
+            claimed = AnalysisJob.query.filter_by(
+                job_id=job_id,
+                job_status='pending'
+            ).update({
+                'job_status': 'running',
+                'locked_by': worker_id,
+                'locked_at': now,
+                'attempts': AnalysisJob.attempts + 1
+            }, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return AnalysisJob.query.get(job_id)
+
+        return None
+
+    @staticmethod
+    def run_job(job):
+        """Chạy job đã nhận (phân tích video hoặc tính đặc trưng video mẫu) và cập nhật trạng thái"""
+        from app.services.ai_service import AIService
+        from app.services.transcode_service import TranscodeService
+        from app.services.reference_feature_service import ReferenceFeatureService
+
+        # Thời gian từng bước lưu vào job (không giữ trong bộ nhớ process worker)
+        timings = {'transcode_seconds': None, 'inference_seconds': None, 'total_seconds': None}
+        started = time.perf_counter()
+        stage, stage_started = 'transcode', started
+        try:
+            if job.job_type == 'reference_features':
+                stage = 'inference'
+                ReferenceFeatureService.get_entry(job.target_url)
+            else:
+                # Chuyển mã trước (HLS + proxy), phân tích đọc bản proxy nhỏ hơn
+                TranscodeService.transcode_video(job.video_id)
+                timings['transcode_seconds'] = time.perf_counter() - stage_started
+                stage, stage_started = 'inference', time.perf_counter()
+                AIService.process_video_mock(job.video_id)
+            timings['inference_seconds'] = time.perf_counter() - stage_started
+        except Exception as e:
+            db.session.rollback()
+            timings[f'{stage}_seconds'] = time.perf_counter() - stage_started
+            if job.job_type != 'reference_features':
+                timings['total_seconds'] = time.perf_counter() - started
+            AnalysisQueueService._mark_failed(job.job_id, e, timings)
+            return False
+
+        if job.job_type != 'reference_features':
+            timings['total_seconds'] = time.perf_counter() - started
+        for name, value in timings.items():
+            setattr(job, name, value)
+        job.job_status = 'completed'
+        job.finished_at = get_vietnam_time_naive()
+        job.last_error = None
+        db.session.commit()
+        return True
+
+    @staticmethod
+    def retry_delay(attempts):
+        """Exponential backoff: base * 2^(attempts-1), có giới hạn trên"""
+        base = current_app.config.get('ANALYSIS_RETRY_BASE_SECONDS', 30)
+        cap = current_app.config.get('ANALYSIS_RETRY_MAX_SECONDS', 1800)
+        return min(cap, base * (2 ** max(attempts - 1, 0)))
+
+    @staticmethod
+    def _mark_failed(job_id, error, timings=None):
+        job = AnalysisJob.query.get(job_id)
+        if not job:
+            return
+
+        for name, value in (timings or {}).items():
+            setattr(job, name, value)
+        job.last_error = str(error)[:2000]
+        job.locked_by = None
+        job.locked_at = None
+        video = TrainingVideo.query.get(job.video_id) if job.video_id else None
+
+        if job.attempts < job.max_attempts:
+            # Còn lượt: quay lại pending, chờ backoff
+            job.job_status = 'pending'
+            job.run_after = get_vietnam_time_naive() + timedelta(seconds=AnalysisQueueService.retry_delay(job.attempts))
+            if video:
+                video.processing_status = 'pending'
+        else:
+            job.job_status = 'failed'
+            job.finished_at = get_vietnam_time_naive()
+            if video:
+                video.processing_status = 'failed'
+
+        db.session.commit()
+
+    @staticmethod
+    def requeue_stale_jobs():
+        """Trả các job 'running' quá hạn (worker chết giữa chừng) về pending"""
+        timeout = current_app.config.get('ANALYSIS_JOB_TIMEOUT', 1800)
+        cutoff = get_vietnam_time_naive() - timedelta(seconds=timeout)
+        count = AnalysisJob.query.filter(
+            AnalysisJob.job_status == 'running',
+            AnalysisJob.locked_at < cutoff
+        ).update({
+            'job_status': 'pending',
+            'locked_by': None,
+            'locked_at': None,
+            'run_after': get_vietnam_time_naive()
+        }, synchronize_session=False)
+        db.session.commit()
+        return count
+
+    @staticmethod
+    def get_queue_depth():
+        """Số job đang chờ chạy"""
+        return AnalysisJob.query.filter_by(job_status='pending').count()
+
+    @staticmethod
+    def get_job_for_video(video_id):
+        return AnalysisJob.query.filter_by(video_id=video_id).order_by(AnalysisJob.job_id.desc()).first()
+
+
+class AnalysisWorkerPool:
+    """Pool thread xử lý job phân tích trong một process"""
+
+    def __init__(self, app, size=None):
+        self.app = app
+        self.size = size if size is not None else app.config.get('ANALYSIS_WORKERS', 2)
+        self._stop = threading.Event()
+        self._threads = []
+        # Quét job treo định kỳ (worker ở process khác chết thì job 'running' của nó không bị kẹt
+        # tới lần khởi động lại), một thread trong process làm mỗi ANALYSIS_JOB_TIMEOUT/2
+        self._requeue_lock = threading.Lock()
+        self._next_requeue = 0.0
+
+    def start(self):
+        if self._threads:
+            return self
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for i in range(self.size):
+            thread = threading.Thread(
+                target=self._run,
+                args=(f"{prefix}:{i}",),
+                name=f"analysis-worker-{i}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        AnalysisQueueService._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _requeue_due(self):
+        with self._requeue_lock:
+            now = time.monotonic()
+            if now < self._next_requeue:
+                return False
+            self._next_requeue = now + self.app.config.get('ANALYSIS_JOB_TIMEOUT', 1800) / 2
+            return True
+
+    def _run(self, worker_id):
+        poll_interval = self.app.config.get('ANALYSIS_POLL_INTERVAL', 2)
+        with self.app.app_context():
+            while not self._stop.is_set():
+                if self._requeue_due():
+                    try:
+                        AnalysisQueueService.requeue_stale_jobs()
+                    except Exception as e:
+                        db.session.rollback()
+                        self.app.logger.warning(f"Analysis worker {worker_id}: requeue error: {e!r}")
+                try:
+                    job = AnalysisQueueService.claim_next(worker_id)
+                    if job is None:
+                        AnalysisQueueService._wakeup.wait(poll_interval)
+                        AnalysisQueueService._wakeup.clear()
+                        continue
+                    AnalysisQueueService.run_job(job)
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Analysis worker {worker_id} error: {e!r}")
+                    self._stop.wait(poll_interval)
+                finally:
+                    db.session.remove()
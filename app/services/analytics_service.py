@@ -6,45 +6,85 @@ from app.models.manual_evaluation import ManualEvaluation
 from app.models.class_enrollment import ClassEnrollment
 from app.models.class_model import Class
 from app.models.user import User
+from app.models.role import Role
 from app.models.assignment import Assignment
+from app.services.score_summary_service import ScoreSummaryService
+from app.services.trend_rollup_service import TrendRollupService
+from app.utils.cache import cached
 from app.utils.helpers import get_vietnam_time, get_vietnam_time_naive
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_
+from sqlalchemy.orm import selectinload
 
 class AnalyticsService:
     
     # ============ STUDENT ANALYTICS ============
     
     @staticmethod
+    @cached(tags=('student:{student_id}',))
     def get_student_overview(student_id):
-        """Tổng quan học viên"""
-        total_videos = TrainingVideo.query.filter_by(student_id=student_id).count()
-        
-        # Điểm trung bình từ AI
-        avg_ai_score = db.session.query(func.avg(AIAnalysisResult.overall_score)).join(
-            TrainingVideo
-        ).filter(TrainingVideo.student_id == student_id).scalar() or 0
-        
-        # Điểm trung bình từ giảng viên
-        avg_manual_score = db.session.query(func.avg(ManualEvaluation.overall_score)).join(
-            TrainingVideo
-        ).filter(TrainingVideo.student_id == student_id).scalar() or 0
-        
-        # Số lần đạt
-        passed_count = ManualEvaluation.query.join(TrainingVideo).filter(
-            TrainingVideo.student_id == student_id,
-            ManualEvaluation.is_passed == True
-        ).count()
+        """Tổng quan học viên (đọc từ bảng tổng hợp điểm)"""
+        summary = ScoreSummaryService.get_summary(student_id)
+        total_videos = summary.video_count
+        passed_count = summary.passed_count
         
         return {
             'total_videos': total_videos,
-            'avg_ai_score': round(float(avg_ai_score), 2),
-            'avg_manual_score': round(float(avg_manual_score), 2),
+            'avg_ai_score': ScoreSummaryService.average(summary, 'ai'),
+            'avg_manual_score': ScoreSummaryService.average(summary, 'manual'),
             'passed_count': passed_count,
             'pass_rate': round((passed_count / total_videos * 100) if total_videos > 0 else 0, 2)
         }
     
     @staticmethod
+    @cached(tags=('student:{student_id}', 'exams', 'assignments'), ttl=60)
+    def get_student_dashboard_stats(student_id):
+        """Số liệu nhanh trên dashboard học viên: lớp, bài kiểm tra, bài tập
+        
+        TTL ngắn vì trạng thái bài kiểm tra (sắp diễn ra/đang mở) đổi theo thời gian.
+        """
+        from app.models.exam_result import ExamResult
+        from app.services.exam_service import ExamService
+        from app.services.assignment_service import AssignmentService
+        
+        enrollment_counts = dict(db.session.query(
+            ClassEnrollment.enrollment_status, func.count(ClassEnrollment.enrollment_id)
+        ).filter(ClassEnrollment.student_id == student_id).group_by(ClassEnrollment.enrollment_status).all())
+        
+        # Bài kiểm tra: một query lấy các bài đã thi thay vì một query mỗi bài
+        now = get_vietnam_time_naive()
+        attempted = {row[0] for row in db.session.query(ExamResult.exam_id).filter(
+            ExamResult.student_id == student_id
+        ).distinct().all()}
+        exams_upcoming = exams_available = exams_completed = 0
+        for exam in ExamService.get_exams_for_student(student_id):
+            if exam.exam_id in attempted:
+                exams_completed += 1
+            elif now < exam.start_time:
+                exams_upcoming += 1
+            elif now <= exam.end_time:
+                exams_available += 1
+        
+        # Bài tập còn hạn: đã nộp nếu có ít nhất một video cho bài tập đó
+        submitted = {row[0] for row in db.session.query(TrainingVideo.assignment_id).filter(
+            TrainingVideo.student_id == student_id,
+            TrainingVideo.assignment_id.isnot(None)
+        ).distinct().all()}
+        assignments = AssignmentService.get_active_assignments_for_student(student_id)
+        assignments_completed = sum(1 for a in assignments if a.assignment_id in submitted)
+        
+        return {
+            'active_classes': enrollment_counts.get('active', 0),
+            'completed_classes': enrollment_counts.get('completed', 0),
+            'exams_upcoming': exams_upcoming,
+            'exams_available': exams_available,
+            'exams_completed': exams_completed,
+            'assignments_pending': len(assignments) - assignments_completed,
+            'assignments_completed': assignments_completed,
+        }
+    
+    @staticmethod
+    @cached(tags=('student:{student_id}', 'routines'))
     def get_score_progression(student_id, days=30):
         """Biểu đồ điểm số theo thời gian"""
         cutoff_date = get_vietnam_time_naive() - timedelta(days=days)
@@ -52,6 +92,10 @@ class AnalyticsService:
         videos = TrainingVideo.query.filter(
             TrainingVideo.student_id == student_id,
             TrainingVideo.uploaded_at >= cutoff_date
+        ).options(
+            selectinload(TrainingVideo.ai_analysis),
+            selectinload(TrainingVideo.manual_evaluations),
+            selectinload(TrainingVideo.routine)
         ).order_by(TrainingVideo.uploaded_at).all()
         
         data = []
@@ -79,6 +123,7 @@ class AnalyticsService:
         return data
     
     @staticmethod
+    @cached(tags=('student:{student_id}', 'routines'))
     def get_routine_completion(student_id):
         """Tỷ lệ hoàn thành bài võ"""
         from app.models.martial_routine import MartialRoutine
@@ -96,26 +141,22 @@ class AnalyticsService:
         }
     
     @staticmethod
+    @cached(tags=('student:{student_id}',))
     def get_strengths_weaknesses(student_id):
         """Phân tích điểm mạnh/yếu (radar chart data)"""
-        # Lấy điểm trung bình các tiêu chí
-        avg_scores = db.session.query(
-            func.avg(AIAnalysisResult.technique_score).label('technique'),
-            func.avg(AIAnalysisResult.posture_score).label('posture'),
-            func.avg(AIAnalysisResult.timing_score).label('timing')
-        ).join(TrainingVideo).filter(
-            TrainingVideo.student_id == student_id
-        ).first()
+        # Điểm trung bình các tiêu chí AI từ bảng tổng hợp
+        summary = ScoreSummaryService.get_summary(student_id)
         
         return {
-            'technique': round(float(avg_scores.technique or 0), 2),
-            'posture': round(float(avg_scores.posture or 0), 2),
-            'timing': round(float(avg_scores.timing or 0), 2)
+            'technique': ScoreSummaryService.average(summary, 'technique'),
+            'posture': ScoreSummaryService.average(summary, 'posture'),
+            'timing': ScoreSummaryService.average(summary, 'timing')
         }
     
     # ============ INSTRUCTOR ANALYTICS ============
     
     @staticmethod
+    @cached(tags=('class:{class_id}', 'scores'))
     def get_class_overview(class_id):
         """Tổng quan lớp học"""
         enrollments = ClassEnrollment.query.filter_by(
@@ -140,7 +181,10 @@ class AnalyticsService:
             .filter(
                 TrainingVideo.student_id.in_(student_ids),
                 Assignment.assigned_to_class == class_id
-            ).all()
+            )
+            # Nạp điểm của mọi video trong 2 query thay vì 2 query mỗi video
+            .options(selectinload(TrainingVideo.manual_evaluations), selectinload(TrainingVideo.ai_analysis))
+            .all()
         )
 
         scores = []
@@ -184,55 +228,93 @@ class AnalyticsService:
         """Điểm trung bình của một học viên trong phạm vi các assignment của lớp chỉ định.
         Ưu tiên điểm chấm tay; nếu không có thì dùng điểm AI.
         """
-        videos = (
-            TrainingVideo.query
-            .join(Assignment, TrainingVideo.assignment_id == Assignment.assignment_id)
-            .filter(
-                TrainingVideo.student_id == student_id,
-                Assignment.assigned_to_class == class_id
-            ).all()
-        )
-
-        scores: list[float] = []
-        for v in videos:
-            manual_score = v.manual_evaluations[0].overall_score if v.manual_evaluations else None
-            ai_score = v.ai_analysis.overall_score if v.ai_analysis else None
-            picked = manual_score if manual_score is not None else ai_score
-            if picked is not None:
-                scores.append(float(picked))
+        return ScoreSummaryService.average(ScoreSummaryService.get_summary(student_id, class_id), 'scored')
 
-        return round(sum(scores) / len(scores), 2) if scores else 0.0
+    @staticmethod
+    def get_student_avgs_for_class(class_id: int, student_ids: list) -> dict:
+        """Như get_student_avg_for_class cho nhiều học viên cùng lúc (một query)"""
+        summaries = ScoreSummaryService.get_class_summaries(class_id, student_ids)
+        return {student_id: ScoreSummaryService.average(row, 'scored') for student_id, row in summaries.items()}
     
     @staticmethod
-    def get_student_ranking(class_id):
-        """Xếp hạng học viên trong lớp"""
-        enrollments = ClassEnrollment.query.filter_by(
-            class_id=class_id,
-            enrollment_status='active'
-        ).all()
+    def get_class_weekly_progress(class_id, student_ids, weeks=4):
+        """Điểm trung bình lớp theo tuần (tuần hiện tại cuối cùng), đọc bucket tuần đã gom sẵn.
         
-        student_ids = [e.student_id for e in enrollments]
+        Mỗi tuần lấy trung bình của điểm trung bình từng học viên để học viên nộp nhiều không làm lệch.
         
-        rankings = []
-        for student_id in student_ids:
-            student = User.query.get(student_id)
-            
-            avg_score = db.session.query(func.avg(ManualEvaluation.overall_score)).join(
-                TrainingVideo
-            ).filter(TrainingVideo.student_id == student_id).scalar() or 0
-            
-            video_count = TrainingVideo.query.filter_by(student_id=student_id).count()
-            
-            rankings.append({
-                'student': student,
-                'avg_score': round(float(avg_score), 2),
-                'video_count': video_count
-            })
+        Returns:
+            list: điểm mỗi tuần (0 nếu tuần không có điểm)
+        """
+        today = get_vietnam_time_naive().date()
+        current_week = today - timedelta(days=today.weekday())
+        week_starts = [current_week - timedelta(weeks=weeks - 1 - i) for i in range(weeks)]
+        
+        per_student = {start: [] for start in week_starts}
+        student_ids = set(student_ids)
+        if student_ids:
+            TrendRollupService.refresh()
+            for bucket in TrendRollupService.get_buckets('week', 'class', class_id, start=week_starts[0],
+                                                          student_id=None):
+                if bucket.student_id in student_ids and bucket.score_count and bucket.bucket_start in per_student:
+                    per_student[bucket.bucket_start].append(float(bucket.score_sum) / bucket.score_count)
+        
+        return [round(sum(scores) / len(scores), 1) if scores else 0 for scores in per_student.values()]
+    
+    @staticmethod
+    def get_student_ranking(class_id, page=None, per_page=20):
+        """Xếp hạng học viên trong lớp (một câu query, không phụ thuộc sĩ số)
         
-        # Sort by avg_score descending
-        rankings.sort(key=lambda x: x['avg_score'], reverse=True)
+        Điểm trung bình (giảng viên chấm) và số video tính trên mọi video của học viên.
+        Bằng điểm thì xếp theo số video, rồi tên, rồi user_id để thứ tự luôn ổn định giữa các trang.
+        
+        Args:
+            page: trang (bắt đầu từ 1); None = toàn bộ lớp
+        """
+        enrolled = db.session.query(ClassEnrollment.student_id).filter(
+            ClassEnrollment.class_id == class_id,
+            ClassEnrollment.enrollment_status == 'active'
+        )
         
-        return rankings
+        # Gom theo học viên trong subquery trước khi join để video nhiều lượt chấm không bị đếm lặp
+        video_counts = db.session.query(
+            TrainingVideo.student_id,
+            func.count(TrainingVideo.video_id).label('video_count')
+        ).filter(TrainingVideo.student_id.in_(enrolled)).group_by(TrainingVideo.student_id).subquery()
+        
+        scores = db.session.query(
+            TrainingVideo.student_id,
+            func.avg(ManualEvaluation.overall_score).label('avg_score')
+        ).join(ManualEvaluation, ManualEvaluation.video_id == TrainingVideo.video_id).filter(
+            TrainingVideo.student_id.in_(enrolled)
+        ).group_by(TrainingVideo.student_id).subquery()
+        
+        avg_score = func.coalesce(scores.c.avg_score, 0)
+        video_count = func.coalesce(video_counts.c.video_count, 0)
+        query = db.session.query(User, avg_score, video_count).join(
+            ClassEnrollment, ClassEnrollment.student_id == User.user_id
+        ).outerjoin(
+            scores, scores.c.student_id == User.user_id
+        ).outerjoin(
+            video_counts, video_counts.c.student_id == User.user_id
+        ).filter(
+            ClassEnrollment.class_id == class_id,
+            ClassEnrollment.enrollment_status == 'active'
+        ).order_by(avg_score.desc(), video_count.desc(), User.full_name, User.user_id)
+        
+        offset = 0
+        if page:
+            offset = (max(page, 1) - 1) * per_page
+            query = query.offset(offset).limit(per_page)
+        
+        return [
+            {
+                'rank': offset + index + 1,
+                'student': student,
+                'avg_score': round(float(score), 2),
+                'video_count': int(count)
+            }
+            for index, (student, score, count) in enumerate(query.all())
+        ]
     
     @staticmethod
     def get_routine_usage_stats(instructor_id):
@@ -260,6 +342,7 @@ class AnalyticsService:
     # ============ MANAGER ANALYTICS ============
     
     @staticmethod
+    @cached(tags=('users', 'classes', 'scores'))
     def get_system_overview():
         """Tổng quan toàn hệ thống"""
         total_students = User.query.join(User.role).filter(
@@ -290,66 +373,73 @@ class AnalyticsService:
     
     @staticmethod
     def get_instructor_performance():
-        """Hiệu suất giảng viên"""
-        instructors = User.query.join(User.role).filter(
-            User.role.has(role_code='INSTRUCTOR'),
+        """Hiệu suất giảng viên (một câu query, không phụ thuộc số giảng viên)"""
+        class_counts = db.session.query(
+            Class.instructor_id,
+            func.count(Class.class_id).label('total_classes')
+        ).filter(Class.is_active == True).group_by(Class.instructor_id).subquery()
+        
+        # Cặp (giảng viên, học viên) không trùng: học viên học nhiều lớp của cùng giảng viên chỉ tính một lần
+        pairs = db.session.query(
+            Class.instructor_id,
+            ClassEnrollment.student_id
+        ).join(ClassEnrollment, ClassEnrollment.class_id == Class.class_id).filter(
+            ClassEnrollment.enrollment_status == 'active'
+        ).distinct().subquery()
+        
+        student_counts = db.session.query(
+            pairs.c.instructor_id,
+            func.count(pairs.c.student_id).label('total_students')
+        ).group_by(pairs.c.instructor_id).subquery()
+        
+        scores = db.session.query(
+            pairs.c.instructor_id,
+            func.avg(ManualEvaluation.overall_score).label('avg_score')
+        ).join(
+            TrainingVideo, TrainingVideo.student_id == pairs.c.student_id
+        ).join(
+            ManualEvaluation, ManualEvaluation.video_id == TrainingVideo.video_id
+        ).group_by(pairs.c.instructor_id).subquery()
+        
+        avg_score = func.coalesce(scores.c.avg_score, 0)
+        rows = db.session.query(
+            User,
+            func.coalesce(class_counts.c.total_classes, 0),
+            func.coalesce(student_counts.c.total_students, 0),
+            avg_score
+        ).join(
+            Role, Role.role_id == User.role_id
+        ).outerjoin(
+            class_counts, class_counts.c.instructor_id == User.user_id
+        ).outerjoin(
+            student_counts, student_counts.c.instructor_id == User.user_id
+        ).outerjoin(
+            scores, scores.c.instructor_id == User.user_id
+        ).filter(
+            Role.role_code == 'INSTRUCTOR',
             User.is_active == True
-        ).all()
+        ).order_by(avg_score.desc(), User.full_name, User.user_id).all()
         
-        performance = []
-        for instructor in instructors:
-            classes = Class.query.filter_by(
-                instructor_id=instructor.user_id,
-                is_active=True
-            ).count()
-            
-            # Lấy tất cả học viên của giảng viên
-            enrollments = db.session.query(ClassEnrollment.student_id).join(Class).filter(
-                Class.instructor_id == instructor.user_id,
-                ClassEnrollment.enrollment_status == 'active'
-            ).distinct().all()
-            
-            student_count = len(enrollments)
-            
-            # Điểm trung bình của học viên
-            student_ids = [e[0] for e in enrollments]
-            avg_score = 0
-            if student_ids:
-                avg_score = db.session.query(func.avg(ManualEvaluation.overall_score)).join(
-                    TrainingVideo
-                ).filter(TrainingVideo.student_id.in_(student_ids)).scalar() or 0
-            
-            performance.append({
+        return [
+            {
                 'instructor': instructor,
-                'total_classes': classes,
-                'total_students': student_count,
-                'avg_student_score': round(float(avg_score), 2)
-            })
-        
-        return sorted(performance, key=lambda x: x['avg_student_score'], reverse=True)
+                'total_classes': int(classes),
+                'total_students': int(students),
+                'avg_student_score': round(float(score), 2)
+            }
+            for instructor, classes, students, score in rows
+        ]
     
     @staticmethod
+    @cached(tags=('scores',))
     def get_trends_data(days=30):
-        """Xu hướng theo thời gian"""
-        cutoff_date = get_vietnam_time_naive() - timedelta(days=days)
+        """Xu hướng theo thời gian (đọc bucket ngày đã gom sẵn)"""
+        cutoff_date = (get_vietnam_time_naive() - timedelta(days=days)).date()
         
-        # Video uploads per day
-        videos_by_day = db.session.query(
-            func.date(TrainingVideo.uploaded_at).label('date'),
-            func.count(TrainingVideo.video_id).label('count')
-        ).filter(
-            TrainingVideo.uploaded_at >= cutoff_date
-        ).group_by(func.date(TrainingVideo.uploaded_at)).all()
-        
-        # Evaluations per day
-        evals_by_day = db.session.query(
-            func.date(ManualEvaluation.evaluated_at).label('date'),
-            func.count(ManualEvaluation.evaluation_id).label('count')
-        ).filter(
-            ManualEvaluation.evaluated_at >= cutoff_date
-        ).group_by(func.date(ManualEvaluation.evaluated_at)).all()
+        TrendRollupService.refresh()
+        buckets = TrendRollupService.get_buckets('day', 'system', start=cutoff_date)
         
         return {
-            'videos': [{'date': str(v.date), 'count': v.count} for v in videos_by_day],
-            'evaluations': [{'date': str(e.date), 'count': e.count} for e in evals_by_day]
+            'videos': [{'date': str(b.bucket_start), 'count': b.upload_count} for b in buckets if b.upload_count],
+            'evaluations': [{'date': str(b.bucket_start), 'count': b.evaluation_count} for b in buckets if b.evaluation_count]
         }
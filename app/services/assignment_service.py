@@ -5,6 +5,11 @@ from app.models.user import User
 from app.models.class_enrollment import ClassEnrollment
 from app.models.training_video import TrainingVideo
 from app.models.class_model import Class
+from app.services.reference_feature_service import ReferenceFeatureService
+from app.services.score_summary_service import ScoreSummaryService
+from app.services.trend_rollup_service import TrendRollupService
+from app.utils.loader_profiles import loader_options
+from app.utils.pagination import keyset_paginate
 
 
 class AssignmentService:
@@ -76,6 +81,9 @@ class AssignmentService:
                     db.session.add(notification)
             
             db.session.commit()
+
+            # Tính trước đặc trưng video demo để chấm bài nộp không phải phân tích lại
+            ReferenceFeatureService.warm_async(assignment.instructor_video_url)
             return {'success': True, 'assignment': assignment}
             
         except Exception as e:
@@ -83,7 +91,7 @@ class AssignmentService:
             return {'success': False, 'message': str(e)}
 
     @staticmethod
-    def get_assignments_by_instructor(instructor_id: int, filters: dict | None = None):
+    def _instructor_assignments_query(instructor_id: int, filters: dict | None = None):
         query = Assignment.query.filter_by(assigned_by=instructor_id)
         if filters:
             assignment_type = filters.get('assignment_type')
@@ -95,7 +103,18 @@ class AssignmentService:
                 query = query.filter_by(priority=priority)
 
             # status filter (pending/submitted/graded) requires joins/aggregation; skipping server-side for now
-        return query.order_by(Assignment.created_at.desc()).all()
+        return query
+
+    @staticmethod
+    def get_assignments_by_instructor(instructor_id: int, filters: dict | None = None, profile: str | None = None,
+                                      after: str | None = None, before: str | None = None, per_page: int | None = None):
+        """Một trang bài tập giảng viên đã giao, mới nhất trước (KeysetPage)"""
+        query = AssignmentService._instructor_assignments_query(instructor_id, filters).options(*loader_options(profile))
+        return keyset_paginate(query, Assignment.created_at, Assignment.assignment_id, after, before, per_page)
+
+    @staticmethod
+    def count_assignments_by_instructor(instructor_id: int, filters: dict | None = None):
+        return AssignmentService._instructor_assignments_query(instructor_id, filters).count()
 
     @staticmethod
     def get_assignment_by_id(assignment_id: int):
@@ -161,8 +180,15 @@ class AssignmentService:
             return {'success': False, 'message': 'Không tìm thấy bài tập'}
         if assignment.assigned_by != instructor_id:
             return {'success': False, 'message': 'Bạn không có quyền xóa bài tập này'}
+        # Video của bài tập không còn thuộc lớp: tính lại tổng hợp điểm của các học viên đã nộp
+        # và rollup xu hướng của những ngày có video nộp
+        submitted = db.session.query(TrainingVideo.student_id, db.func.date(TrainingVideo.uploaded_at)).filter(
+            TrainingVideo.assignment_id == assignment_id
+        ).distinct().all()
         db.session.delete(assignment)
         db.session.commit()
+        ScoreSummaryService.rebuild({student_id for student_id, _ in submitted})
+        TrendRollupService.refresh_days({day for _, day in submitted})
         return {'success': True}
 
     @staticmethod
@@ -0,0 +1,375 @@
+from app.models import db
+from app.utils.helpers import get_vietnam_time_naive
+from flask import current_app
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+
+CHUNK_COMPRESSED = b'z'
+CHUNK_RAW = b'r'  # Nén không nhỏ hơn (video H.264...): lưu nguyên để khỏi tốn CPU khi restore
+
+# File đang ghi dở trong kho upload, không sao lưu
+SKIP_DIRS = {'tmp'}
+SKIP_MARKERS = ('.tmp-', '.parts-')
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    raise TypeError(f"Không serialize được {type(value).__name__}")
+
+
+class _ChunkStore:
+    """Kho chunk theo nội dung (chunks/<2 ký tự đầu>/<sha256>): chunk đã có thì không ghi lại.
+
+    Băm ở thread gọi, nén + ghi ở pool (zlib nhả GIL nên nén song song thật sự);
+    số chunk đang chờ bị giới hạn để bộ nhớ không tăng theo kích thước file.
+    """
+
+    def __init__(self, folder, workers, level):
+        self.folder = folder
+        self.level = level
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='backup-chunk')
+        self.pending = deque()
+        self.max_pending = workers * 2
+        self.seen = set()
+        self.lock = threading.Lock()
+        self.chunks_written = 0
+        self.bytes_written = 0
+
+    def path(self, digest):
+        return os.path.join(self.folder, digest[:2], digest)
+
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self.seen:
+            return digest
+        self.seen.add(digest)
+        if os.path.exists(self.path(digest)):
+            return digest
+
+        self.pending.append(self.executor.submit(self._write, digest, data))
+        while len(self.pending) > self.max_pending:
+            self.pending.popleft().result()
+        return digest
+
+    def _write(self, digest, data):
+        compressed = zlib.compress(data, self.level)
+        payload = CHUNK_COMPRESSED + compressed if len(compressed) < len(data) else CHUNK_RAW + data
+
+        path = self.path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.chunks_written += 1
+            self.bytes_written += len(payload)
+
+    def close(self):
+        try:
+            while self.pending:
+                self.pending.popleft().result()
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def get(self, digest):
+        with open(self.path(digest), 'rb') as f:
+            payload = f.read()
+        data = zlib.decompress(payload[1:]) if payload[:1] == CHUNK_COMPRESSED else payload[1:]
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Chunk {digest} bị hỏng")
+        return data
+
+
+class BackupService:
+    """Sao lưu database + thư mục upload theo kiểu tăng dần, khử trùng lặp.
+
+    Mỗi lần sao lưu tạo một snapshot (snapshots/<id>.json.gz) liệt kê các bảng và file,
+    mỗi file là danh sách chunk BACKUP_CHUNK_SIZE byte đặt tên theo SHA-256. File có cùng
+    kích thước + mtime với snapshot trước thì dùng lại danh sách chunk, không đọc lại;
+    chunk đã có trong kho không ghi lại. Vì vậy lần sao lưu hằng đêm chỉ đọc và ghi video mới.
+    Manifest được ghi sau cùng nên một lần sao lưu bị ngắt không để lại snapshot dở.
+    """
+
+    CHUNK_MIN_AGE_SECONDS = 24 * 3600
+    SNAPSHOT_ID_FORMAT = '%Y%m%dT%H%M%S-%f'
+
+    @staticmethod
+    def _folder():
+        return current_app.config.get('BACKUP_FOLDER', 'instance/backups')
+
+    @staticmethod
+    def _snapshot_folder():
+        return os.path.join(BackupService._folder(), 'snapshots')
+
+    @staticmethod
+    def _chunk_store(workers=None):
+        config = current_app.config
+        return _ChunkStore(
+            os.path.join(BackupService._folder(), 'chunks'),
+            workers or config.get('BACKUP_WORKERS') or os.cpu_count() or 1,
+            config.get('BACKUP_COMPRESSLEVEL', 3)
+        )
+
+    @staticmethod
+    def backup_paths():
+        """Các thư mục media cần sao lưu (kho upload và tầng cold)"""
+        config = current_app.config
+        paths = config.get('BACKUP_PATHS') or [
+            config.get('UPLOAD_FOLDER', 'instance/media'),
+            config.get('COLD_STORAGE_FOLDER', 'instance/cold_storage'),
+        ]
+        return [path for path in paths if os.path.isdir(path)]
+
+    @staticmethod
+    def snapshot_ids():
+        """ID snapshot, mới nhất trước (ID bắt đầu bằng thời điểm tạo nên sắp theo tên là đủ)"""
+        folder = BackupService._snapshot_folder()
+        if not os.path.isdir(folder):
+            return []
+        return sorted((name[:-len('.json.gz')] for name in os.listdir(folder) if name.endswith('.json.gz')),
+                      reverse=True)
+
+    @staticmethod
+    def snapshot_time(snapshot_id):
+        return datetime.strptime(snapshot_id[:len('YYYYmmddTHHMMSS-ffffff')], BackupService.SNAPSHOT_ID_FORMAT)
+
+    @staticmethod
+    def list_snapshots():
+        """Danh sách snapshot (mới nhất trước): snapshot_id, created_at, file_count, total_bytes"""
+        snapshots = []
+        for snapshot_id in BackupService.snapshot_ids():
+            manifest = BackupService.load_manifest(snapshot_id)
+            snapshots.append({
+                'snapshot_id': manifest['snapshot_id'],
+                'created_at': manifest['created_at'],
+                'file_count': len(manifest['files']),
+                'total_bytes': sum(entry['size'] for entry in manifest['files'].values()),
+            })
+        return snapshots
+
+    @staticmethod
+    def load_manifest(snapshot_id):
+        path = os.path.join(BackupService._snapshot_folder(), f"{snapshot_id}.json.gz")
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write_manifest(manifest):
+        folder = BackupService._snapshot_folder()
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{manifest['snapshot_id']}.json.gz")
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _chunk_stream(stream, store, chunk_size):
+        chunks, size = [], 0
+        for block in iter(lambda: stream.read(chunk_size), b''):
+            chunks.append(store.put(block))
+            size += len(block)
+        return chunks, size
+
+    @staticmethod
+    def _snapshot_tables(store, chunk_size):
+        """Dump mọi bảng dạng JSON lines trong một transaction đọc duy nhất.
+
+        MySQL InnoDB với REPEATABLE READ: mọi SELECT trong transaction thấy cùng một
+        snapshot nhất quán mà không khóa bảng (tương đương mysqldump --single-transaction).
+        """
+        tables = {}
+        options = {'isolation_level': 'REPEATABLE READ'} if db.engine.dialect.name == 'mysql' else {}
+        with db.engine.connect().execution_options(**options) as conn, conn.begin():
+            for table in db.metadata.sorted_tables:
+                buffer = bytearray()
+                chunks, size, rows = [], 0, 0
+                result = conn.execution_options(stream_results=True, yield_per=1000).execute(table.select())
+                for row in result.mappings():
+                    buffer += json.dumps(dict(row), default=_json_default, ensure_ascii=False).encode('utf-8') + b'\n'
+                    rows += 1
+                    while len(buffer) >= chunk_size:
+                        chunks.append(store.put(bytes(buffer[:chunk_size])))
+                        size += chunk_size
+                        del buffer[:chunk_size]
+                if buffer:
+                    chunks.append(store.put(bytes(buffer)))
+                    size += len(buffer)
+                tables[table.name] = {'rows': rows, 'size': size, 'chunks': chunks}
+        return tables
+
+    @staticmethod
+    def _walk_media(paths):
+        for base in paths:
+            for root, dirs, files in os.walk(base):
+                dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(SKIP_MARKERS)]
+                for name in files:
+                    if any(marker in name for marker in SKIP_MARKERS):
+                        continue
+                    yield os.path.join(root, name).replace(os.sep, '/')
+
+    @staticmethod
+    def create_backup(workers=None):
+        """Tạo snapshot mới (database + media), tăng dần so với snapshot gần nhất.
+
+        Returns:
+            dict: snapshot_id, tables, files, files_changed, bytes_read, chunks_written, bytes_written
+        """
+        config = current_app.config
+        chunk_size = config.get('BACKUP_CHUNK_SIZE', 4 * 1024 * 1024)
+        snapshot_ids = BackupService.snapshot_ids()
+        parent = BackupService.load_manifest(snapshot_ids[0]) if snapshot_ids else None
+        # Đổi kích thước chunk thì không dùng lại danh sách chunk cũ được
+        previous_files = parent['files'] if parent and parent.get('chunk_size') == chunk_size else {}
+
+        now = get_vietnam_time_naive()
+        manifest = {
+            'snapshot_id': f"{now.strftime(BackupService.SNAPSHOT_ID_FORMAT)}-{uuid.uuid4().hex[:6]}",
+            'created_at': now.isoformat(),
+            'parent': parent['snapshot_id'] if parent else None,
+            'chunk_size': chunk_size,
+            'tables': {},
+            'files': {},
+        }
+
+        store = BackupService._chunk_store(workers)
+        files_changed, bytes_read = 0, 0
+        try:
+            manifest['tables'] = BackupService._snapshot_tables(store, chunk_size)
+
+            for path in BackupService._walk_media(BackupService.backup_paths()):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                previous = previous_files.get(path)
+                if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+                    manifest['files'][path] = previous
+                    continue
+
+                try:
+                    with open(path, 'rb') as f:
+                        chunks, size = BackupService._chunk_stream(f, store, chunk_size)
+                except OSError as e:
+                    # File bị xóa trong lúc sao lưu (vd: blob vừa được dọn)
+                    print(f"Error backing up {path}: {e}")
+                    continue
+                manifest['files'][path] = {'size': size, 'mtime_ns': stat.st_mtime_ns, 'chunks': chunks}
+                files_changed += 1
+                bytes_read += size
+        finally:
+            store.close()
+
+        BackupService._write_manifest(manifest)
+        return {
+            'snapshot_id': manifest['snapshot_id'],
+            'tables': len(manifest['tables']),
+            'files': len(manifest['files']),
+            'files_changed': files_changed,
+            'bytes_read': bytes_read,
+            'chunks_written': store.chunks_written,
+            'bytes_written': store.bytes_written,
+        }
+
+    @staticmethod
+    def find_snapshot(at=None):
+        """Snapshot mới nhất tạo trước hoặc đúng thời điểm at (None = mới nhất)"""
+        for snapshot_id in BackupService.snapshot_ids():
+            if at is None or BackupService.snapshot_time(snapshot_id) <= at:
+                return snapshot_id
+        return None
+
+    @staticmethod
+    def restore(target_dir, snapshot_id=None, at=None, prefix=None):
+        """Khôi phục snapshot ra thư mục: <target>/database/<bảng>.jsonl và <target>/<đường dẫn file>.
+
+        Args:
+            snapshot_id: snapshot cụ thể; nếu None thì chọn theo at (point-in-time)
+            at: datetime, lấy snapshot gần nhất trước thời điểm này
+            prefix: chỉ khôi phục file có đường dẫn bắt đầu bằng prefix
+        """
+        snapshot_id = snapshot_id or BackupService.find_snapshot(at)
+        if not snapshot_id:
+            return {'success': False, 'message': 'Không có bản sao lưu phù hợp'}
+
+        manifest = BackupService.load_manifest(snapshot_id)
+        store = BackupService._chunk_store(workers=1)
+        target_dir = os.path.abspath(target_dir)
+
+        def write(relative_path, chunks, mtime_ns=None):
+            path = os.path.abspath(os.path.join(target_dir, relative_path))
+            if not path.startswith(target_dir + os.sep):
+                raise ValueError(f"Đường dẫn không hợp lệ: {relative_path}")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                for digest in chunks:
+                    f.write(store.get(digest))
+            if mtime_ns:
+                os.utime(path, ns=(mtime_ns, mtime_ns))
+
+        try:
+            if prefix is None:
+                for name, table in manifest['tables'].items():
+                    write(os.path.join('database', f"{name}.jsonl"), table['chunks'])
+            restored = 0
+            for relative_path, entry in manifest['files'].items():
+                if prefix and not relative_path.startswith(prefix):
+                    continue
+                write(relative_path, entry['chunks'], entry['mtime_ns'])
+                restored += 1
+        except (OSError, ValueError) as e:
+            return {'success': False, 'message': f'Lỗi khôi phục: {str(e)}'}
+        finally:
+            store.close()
+
+        return {
+            'success': True,
+            'message': f'Đã khôi phục snapshot {snapshot_id} ({restored} file)',
+            'snapshot_id': snapshot_id
+        }
+
+    @staticmethod
+    def prune(keep=None):
+        """Giữ keep snapshot mới nhất, xóa chunk không còn snapshot nào dùng"""
+        if keep is None:
+            keep = current_app.config.get('BACKUP_KEEP', 30)
+        snapshot_ids = BackupService.snapshot_ids()
+        for snapshot_id in snapshot_ids[keep:]:
+            os.remove(os.path.join(BackupService._snapshot_folder(), f"{snapshot_id}.json.gz"))
+
+        used = set()
+        for snapshot_id in snapshot_ids[:keep]:
+            manifest = BackupService.load_manifest(snapshot_id)
+            for entry in list(manifest['tables'].values()) + list(manifest['files'].values()):
+                used.update(entry['chunks'])
+
+        # Chunk mới ghi có thể thuộc lần sao lưu đang chạy (manifest chưa ghi)
+        cutoff = time.time() - BackupService.CHUNK_MIN_AGE_SECONDS
+        removed, freed = 0, 0
+        for root, _, files in os.walk(os.path.join(BackupService._folder(), 'chunks')):
+            for name in files:
+                path = os.path.join(root, name)
+                if name in used or os.path.getmtime(path) > cutoff:
+                    continue
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+
+        return {'snapshots_removed': max(len(snapshot_ids) - keep, 0), 'chunks_removed': removed, 'bytes_freed': freed}
@@ -4,7 +4,11 @@ from app.models.class_model import Class
 from app.models.class_enrollment import ClassEnrollment
 from app.models.user import User
 from app.models.role import Role
+from app.models.student_score_summary import StudentScoreSummary
 from app.utils.helpers import get_vietnam_time
+from app.utils.cache import cached
+from app.utils.loader_profiles import loader_options
+from app.utils.pagination import keyset_paginate
 
 
 class ClassService:
@@ -75,8 +79,10 @@ class ClassService:
         db.session.commit()
         return {'success': True, 'class': class_obj}
     @staticmethod
-    def get_all_classes():
-        return Class.query.all()
+    def get_all_classes(profile=None, after=None, before=None, per_page=None):
+        """Một trang lớp học, mới tạo trước (KeysetPage)"""
+        query = Class.query.options(*loader_options(profile))
+        return keyset_paginate(query, Class.created_at, Class.class_id, after, before, per_page)
 
     @staticmethod
     def get_classes_by_instructor(instructor_id: int):
@@ -130,6 +136,7 @@ class ClassService:
             return {'success': False, 'message': 'Không tìm thấy lớp học'}
 
         db.session.delete(class_obj)
+        StudentScoreSummary.query.filter_by(class_id=class_id).delete(synchronize_session=False)
         db.session.commit()
         return {'success': True}
 
@@ -248,6 +255,7 @@ class ClassService:
         return {'success': True, 'enrollment': enrollment}
 
     @staticmethod
+    @cached(tags=('classes', 'enrollments', 'users'))
     def get_statistics():
         total_classes = Class.query.count()
         active_classes = Class.query.filter_by(is_active=True).count()
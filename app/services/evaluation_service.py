@@ -2,78 +2,44 @@ from app.models import db
 from app.models.manual_evaluation import ManualEvaluation
 from app.models.training_video import TrainingVideo
 from app.models.notification import Notification
+from app.services.score_summary_service import ScoreSummaryService
 from app.utils.helpers import get_vietnam_time
+from app.utils.loader_profiles import loader_options
 from datetime import datetime
 
 class EvaluationService:
     
     @staticmethod
-    def get_pending_submissions(instructor_id):
-        """Lấy danh sách video chờ chấm điểm"""
-        from app.models.assignment import Assignment
+    def _submissions_query(instructor_id, profile=None):
+        """Video đã xử lý xong của học viên đang học các lớp của giảng viên"""
         from app.models.class_enrollment import ClassEnrollment
-        
-        # Lấy tất cả lớp của giảng viên
         from app.models.class_model import Class
-        instructor_classes = Class.query.filter_by(
-            instructor_id=instructor_id,
-            is_active=True
-        ).all()
-        
-        class_ids = [c.class_id for c in instructor_classes]
         
-        # Lấy học viên trong các lớp
-        enrollments = ClassEnrollment.query.filter(
-            ClassEnrollment.class_id.in_(class_ids),
+        # Học viên trong các lớp đang hoạt động của giảng viên (subquery, không nạp lớp/ghi danh)
+        student_ids = db.session.query(ClassEnrollment.student_id).join(
+            Class, Class.class_id == ClassEnrollment.class_id
+        ).filter(
+            Class.instructor_id == instructor_id,
+            Class.is_active == True,
             ClassEnrollment.enrollment_status == 'active'
-        ).all()
-        
-        student_ids = [e.student_id for e in enrollments]
+        )
         
-        # Lấy video chưa được chấm điểm thủ công
-        videos = TrainingVideo.query.filter(
+        return TrainingVideo.query.options(*loader_options(profile)).filter(
             TrainingVideo.student_id.in_(student_ids),
             TrainingVideo.processing_status == 'completed'
+        ).order_by(TrainingVideo.uploaded_at.desc())
+    
+    @staticmethod
+    def get_pending_submissions(instructor_id, profile=None):
+        """Lấy danh sách video chờ chấm điểm (chưa có manual evaluation)"""
+        return EvaluationService._submissions_query(instructor_id, profile).filter(
+            ~TrainingVideo.manual_evaluations.any()
         ).all()
-        
-        # Filter những video chưa có manual evaluation
-        pending = []
-        for video in videos:
-            if not video.manual_evaluations:
-                pending.append(video)
-        
-        return sorted(pending, key=lambda x: x.uploaded_at, reverse=True)
     
     @staticmethod
-    def get_all_submissions(instructor_id):
+    def get_all_submissions(instructor_id, profile=None):
         """Lấy tất cả video (cả đã chấm và chưa chấm)"""
-        from app.models.assignment import Assignment
-        from app.models.class_enrollment import ClassEnrollment
-        
-        # Lấy tất cả lớp của giảng viên
-        from app.models.class_model import Class
-        instructor_classes = Class.query.filter_by(
-            instructor_id=instructor_id,
-            is_active=True
-        ).all()
-        
-        class_ids = [c.class_id for c in instructor_classes]
-        
-        # Lấy học viên trong các lớp
-        enrollments = ClassEnrollment.query.filter(
-            ClassEnrollment.class_id.in_(class_ids),
-            ClassEnrollment.enrollment_status == 'active'
-        ).all()
-        
-        student_ids = [e.student_id for e in enrollments]
-        
-        # Lấy tất cả video
-        videos = TrainingVideo.query.filter(
-            TrainingVideo.student_id.in_(student_ids),
-            TrainingVideo.processing_status == 'completed'
-        ).all()
-        
-        return sorted(videos, key=lambda x: x.uploaded_at, reverse=True)
+        return EvaluationService._submissions_query(instructor_id, profile).all()
     
     @staticmethod
     def create_evaluation(video_id, instructor_id, data):
@@ -108,6 +74,7 @@ class EvaluationService:
             evaluated_at=get_vietnam_time()
         )
         
+        ScoreSummaryService.record_evaluation(video, evaluation)
         db.session.add(evaluation)
         
         # Gửi thông báo cho học viên
@@ -7,9 +7,11 @@ from datetime import datetime
 import uuid
 import os
 from werkzeug.utils import secure_filename
-import cv2
+from app.utils.video_probe import probe_video
+from app.utils.loader_profiles import loader_options
+from app.utils.pagination import keyset_paginate
 from flask import current_app
-from sqlalchemy import or_
+from sqlalchemy import or_, func, case
 from datetime import datetime as dt
 
 
@@ -40,14 +42,13 @@ class ExamService:
     
     @staticmethod
     def _get_video_duration(file_path):
-        """Lấy độ dài video bằng OpenCV"""
+        """Lấy độ dài video (dùng chung probe với video bài tập)"""
+        from app.services.storage_service import StorageService
+        
         try:
-            cap = cv2.VideoCapture(file_path)
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-            duration = int(frame_count / fps) if fps > 0 else 0
-            cap.release()
-            return duration
+            metadata = probe_video(StorageService.local_path(file_path),
+                                   ffprobe_bin=current_app.config.get('FFPROBE_BINARY', 'ffprobe'))
+            return metadata['duration_seconds'] if metadata else 0
         except Exception as e:
             print(f"Error getting video duration: {e}")
             return 0
@@ -59,35 +60,40 @@ class ExamService:
         if not is_valid:
             return None, result
         
-        filename = result
-        
-        # Tạo thư mục nếu chưa có
-        upload_folder = os.path.join(
-            current_app.config.get('UPLOAD_FOLDER', 'static/uploads'),
-            'exam_videos'
-        )
-        os.makedirs(upload_folder, exist_ok=True)
+        from app.services.storage_service import StorageService
         
-        # Tạo tên file ASCII-only với phần mở rộng gốc
+        filename = result
         ext = filename.rsplit('.', 1)[1].lower()
-        timestamp = int(get_vietnam_time().timestamp())
-        new_filename = f"exam_{exam_id}_{timestamp}.{ext}"
-        file_path = os.path.join(upload_folder, new_filename)
 
-        # Lưu file với xử lý lỗi encoding/log
+        # Lưu theo nội dung (video mẫu trùng với bài khác dùng chung file)
         try:
-            file.save(file_path)
+            blob = StorageService.save_stream(file.stream, ext)
         except Exception as e:
             print(f"Error saving file: {repr(e)}")
             return None, "Loi luu file"
+        StorageService.acquire(blob)
         
         # Lấy duration
-        duration = ExamService._get_video_duration(file_path)
+        duration = ExamService._get_video_duration(blob.file_path)
         
-        return new_filename, duration
+        return blob.file_path, duration
+
+    @staticmethod
+    def _use_uploaded_video(upload_id, instructor_id):
+        """Dùng video mẫu đã upload theo chunk (đã nằm sẵn trong exam_videos)"""
+        from app.services.upload_service import UploadService
+        from app.services.storage_service import StorageService
+        
+        consumed = UploadService.consume_upload(upload_id, instructor_id, 'exam_reference')
+        if not consumed['success']:
+            return None, consumed['message']
+        
+        blob = StorageService.store_file(consumed['file_path'], consumed['upload'].checksum_sha256)
+        StorageService.acquire(blob)
+        return blob.file_path, ExamService._get_video_duration(blob.file_path)
 
     @staticmethod
-    def create_exam(data: dict, instructor_id: int, video_file=None):
+    def create_exam(data: dict, instructor_id: int, video_file=None, upload_id=None):
         """
         Tạo exam mới - HỖ TRỢ CẢ ROUTINE VÀ UPLOAD
         
@@ -95,6 +101,7 @@ class ExamService:
             data: Dict chứa thông tin exam
             instructor_id: ID giảng viên
             video_file: FileStorage object (optional, nếu upload)
+            upload_id: ID phiên upload theo chunk (optional, thay cho video_file)
         """
         # Kiểm tra mã trùng
         if Exam.query.filter_by(exam_code=data['exam_code']).first():
@@ -130,7 +137,7 @@ class ExamService:
         
         elif data.get('video_source') == 'upload':
             # Upload video mới
-            if not video_file:
+            if not video_file and not upload_id:
                 return {'success': False, 'message': 'Vui lòng upload video'}
             
             # Tạm thời set reference_video_path = 'temp' để pass constraint
@@ -146,7 +153,10 @@ class ExamService:
             
             # Nếu là upload, lưu video file và cập nhật path
             if data.get('video_source') == 'upload':
-                filename, duration = ExamService._save_video_file(video_file, exam.exam_id)
+                if upload_id:
+                    filename, duration = ExamService._use_uploaded_video(upload_id, instructor_id)
+                else:
+                    filename, duration = ExamService._save_video_file(video_file, exam.exam_id)
                 if filename is None:
                     db.session.rollback()
                     return {'success': False, 'message': duration}  # duration chứa error message
@@ -191,16 +201,18 @@ class ExamService:
         if result_count > 0:
             return {'success': False, 'message': f'Không thể xóa - đã có {result_count} kết quả thi'}
         
-        # Xóa video file nếu có
+        # Bỏ tham chiếu tới video (file cũ bị xóa sau commit, blob hết tham chiếu do storage-dedup dọn)
         if exam.video_upload_method == 'upload' and exam.reference_video_path:
+            from app.services.storage_service import StorageService
             try:
-                file_path = os.path.join(
-                    current_app.config.get('UPLOAD_FOLDER', 'static/uploads'),
-                    'exam_videos',
-                    exam.reference_video_path
-                )
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+                file_path = exam.reference_video_path
+                if '/' not in file_path:
+                    file_path = os.path.join(
+                        current_app.config.get('UPLOAD_FOLDER', 'instance/media'),
+                        'exam_videos',
+                        file_path
+                    )
+                StorageService.release_path(file_path)
             except Exception as e:
                 print(f"Error deleting video file: {e}")
         
@@ -209,8 +221,20 @@ class ExamService:
         return {'success': True}
 
     @staticmethod
-    def get_exam_results(exam_id: int):
-        return ExamResult.query.filter_by(exam_id=exam_id).order_by(ExamResult.submitted_at.desc()).all()
+    def get_exam_results(exam_id: int, profile: str | None = None, after: str | None = None,
+                         before: str | None = None, per_page: int | None = None):
+        """Một trang kết quả bài kiểm tra, nộp gần nhất trước (KeysetPage)"""
+        query = ExamResult.query.filter_by(exam_id=exam_id).options(*loader_options(profile))
+        return keyset_paginate(query, ExamResult.submitted_at, ExamResult.result_id, after, before, per_page)
+
+    @staticmethod
+    def get_exam_result_stats(exam_id: int, pass_score):
+        """Tổng số kết quả và số kết quả đạt (score >= pass_score) của bài kiểm tra, một query"""
+        total, passed = db.session.query(
+            func.count(ExamResult.result_id),
+            func.sum(case((ExamResult.score >= pass_score, 1), else_=0))
+        ).filter(ExamResult.exam_id == exam_id).one()
+        return {'total': total, 'passed': int(passed or 0)}
 
     @staticmethod
     def get_exams_for_student(student_id: int):
@@ -283,7 +307,7 @@ class ExamService:
         return True, "OK"
     
     @staticmethod
-    def submit_exam_result(exam_id: int, student_id: int, video_file, notes: str = ''):
+    def submit_exam_result(exam_id: int, student_id: int, video_file, notes: str = '', upload_id: str = None):
         """
         Nộp bài thi và lưu kết quả
         
@@ -292,12 +316,13 @@ class ExamService:
             student_id: ID học sinh
             video_file: Video file đã ghi
             notes: Ghi chú của học sinh
+            upload_id: ID phiên upload theo chunk (thay cho video_file)
             
         Returns:
             dict: {'success': bool, 'message': str, 'result': ExamResult}
         """
         from app.services.video_service import VideoService
-        from app.services.ai_service import AIService
+        from app.services.analysis_queue_service import AnalysisQueueService
         
         # Kiểm tra điều kiện
         can_take, message = ExamService.can_take_exam(exam_id, student_id)
@@ -317,13 +342,23 @@ class ExamService:
             # Lưu video (sử dụng VideoService có sẵn)
             routine_id = exam.routine_id if exam.video_upload_method == 'routine' else None
             
-            video = VideoService.save_video(
-                file=video_file,
-                student_id=student_id,
-                routine_id=routine_id,
-                assignment_id=None,  # Exam không có assignment_id
-                notes=f"Exam: {exam.exam_name} - Lần {attempt_number}"
-            )
+            if upload_id:
+                video = VideoService.save_uploaded_video(
+                    upload_id=upload_id,
+                    student_id=student_id,
+                    routine_id=routine_id,
+                    assignment_id=None,  # Exam không có assignment_id
+                    notes=f"Exam: {exam.exam_name} - Lần {attempt_number}",
+                    purpose='exam'
+                )
+            else:
+                video = VideoService.save_video(
+                    file=video_file,
+                    student_id=student_id,
+                    routine_id=routine_id,
+                    assignment_id=None,  # Exam không có assignment_id
+                    notes=f"Exam: {exam.exam_name} - Lần {attempt_number}"
+                )
             
             # Tạo exam result
             exam_result = ExamResult(
@@ -340,16 +375,11 @@ class ExamService:
             db.session.add(exam_result)
             db.session.commit()
             
-            # Trigger AI phân tích (background task)
+            # Đưa vào hàng đợi phân tích AI (xử lý nền)
             try:
-                # Gọi AI service để chấm điểm
-                AIService.process_video_mock(video.video_id)
-                
-                # Sau khi AI xong, cập nhật score vào exam_result
-                # (Phần này sẽ được xử lý bởi AI service callback)
-                
+                AnalysisQueueService.enqueue(video.video_id)
             except Exception as ai_error:
-                print(f"AI processing error: {ai_error}")
+                print(f"AI enqueue error: {ai_error}")
                 # Không fail submission nếu AI lỗi
             
             return {
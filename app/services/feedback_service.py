@@ -2,7 +2,9 @@ from app.models import db
 from app.models.feedback import Feedback
 from app.utils.helpers import get_vietnam_time
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from app.utils.loader_profiles import loader_options
+from app.utils.pagination import keyset_paginate
+from sqlalchemy import func, case
 
 class FeedbackService:
     
@@ -23,19 +25,38 @@ class FeedbackService:
         return {'success': True, 'feedback': feedback}
     
     @staticmethod
-    def get_all_feedback(filters=None):
-        """Lấy tất cả feedback với filter"""
-        query = Feedback.query
-        
+    def _filtered(query, filters):
         if filters:
             if filters.get('status'):
-                query = query.filter_by(feedback_status=filters['status'])
+                query = query.filter(Feedback.feedback_status == filters['status'])
             if filters.get('type'):
-                query = query.filter_by(feedback_type=filters['type'])
+                query = query.filter(Feedback.feedback_type == filters['type'])
             if filters.get('priority'):
-                query = query.filter_by(priority=filters['priority'])
-        
-        return query.order_by(Feedback.created_at.desc()).all()
+                query = query.filter(Feedback.priority == filters['priority'])
+        return query
+    
+    @staticmethod
+    def get_all_feedback(filters=None, profile=None, after=None, before=None, per_page=None):
+        """Lấy một trang feedback với filter, mới nhất trước (KeysetPage)"""
+        query = FeedbackService._filtered(Feedback.query, filters).options(*loader_options(profile))
+        return keyset_paginate(query, Feedback.created_at, Feedback.feedback_id, after, before, per_page)
+    
+    @staticmethod
+    def get_feedback_counts(filters=None):
+        """Đếm feedback theo cùng filter (một query): tổng, chờ xử lý, đã giải quyết, ưu tiên cao"""
+        query = db.session.query(
+            func.count(Feedback.feedback_id),
+            func.sum(case((Feedback.feedback_status == 'pending', 1), else_=0)),
+            func.sum(case((Feedback.feedback_status == 'resolved', 1), else_=0)),
+            func.sum(case((Feedback.priority == 'high', 1), else_=0))
+        )
+        total, pending, resolved, high = FeedbackService._filtered(query, filters).one()
+        return {
+            'total': total,
+            'pending': int(pending or 0),
+            'resolved': int(resolved or 0),
+            'high': int(high or 0)
+        }
     
     @staticmethod
     def get_feedback_by_id(feedback_id):
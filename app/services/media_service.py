@@ -0,0 +1,160 @@
+from app.models.training_video import TrainingVideo
+from app.models.exam import Exam
+from app.models.martial_routine import MartialRoutine
+from app.models.assignment import Assignment
+from app.models.class_enrollment import ClassEnrollment
+from app.models.class_model import Class
+from flask import current_app
+import os
+
+
+class MediaService:
+    """Đường dẫn file và quyền xem video/ảnh phục vụ qua endpoint /media"""
+
+    MIMETYPES = {
+        'mp4': 'video/mp4',
+        'webm': 'video/webm',
+        'mov': 'video/quicktime',
+        'mkv': 'video/x-matroska',
+        'avi': 'video/x-msvideo',
+        'm3u8': 'application/vnd.apple.mpegurl',
+        'ts': 'video/mp2t',
+        'jpg': 'image/jpeg',
+        'jpeg': 'image/jpeg',
+        'png': 'image/png',
+    }
+
+    # Chỉ phục vụ file nằm trong các thư mục này (config key, mặc định)
+    MEDIA_FOLDERS = (
+        ('UPLOAD_FOLDER', 'instance/media'),
+        ('BLOB_FOLDER', 'instance/media/blobs'),
+        ('TRANSCODE_FOLDER', 'instance/media/renditions'),
+        ('KEY_FRAME_FOLDER', 'instance/media/keyframes'),
+    )
+
+    @staticmethod
+    def is_external_url(url):
+        return bool(url) and url.lower().startswith(('http://', 'https://'))
+
+    @staticmethod
+    def is_media_path(path):
+        """File nằm trong một thư mục media sau khi giải '..' và symlink"""
+        real_path = os.path.realpath(path)
+        for key, default in MediaService.MEDIA_FOLDERS:
+            folder = os.path.realpath(current_app.config.get(key, default))
+            if real_path.startswith(folder + os.sep):
+                return True
+        return False
+
+    @staticmethod
+    def local_path(url):
+        """Đường dẫn file trên đĩa từ URL/đường dẫn lưu trong DB; None nếu là link ngoài,
+        không tồn tại hoặc nằm ngoài thư mục media"""
+        if not url or '://' in url:
+            return None
+        path = url.lstrip('/')
+        if not os.path.isfile(path) or not MediaService.is_media_path(path):
+            return None
+        return path
+
+    @staticmethod
+    def mimetype(path):
+        ext = path.rsplit('.', 1)[-1].lower() if '.' in path else ''
+        return MediaService.MIMETYPES.get(ext, 'application/octet-stream')
+
+    @staticmethod
+    def can_view_training_video(video, user_id, role_code):
+        """Học viên: video của mình. Giảng viên: video của học viên lớp mình, bài võ/bài tập của mình.
+        Admin/Manager: tất cả."""
+        if role_code in ('ADMIN', 'MANAGER'):
+            return True
+        if role_code == 'STUDENT':
+            return video.student_id == user_id
+        if role_code != 'INSTRUCTOR':
+            return False
+
+        if video.routine and video.routine.instructor_id == user_id:
+            return True
+        if video.assignment and video.assignment.assigned_by == user_id:
+            return True
+        return ClassEnrollment.query.join(Class, ClassEnrollment.class_id == Class.class_id).filter(
+            ClassEnrollment.student_id == video.student_id,
+            ClassEnrollment.enrollment_status == 'active',
+            Class.instructor_id == user_id
+        ).first() is not None
+
+    @staticmethod
+    def can_view_exam(exam, user_id, role_code):
+        if role_code in ('ADMIN', 'MANAGER'):
+            return True
+        if role_code == 'INSTRUCTOR':
+            return exam.instructor_id == user_id
+        if role_code == 'STUDENT':
+            if not exam.is_published:
+                return False
+            if not exam.class_id:
+                return True
+            return ClassEnrollment.query.filter_by(
+                class_id=exam.class_id,
+                student_id=user_id,
+                enrollment_status='active'
+            ).first() is not None
+        return False
+
+    @staticmethod
+    def can_view_assignment(assignment, user_id, role_code):
+        """Học viên: bài tập giao cho mình hoặc lớp mình. Giảng viên: bài tập mình giao."""
+        if role_code in ('ADMIN', 'MANAGER'):
+            return True
+        if role_code == 'INSTRUCTOR':
+            return assignment.assigned_by == user_id
+        if role_code == 'STUDENT':
+            if assignment.assigned_to_student == user_id:
+                return True
+            return assignment.assigned_to_class is not None and ClassEnrollment.query.filter_by(
+                class_id=assignment.assigned_to_class,
+                student_id=user_id,
+                enrollment_status='active'
+            ).first() is not None
+        return False
+
+    @staticmethod
+    def can_view_routine(routine, user_id, role_code):
+        """Bài võ đã xuất bản: mọi người dùng. Chưa xuất bản: giảng viên tạo bài và học viên được giao."""
+        if role_code in ('ADMIN', 'MANAGER'):
+            return True
+        if routine.is_published and routine.is_active:
+            return True
+        if role_code == 'INSTRUCTOR':
+            return routine.instructor_id == user_id
+        if role_code == 'STUDENT':
+            return any(MediaService.can_view_assignment(a, user_id, role_code) for a in routine.assignments)
+        return False
+
+    @staticmethod
+    def get_training_video(video_id, user_id, role_code):
+        video = TrainingVideo.query.get(video_id)
+        if not video or not MediaService.can_view_training_video(video, user_id, role_code):
+            return None
+        return video
+
+    @staticmethod
+    def get_exam(exam_id, user_id, role_code):
+        exam = Exam.query.get(exam_id)
+        if not exam or not MediaService.can_view_exam(exam, user_id, role_code):
+            return None
+        return exam
+
+    @staticmethod
+    def get_routine(routine_id, user_id, role_code):
+        routine = MartialRoutine.query.get(routine_id)
+        if not routine or not MediaService.can_view_routine(routine, user_id, role_code):
+            return None
+        return routine
+
+    @staticmethod
+    def get_assignment(assignment_id, user_id, role_code):
+        assignment = Assignment.query.get(assignment_id)
+        if not assignment or not MediaService.can_view_assignment(assignment, user_id, role_code):
+            return None
+        return assignment
@@ -0,0 +1,145 @@
+from app.models import db
+from app.services.ai_service import AIService
+from app.services.media_service import MediaService
+from app.services.upload_service import UploadService
+from ai_models import feature_store, inference_pool
+from flask import current_app
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+
+class ReferenceFeatureService:
+    """Cache đặc trưng chuyển động của video mẫu (bài võ, demo bài tập).
+
+    Mỗi video mẫu được phân tích một lần; kết quả lưu ở
+    REFERENCE_FEATURE_FOLDER/<hash đường dẫn>-<hash nội dung>-<nguồn keypoint>/
+    dạng các file .npy và được worker suy luận memory-map khi chấm điểm. Video mẫu đổi nội dung
+    thì hash nội dung đổi, bản cũ bị xóa khi tính bản mới.
+    """
+
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    @staticmethod
+    def resolve_path(video_url):
+        """Đường dẫn file trên đĩa của URL video mẫu; None nếu là link ngoài, không tồn tại
+        hoặc nằm ngoài thư mục media (cùng kiểm tra với MediaService.local_path)"""
+        path = MediaService.local_path(video_url)
+        if path:
+            return path
+        if not video_url or '://' in video_url:
+            return None
+        path = video_url.lstrip('/')
+        # Video mẫu trong kho ở driver s3: dùng bản cache trên đĩa
+        from app.services.storage_service import StorageService
+        if StorageService.get_blob_by_path(path):
+            path = StorageService.local_path(path)
+            return path if os.path.isfile(path) else None
+        return None
+
+    @staticmethod
+    def _folder():
+        return current_app.config.get('REFERENCE_FEATURE_FOLDER', 'instance/reference_features')
+
+    @staticmethod
+    def _path_key(path):
+        return hashlib.sha1(os.path.normpath(path).encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def _lock_for(key):
+        with ReferenceFeatureService._locks_guard:
+            return ReferenceFeatureService._locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def content_hash(path):
+        """SHA-256 nội dung video; chỉ đọc lại file khi kích thước/mtime đổi so với lần trước"""
+        folder = ReferenceFeatureService._folder()
+        index_path = os.path.join(folder, f"{ReferenceFeatureService._path_key(path)}.json")
+        stat = os.stat(path)
+
+        try:
+            with open(index_path, encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('size') == stat.st_size and index.get('mtime_ns') == stat.st_mtime_ns:
+                return index['sha256']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        digest = UploadService.file_sha256(path)
+        os.makedirs(folder, exist_ok=True)
+        with open(index_path, 'w', encoding='utf-8') as f:
+            json.dump({'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}, f)
+        return digest
+
+    @staticmethod
+    def get_entry(video_url, compute=True):
+        """Thư mục cache đặc trưng của video mẫu, tính (trên InferencePool) và lưu nếu chưa có.
+
+        Returns:
+            str hoặc None nếu không có file video mẫu (hoặc compute=False và chưa có cache)
+        """
+        path = ReferenceFeatureService.resolve_path(video_url)
+        if not path:
+            return None
+
+        pool = AIService.get_inference_pool()
+        path_key = ReferenceFeatureService._path_key(path)
+        source = pool.motion_source()
+        folder = ReferenceFeatureService._folder()
+
+        with ReferenceFeatureService._lock_for(path_key):
+            digest = ReferenceFeatureService.content_hash(path)
+            entry = os.path.join(folder, f"{path_key}-{digest[:16]}-{source}")
+            if os.path.isdir(entry):
+                return entry
+            if not compute:
+                return None
+
+            features = pool.call(inference_pool.analyze_motion, path)
+
+            # Ghi vào thư mục tạm rồi đổi tên để tiến trình khác không đọc phải cache dở
+            tmp_entry = f"{entry}.tmp-{uuid.uuid4().hex}"
+            feature_store.save_features(features, tmp_entry, {'video_path': path, 'content_sha256': digest})
+            try:
+                os.rename(tmp_entry, entry)
+            except OSError:
+                shutil.rmtree(tmp_entry, ignore_errors=True)  # Process khác đã ghi xong trước
+
+            ReferenceFeatureService._remove_stale(folder, path_key, keep=entry)
+            return entry
+
+    @staticmethod
+    def get_features(video_url, compute=True):
+        """MotionFeatures (memory-mapped) của video mẫu; None nếu không có"""
+        entry = ReferenceFeatureService.get_entry(video_url, compute=compute)
+        return feature_store.load_features(entry) if entry else None
+
+    @staticmethod
+    def _remove_stale(folder, path_key, keep):
+        """Xóa cache của nội dung cũ (video mẫu đã bị thay) cho cùng đường dẫn"""
+        prefix = f"{path_key}-"
+        for name in os.listdir(folder):
+            full = os.path.join(folder, name)
+            if name.startswith(prefix) and full != keep and os.path.isdir(full) and '.tmp-' not in name:
+                shutil.rmtree(full, ignore_errors=True)
+
+    @staticmethod
+    def warm_async(video_url):
+        """Tính trước đặc trưng video mẫu (khi publish bài võ / tạo bài tập).
+
+        Chỉ đưa job vào hàng đợi phân tích: worker có sẵn pool suy luận sẽ tính, process web
+        không tạo pool. Link ngoài thì bỏ qua; file không tồn tại thì job kết thúc ngay.
+        """
+        if not video_url or '://' in video_url:
+            return None
+        from app.services.analysis_queue_service import AnalysisQueueService
+        try:
+            return AnalysisQueueService.enqueue_reference_features(video_url)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error queueing reference features for {video_url}: {e}")
+            return None
@@ -1,5 +1,6 @@
 from datetime import datetime
 from app.utils.helpers import get_vietnam_time
+from sqlalchemy.orm import joinedload
 
 class ReportService:
     
@@ -9,7 +10,7 @@ class ReportService:
         from app.models.class_model import Class
         from app.services.analytics_service import AnalyticsService
         
-        class_obj = Class.query.get(class_id)
+        class_obj = Class.query.options(joinedload(Class.instructor)).get(class_id)
         if not class_obj:
             return None
         
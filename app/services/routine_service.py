@@ -1,6 +1,7 @@
 from app.models import db
 from app.models.martial_routine import MartialRoutine
 from app.models.weapon import Weapon
+from app.services.reference_feature_service import ReferenceFeatureService
 from datetime import datetime
 
 
@@ -74,6 +75,9 @@ class RoutineService:
         routine.pass_threshold = data.get('pass_threshold', routine.pass_threshold)
 
         db.session.commit()
+
+        if routine.is_published:
+            ReferenceFeatureService.warm_async(routine.reference_video_url)
         return {'success': True, 'routine': routine}
 
     @staticmethod
@@ -87,6 +91,9 @@ class RoutineService:
 
         routine.is_published = True
         db.session.commit()
+
+        # Tính trước đặc trưng video mẫu để chấm bài không phải phân tích lại
+        ReferenceFeatureService.warm_async(routine.reference_video_url)
         return {'success': True, 'routine': routine}
 
     @staticmethod
@@ -0,0 +1,284 @@
+from app.models import db
+from app.models.student_score_summary import StudentScoreSummary
+from app.models.training_video import TrainingVideo
+from app.models.ai_analysis import AIAnalysisResult
+from app.models.manual_evaluation import ManualEvaluation
+from app.models.assignment import Assignment
+from app.utils.helpers import get_vietnam_time_naive
+from decimal import Decimal
+from sqlalchemy import func, case, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+# Thứ tự cột trả về của _compute (trùng tên cột của StudentScoreSummary)
+SUMMARY_FIELDS = (
+    'video_count',
+    'ai_count', 'ai_score_sum',
+    'technique_count', 'technique_sum',
+    'posture_count', 'posture_sum',
+    'timing_count', 'timing_sum',
+    'manual_count', 'manual_score_sum', 'passed_count',
+    'scored_count', 'scored_sum',
+)
+
+
+def _number(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+class ScoreSummaryService:
+    """Bảng tổng hợp điểm student_score_summary: mỗi học viên một dòng (class_id = 0) và
+    một dòng cho mỗi lớp có bài tập học viên đã nộp.
+
+    Các hàm record_* cộng thay đổi vào dòng tổng hợp trong cùng transaction với bản ghi mới,
+    nên phải gọi TRƯỚC khi add bản ghi đó vào session. Dòng chưa có được dựng từ bảng gốc
+    lúc cần; lệnh `flask score-summary-rebuild` tính lại toàn bộ khi nghi dữ liệu lệch.
+    """
+
+    @staticmethod
+    def _compute(student_id=None):
+        """Tính tổng hợp từ bảng gốc.
+
+        Returns:
+            dict: (student_id, class_id) -> {tên cột: giá trị}
+        """
+        manual_stats = db.session.query(
+            ManualEvaluation.video_id,
+            func.count(ManualEvaluation.evaluation_id).label('manual_count'),
+            func.sum(ManualEvaluation.overall_score).label('manual_sum'),
+            func.sum(case((ManualEvaluation.is_passed == True, 1), else_=0)).label('passed_count'),
+            func.min(ManualEvaluation.evaluation_id).label('first_evaluation_id')
+        )
+        if student_id is not None:
+            manual_stats = manual_stats.join(
+                TrainingVideo, TrainingVideo.video_id == ManualEvaluation.video_id
+            ).filter(TrainingVideo.student_id == student_id)
+        manual_stats = manual_stats.group_by(ManualEvaluation.video_id).subquery()
+
+        first_evaluation = aliased(ManualEvaluation)
+        scored = func.coalesce(first_evaluation.overall_score, AIAnalysisResult.overall_score)
+        aggregates = (
+            func.count(TrainingVideo.video_id),
+            func.count(AIAnalysisResult.analysis_id), func.sum(AIAnalysisResult.overall_score),
+            func.count(AIAnalysisResult.technique_score), func.sum(AIAnalysisResult.technique_score),
+            func.count(AIAnalysisResult.posture_score), func.sum(AIAnalysisResult.posture_score),
+            func.count(AIAnalysisResult.timing_score), func.sum(AIAnalysisResult.timing_score),
+            func.sum(manual_stats.c.manual_count), func.sum(manual_stats.c.manual_sum),
+            func.sum(manual_stats.c.passed_count),
+            func.count(scored), func.sum(scored),
+        )
+
+        def base(class_column):
+            query = db.session.query(TrainingVideo.student_id, class_column, *aggregates).select_from(
+                TrainingVideo
+            ).outerjoin(
+                AIAnalysisResult, AIAnalysisResult.video_id == TrainingVideo.video_id
+            ).outerjoin(
+                manual_stats, manual_stats.c.video_id == TrainingVideo.video_id
+            ).outerjoin(
+                first_evaluation, first_evaluation.evaluation_id == manual_stats.c.first_evaluation_id
+            )
+            if student_id is not None:
+                query = query.filter(TrainingVideo.student_id == student_id)
+            return query
+
+        overall = base(literal(0)).group_by(TrainingVideo.student_id)
+        per_class = base(Assignment.assigned_to_class).join(
+            Assignment, Assignment.assignment_id == TrainingVideo.assignment_id
+        ).filter(
+            Assignment.assigned_to_class.isnot(None)
+        ).group_by(TrainingVideo.student_id, Assignment.assigned_to_class)
+
+        result = {}
+        for row in overall.all() + per_class.all():
+            result[(row[0], row[1])] = {name: value or 0 for name, value in zip(SUMMARY_FIELDS, row[2:])}
+        return result
+
+    @staticmethod
+    def _new_row(student_id, class_id, values=None):
+        row = StudentScoreSummary(student_id=student_id, class_id=class_id, updated_at=get_vietnam_time_naive())
+        for name in SUMMARY_FIELDS:
+            setattr(row, name, (values or {}).get(name, 0))
+        return row
+
+    @staticmethod
+    def _build_row(student_id, class_id):
+        """Dòng tổng hợp dựng từ bảng gốc (chưa add vào session)"""
+        values = ScoreSummaryService._compute(student_id).get((student_id, class_id))
+        return ScoreSummaryService._new_row(student_id, class_id, values)
+
+    @staticmethod
+    def _insert(row):
+        """Thêm dòng trong savepoint; False nếu request khác vừa tạo cùng dòng"""
+        try:
+            with db.session.begin_nested():
+                db.session.add(row)
+            return True
+        except IntegrityError:
+            return False
+
+    @staticmethod
+    def _apply(student_id, class_ids, deltas):
+        """Cộng deltas vào các dòng (student_id, class_id) bằng UPDATE col = col + delta"""
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        values = {getattr(StudentScoreSummary, name): getattr(StudentScoreSummary, name) + delta
+                  for name, delta in deltas.items()}
+        values[StudentScoreSummary.updated_at] = get_vietnam_time_naive()
+
+        for class_id in class_ids:
+            query = StudentScoreSummary.query.filter_by(student_id=student_id, class_id=class_id)
+            if query.update(values, synchronize_session=False):
+                continue
+
+            # Chưa có dòng: dựng từ bảng gốc (chưa gồm bản ghi mới) rồi cộng thay đổi
+            row = ScoreSummaryService._build_row(student_id, class_id)
+            for name, delta in deltas.items():
+                setattr(row, name, getattr(row, name) + delta)
+            if not ScoreSummaryService._insert(row):
+                query.update(values, synchronize_session=False)
+
+    @staticmethod
+    def _scopes(video):
+        """Các dòng tổng hợp chứa video: tổng (0) và lớp của bài tập (nếu có)"""
+        scopes = [0]
+        if video.assignment_id:
+            class_id = db.session.query(Assignment.assigned_to_class).filter(
+                Assignment.assignment_id == video.assignment_id
+            ).scalar()
+            if class_id:
+                scopes.append(class_id)
+        return scopes
+
+    @staticmethod
+    def _lock_video(video_id):
+        """Khóa dòng video đến hết transaction của người gọi.
+
+        Kết quả AI và các lượt chấm của cùng một video ghi lần lượt, nên chỉ đúng một
+        transaction thấy mình là lượt chấm đầu tiên (thay điểm AI bằng điểm chấm).
+        """
+        db.session.query(TrainingVideo.video_id).filter(
+            TrainingVideo.video_id == video_id
+        ).with_for_update().scalar()
+
+    @staticmethod
+    def _is_graded(video_id):
+        # Đọc có khóa (FOR UPDATE) để thấy cả lượt chấm transaction khác vừa commit,
+        # không phải snapshot cũ của REPEATABLE READ
+        return db.session.query(ManualEvaluation.evaluation_id).filter(
+            ManualEvaluation.video_id == video_id
+        ).limit(1).with_for_update().first() is not None
+
+    @staticmethod
+    def record_video(video):
+        """Video mới của học viên (gọi trước khi add video)"""
+        ScoreSummaryService._apply(video.student_id, ScoreSummaryService._scopes(video), {'video_count': 1})
+
+    @staticmethod
+    def record_ai_analysis(video, analysis):
+        """Kết quả AI mới của video (gọi trước khi add analysis)"""
+        score = _number(analysis.overall_score)
+        deltas = {'ai_count': 1, 'ai_score_sum': score}
+        for name in ('technique', 'posture', 'timing'):
+            value = getattr(analysis, f'{name}_score')
+            if value is not None:
+                deltas[f'{name}_count'] = 1
+                deltas[f'{name}_sum'] = _number(value)
+
+        # Video chưa được chấm: điểm của video là điểm AI
+        ScoreSummaryService._lock_video(video.video_id)
+        if not ScoreSummaryService._is_graded(video.video_id):
+            deltas['scored_count'] = 1
+            deltas['scored_sum'] = score
+
+        ScoreSummaryService._apply(video.student_id, ScoreSummaryService._scopes(video), deltas)
+
+    @staticmethod
+    def record_evaluation(video, evaluation):
+        """Lượt chấm mới của video (gọi trước khi add evaluation)"""
+        score = _number(evaluation.overall_score)
+        deltas = {
+            'manual_count': 1,
+            'manual_score_sum': score,
+            'passed_count': 1 if evaluation.is_passed else 0,
+        }
+
+        # Lượt chấm đầu tiên thay điểm AI (nếu có) làm điểm của video
+        ScoreSummaryService._lock_video(video.video_id)
+        if not ScoreSummaryService._is_graded(video.video_id):
+            ai_score = db.session.query(AIAnalysisResult.overall_score).filter(
+                AIAnalysisResult.video_id == video.video_id
+            ).with_for_update().scalar()
+            if ai_score is None:
+                deltas['scored_count'] = 1
+                deltas['scored_sum'] = score
+            else:
+                deltas['scored_sum'] = score - ai_score
+
+        ScoreSummaryService._apply(video.student_id, ScoreSummaryService._scopes(video), deltas)
+
+    @staticmethod
+    def get_summary(student_id, class_id=0):
+        """Dòng tổng hợp của học viên (class_id = 0: mọi video), dựng lần đầu nếu chưa có"""
+        row = db.session.get(StudentScoreSummary, (student_id, class_id))
+        if row is None:
+            row = ScoreSummaryService._build_row(student_id, class_id)
+            if ScoreSummaryService._insert(row):
+                db.session.commit()
+            else:
+                row = db.session.get(StudentScoreSummary, (student_id, class_id))
+        return row
+
+    @staticmethod
+    def get_class_summaries(class_id, student_ids):
+        """Dòng tổng hợp trong lớp của nhiều học viên (một query).
+
+        Returns:
+            dict: student_id -> StudentScoreSummary
+        """
+        if not student_ids:
+            return {}
+        rows = {row.student_id: row for row in StudentScoreSummary.query.filter(
+            StudentScoreSummary.class_id == class_id,
+            StudentScoreSummary.student_id.in_(student_ids)
+        ).all()}
+        for student_id in student_ids:
+            if student_id not in rows:
+                rows[student_id] = ScoreSummaryService.get_summary(student_id, class_id)
+        return rows
+
+    @staticmethod
+    def average(row, field):
+        """Trung bình của một tiêu chí từ dòng tổng hợp: scored, ai, manual, technique, posture, timing"""
+        count = getattr(row, 'manual_count' if field == 'manual' else f'{field}_count')
+        total = getattr(row, {'ai': 'ai_score_sum', 'manual': 'manual_score_sum'}.get(field, f'{field}_sum'))
+        return round(float(total) / count, 2) if count else 0.0
+
+    @staticmethod
+    def rebuild(student_ids=None):
+        """Tính lại bảng tổng hợp từ bảng gốc (toàn bộ hoặc một số học viên).
+
+        Returns:
+            int: số dòng đã ghi
+        """
+        query = StudentScoreSummary.query
+        if student_ids is not None:
+            student_ids = list(student_ids)
+            if not student_ids:
+                return 0
+            query = query.filter(StudentScoreSummary.student_id.in_(student_ids))
+        query.delete(synchronize_session=False)
+
+        if student_ids is None:
+            computed = ScoreSummaryService._compute()
+        else:
+            computed = {}
+            for student_id in student_ids:
+                computed.update(ScoreSummaryService._compute(student_id))
+
+        for (student_id, class_id), values in computed.items():
+            db.session.add(ScoreSummaryService._new_row(student_id, class_id, values))
+        db.session.commit()
+        return len(computed)
@@ -0,0 +1,737 @@
+from app.models import db
+from app.models.stored_blob import StoredBlob
+from app.models.training_video import TrainingVideo
+from app.models.exam import Exam
+from app.services.media_service import MediaService
+from app.utils.helpers import get_vietnam_time_naive
+from flask import current_app, url_for
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from sqlalchemy import event, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from datetime import timedelta
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+
+_driver_lock = threading.Lock()
+
+COPY_BUFFER_SIZE = 1024 * 1024  # 1MB
+SIGNED_URL_SALT = 'media-signed-url'
+PENDING_DELETES_KEY = 'storage_pending_deletes'  # session.info: file chờ xóa sau commit
+
+
+def _remove_file(file_path):
+    try:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+    except OSError as e:
+        print(f"Error deleting stored file: {e}")
+
+
+def _remove_pending_files(session):
+    # File cũ (ngoài kho) được release_path đánh dấu: chỉ xóa khi bản ghi đã thật sự bị xóa
+    for file_path in session.info.pop(PENDING_DELETES_KEY, []):
+        _remove_file(file_path)
+
+
+def _discard_pending_files(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(PENDING_DELETES_KEY, None)
+
+
+event.listen(Session, 'after_commit', _remove_pending_files)
+event.listen(Session, 'after_soft_rollback', _discard_pending_files)
+
+
+def _walk_files(folder):
+    """Yield (path, size_bytes, mtime) của mọi file dưới folder"""
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield path.replace(os.sep, '/'), stat.st_size, stat.st_mtime
+
+
+class LocalStorageDriver:
+    """Lưu file trên đĩa của web node.
+
+    Key là đường dẫn tương đối với thư mục chạy app (giống video_url hiện có,
+    vd: instance/media/blobs/3f/<sha256>.mp4) nên dữ liệu cũ dùng được ngay.
+    """
+
+    remote = False
+
+    def __init__(self, secret_key):
+        self.serializer = URLSafeTimedSerializer(secret_key, salt=SIGNED_URL_SALT)
+
+    def put_stream(self, key, stream):
+        """Ghi stream vào key (ghi file tạm rồi rename để không ai đọc phải file dở)"""
+        os.makedirs(os.path.dirname(key) or '.', exist_ok=True)
+        tmp_path = f"{key}.tmp-{uuid.uuid4().hex}"
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for block in iter(lambda: stream.read(COPY_BUFFER_SIZE), b''):
+                    f.write(block)
+                    size += len(block)
+            os.replace(tmp_path, key)
+        except Exception:
+            _remove_file(tmp_path)
+            raise
+        return size
+
+    def put_file(self, key, file_path, move=False):
+        os.makedirs(os.path.dirname(key) or '.', exist_ok=True)
+        if move:
+            os.replace(file_path, key)
+            os.utime(key)  # collect_garbage dựa vào mtime để không xóa file chưa kịp commit bản ghi
+        else:
+            shutil.copyfile(file_path, key)
+        return os.path.getsize(key)
+
+    def open(self, key):
+        return open(key, 'rb')
+
+    def exists(self, key):
+        return os.path.isfile(key)
+
+    def size(self, key):
+        return os.path.getsize(key) if os.path.isfile(key) else None
+
+    def delete(self, key):
+        _remove_file(key)
+
+    def list(self, prefix):
+        """Yield (key, size_bytes, mtime) của các file dưới prefix"""
+        return _walk_files(prefix)
+
+    def local_path(self, key):
+        return key if os.path.isfile(key) else None
+
+    def url(self, key, expires=3600):
+        """URL có hạn dùng (ký bằng SECRET_KEY), phục vụ bởi media.signed_file"""
+        return url_for('media.signed_file', token=self.serializer.dumps({'key': key, 'exp': int(expires)}))
+
+    def verify_token(self, token):
+        """Key trong token; None nếu sai chữ ký hoặc đã hết hạn"""
+        try:
+            data, signed_at = self.serializer.loads(token, return_timestamp=True)
+        except BadSignature:
+            return None
+        if time.time() - signed_at.timestamp() > data.get('exp', 0):
+            return None
+        return data.get('key')
+
+    # Multipart: mỗi part ghi một file trong thư mục tạm, ghép theo thứ tự khi complete
+    def create_multipart(self, key):
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._parts_folder(key, upload_id), exist_ok=True)
+        return upload_id
+
+    def upload_part(self, key, upload_id, part_number, data):
+        """data: bytes hoặc stream; trả về ETag (MD5) của part"""
+        hasher = hashlib.md5()
+        part_path = os.path.join(self._parts_folder(key, upload_id), f"{int(part_number):05d}")
+        with open(part_path, 'wb') as f:
+            blocks = [data] if isinstance(data, (bytes, bytearray)) else iter(lambda: data.read(COPY_BUFFER_SIZE), b'')
+            for block in blocks:
+                f.write(block)
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    def complete_multipart(self, key, upload_id, parts):
+        """parts: [(part_number, etag)]"""
+        folder = self._parts_folder(key, upload_id)
+        tmp_path = f"{key}.tmp-{upload_id}"
+        try:
+            with open(tmp_path, 'wb') as out:
+                for part_number, _ in sorted(parts):
+                    with open(os.path.join(folder, f"{int(part_number):05d}"), 'rb') as f:
+                        shutil.copyfileobj(f, out, COPY_BUFFER_SIZE)
+            os.replace(tmp_path, key)
+        except Exception:
+            _remove_file(tmp_path)
+            raise
+        shutil.rmtree(folder, ignore_errors=True)
+
+    def abort_multipart(self, key, upload_id):
+        shutil.rmtree(self._parts_folder(key, upload_id), ignore_errors=True)
+
+    def _parts_folder(self, key, upload_id):
+        return os.path.join(os.path.dirname(key) or '.', f".parts-{upload_id}")
+
+
+class S3StorageDriver:
+    """Lưu file trên S3 hoặc dịch vụ tương thích (MinIO, Ceph RGW...) qua endpoint_url.
+
+    Ghi bằng multipart upload theo part_size nên không giữ cả file trong bộ nhớ. Trình phát
+    nhận URL ký sẵn (presigned) và tải thẳng từ bucket, web node không chuyển tiếp byte video.
+    Code cần file trên đĩa (OpenCV, ffmpeg) dùng local_path(): tải về cache_folder một lần.
+    """
+
+    remote = True
+    MIN_PART_SIZE = 5 * 1024 * 1024  # Giới hạn của S3 (trừ part cuối)
+
+    def __init__(self, bucket, prefix='', endpoint_url=None, region=None, access_key=None, secret_key=None,
+                 cache_folder='instance/storage_cache', part_size=8 * 1024 * 1024):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError("STORAGE_DRIVER=s3 cần cài boto3 (pip install boto3)")
+
+        self.bucket = bucket
+        self.prefix = (prefix or '').strip('/')
+        self.cache_folder = cache_folder
+        self.part_size = max(int(part_size), self.MIN_PART_SIZE)
+        # MinIO và phần lớn dịch vụ tương thích chỉ hỗ trợ path-style
+        addressing = {'addressing_style': 'path'} if endpoint_url else {}
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            config=Config(signature_version='s3v4', s3=addressing)
+        )
+
+    def _key(self, key):
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def put_stream(self, key, stream):
+        first = stream.read(self.part_size)
+        if len(first) < self.part_size:
+            # Nhỏ hơn một part: một request put_object
+            self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=first,
+                                   ContentType=MediaService.mimetype(key))
+            return len(first)
+
+        upload_id = self.create_multipart(key)
+        parts, size, block = [], 0, first
+        try:
+            while block:
+                part_number = len(parts) + 1
+                parts.append((part_number, self.upload_part(key, upload_id, part_number, block)))
+                size += len(block)
+                block = stream.read(self.part_size)
+            self.complete_multipart(key, upload_id, parts)
+        except Exception:
+            self.abort_multipart(key, upload_id)
+            raise
+        return size
+
+    def put_file(self, key, file_path, move=False):
+        with open(file_path, 'rb') as f:
+            size = self.put_stream(key, f)
+        if move:
+            # Giữ bản vừa upload làm cache: probe/chuyển mã/phân tích ngay sau đó không phải tải lại
+            cache_path = self._cache_path(key)
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            os.replace(file_path, cache_path)
+        return size
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body']
+
+    def _head(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def size(self, key):
+        head = self._head(key)
+        return head['ContentLength'] if head else None
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        _remove_file(self._cache_path(key))
+
+    def list(self, prefix):
+        strip = len(self.prefix) + 1 if self.prefix else 0
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            for item in page.get('Contents', []):
+                yield item['Key'][strip:], item['Size'], item['LastModified'].timestamp()
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_folder, *key.split('/'))
+
+    def local_path(self, key):
+        """Bản trên đĩa (tải về cache nếu chưa có hoặc khác kích thước)"""
+        head = self._head(key)
+        if head is None:
+            return None
+        cache_path = self._cache_path(key)
+        if os.path.isfile(cache_path) and os.path.getsize(cache_path) == head['ContentLength']:
+            os.utime(cache_path)  # Đánh dấu vừa dùng cho trim_cache
+            return cache_path
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.tmp-{uuid.uuid4().hex}"
+        try:
+            with open(tmp_path, 'wb') as f:
+                self.client.download_fileobj(self.bucket, self._key(key), f)
+            os.replace(tmp_path, cache_path)
+        except Exception:
+            _remove_file(tmp_path)
+            raise
+        return cache_path
+
+    def url(self, key, expires=3600):
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self._key(key), 'ResponseContentType': MediaService.mimetype(key)},
+            ExpiresIn=int(expires)
+        )
+
+    def create_multipart(self, key):
+        response = self.client.create_multipart_upload(Bucket=self.bucket, Key=self._key(key),
+                                                       ContentType=MediaService.mimetype(key))
+        return response['UploadId']
+
+    def upload_part(self, key, upload_id, part_number, data):
+        """data: bytes hoặc stream; trả về ETag của part"""
+        response = self.client.upload_part(Bucket=self.bucket, Key=self._key(key), UploadId=upload_id,
+                                           PartNumber=int(part_number), Body=data)
+        return response['ETag']
+
+    def presign_part(self, key, upload_id, part_number, expires=3600):
+        """URL để client PUT thẳng một part lên bucket (không qua web node)"""
+        return self.client.generate_presigned_url(
+            'upload_part',
+            Params={'Bucket': self.bucket, 'Key': self._key(key), 'UploadId': upload_id, 'PartNumber': int(part_number)},
+            ExpiresIn=int(expires)
+        )
+
+    def complete_multipart(self, key, upload_id, parts):
+        """parts: [(part_number, etag)]"""
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self._key(key), UploadId=upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': int(n), 'ETag': etag} for n, etag in sorted(parts)]}
+        )
+
+    def abort_multipart(self, key, upload_id):
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=self._key(key), UploadId=upload_id)
+
+    def trim_cache(self, max_bytes):
+        """Xóa bản cache lâu không dùng nhất cho tới khi tổng dung lượng <= max_bytes"""
+        entries = sorted(_walk_files(self.cache_folder), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for path, size, _ in entries:
+            if total - freed <= max_bytes:
+                break
+            _remove_file(path)
+            freed += size
+        return freed
+
+
+class StorageService:
+    """Kho file theo nội dung (content-addressed).
+
+    Mỗi nội dung được lưu một lần ở BLOB_FOLDER/<2 ký tự đầu>/<sha256>.<ext>; các bản ghi
+    TrainingVideo/Exam trỏ cùng file và StoredBlob.ref_count đếm số bản ghi đang dùng.
+    File bị xóa khi không còn bản ghi nào tham chiếu.
+
+    Nơi lưu do driver quyết định (STORAGE_DRIVER): 'local' (đĩa web node) hoặc 's3'
+    (S3/MinIO). Đường dẫn lưu trong DB là key của driver, không đổi khi đổi driver;
+    file tạm lúc nhận upload luôn nằm trên đĩa (BLOB_FOLDER/tmp).
+    """
+
+    COPY_BUFFER_SIZE = COPY_BUFFER_SIZE
+    ORPHAN_MIN_AGE_SECONDS = 3600  # File tạm / file chưa có bản ghi mới hơn mức này có thể đang được ghi
+
+    @staticmethod
+    def driver():
+        """Driver dùng chung của app, tạo lần đầu khi cần"""
+        app = current_app._get_current_object()
+        driver = app.extensions.get('storage_driver')
+        if driver is None:
+            with _driver_lock:
+                driver = app.extensions.get('storage_driver')
+                if driver is None:
+                    config = app.config
+                    if config.get('STORAGE_DRIVER', 'local') == 's3':
+                        driver = S3StorageDriver(
+                            bucket=config['STORAGE_S3_BUCKET'],
+                            prefix=config.get('STORAGE_S3_PREFIX'),
+                            endpoint_url=config.get('STORAGE_S3_ENDPOINT_URL'),
+                            region=config.get('STORAGE_S3_REGION'),
+                            access_key=config.get('STORAGE_S3_ACCESS_KEY'),
+                            secret_key=config.get('STORAGE_S3_SECRET_KEY'),
+                            cache_folder=config.get('STORAGE_CACHE_FOLDER', 'instance/storage_cache'),
+                            part_size=config.get('STORAGE_PART_SIZE', 8 * 1024 * 1024)
+                        )
+                    else:
+                        driver = LocalStorageDriver(config['SECRET_KEY'])
+                    app.extensions['storage_driver'] = driver
+        return driver
+
+    @staticmethod
+    def _folder():
+        return current_app.config.get('BLOB_FOLDER') or os.path.join(
+            current_app.config.get('UPLOAD_FOLDER', 'instance/media'), 'blobs'
+        )
+
+    @staticmethod
+    def blob_path(digest, ext):
+        # Dùng '/' để so khớp được với video_url/reference_video_path trên mọi hệ điều hành
+        return os.path.join(StorageService._folder(), digest[:2], f"{digest}.{ext}").replace(os.sep, '/')
+
+    @staticmethod
+    def get_blob(digest):
+        return StoredBlob.query.get(digest) if digest else None
+
+    @staticmethod
+    def get_blob_by_path(file_path):
+        return StoredBlob.query.filter_by(file_path=file_path).first() if file_path else None
+
+    @staticmethod
+    def local_path(file_path):
+        """Đường dẫn trên đĩa để đọc file (OpenCV, ffmpeg); với driver s3 là bản cache tải về"""
+        if not file_path or os.path.isfile(file_path):
+            return file_path
+        try:
+            return StorageService.driver().local_path(file_path) or file_path
+        except Exception as e:
+            print(f"Error fetching stored file {file_path}: {e}")
+            return file_path
+
+    @staticmethod
+    def open(file_path):
+        """Đọc file dạng stream (không tải cả file vào bộ nhớ)"""
+        if os.path.isfile(file_path):
+            return open(file_path, 'rb')
+        return StorageService.driver().open(file_path)
+
+    @staticmethod
+    def signed_url(file_path, expires=None):
+        """URL tải trực tiếp có thời hạn: presigned URL của bucket, hoặc media.signed_file với driver local"""
+        if expires is None:
+            expires = current_app.config.get('STORAGE_URL_EXPIRES', 3600)
+        return StorageService.driver().url(file_path, expires)
+
+    @staticmethod
+    def save_stream(stream, ext):
+        """Ghi stream (FileStorage.stream...) vào kho, tính SHA-256 ngay trong lúc ghi.
+
+        Returns:
+            StoredBlob (đã flush, chưa tăng ref_count)
+        """
+        tmp_folder = os.path.join(StorageService._folder(), 'tmp')
+        os.makedirs(tmp_folder, exist_ok=True)
+        tmp_path = os.path.join(tmp_folder, f"{uuid.uuid4().hex}.{ext}")
+
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for block in iter(lambda: stream.read(StorageService.COPY_BUFFER_SIZE), b''):
+                    f.write(block)
+                    hasher.update(block)
+                    size += len(block)
+        except Exception:
+            _remove_file(tmp_path)
+            raise
+
+        return StorageService._commit(tmp_path, hasher.hexdigest(), size, ext)
+
+    @staticmethod
+    def store_file(file_path, digest=None):
+        """Đưa file đã nằm trên đĩa (vd: upload theo chunk) vào kho.
+
+        File được chuyển vào kho, hoặc bị xóa nếu kho đã có nội dung này.
+        digest: SHA-256 đã tính sẵn (UploadSession.checksum_sha256) để không đọc lại file.
+        """
+        blob = StorageService.get_blob_by_path(file_path)
+        if blob:
+            return blob
+
+        if not digest:
+            digest = StorageService._file_digest(file_path)
+        ext = file_path.rsplit('.', 1)[1].lower() if '.' in os.path.basename(file_path) else 'bin'
+        return StorageService._commit(file_path, digest, os.path.getsize(file_path), ext)
+
+    @staticmethod
+    def _commit(source_path, digest, size, ext):
+        driver = StorageService.driver()
+        blob = StoredBlob.query.get(digest)
+        if blob and not StorageService._touch(blob):
+            # collect_garbage ở process khác vừa xóa blob: lưu lại như nội dung mới
+            db.session.expunge(blob)
+            blob = None
+        if blob and driver.exists(blob.file_path):
+            # Trùng nội dung: giữ bản đã có (_touch khóa dòng tới khi caller commit, GC không xóa được)
+            _remove_file(source_path)
+            return blob
+
+        path = StorageService.blob_path(digest, ext)
+        driver.put_file(path, source_path, move=True)
+
+        if blob:
+            # Bản ghi còn nhưng file đã mất (hoặc bản gốc đang ở tầng cold): dùng file vừa nhận
+            StorageService._remove_after_commit(blob.cold_path)
+            blob.file_path = path
+            blob.storage_tier = 'hot'
+            blob.cold_path = None
+            blob.archived_at = None
+            db.session.flush()
+            return blob
+
+        blob = StoredBlob(
+            sha256=digest,
+            file_path=path,
+            size_bytes=size,
+            ref_count=0,
+            created_at=get_vietnam_time_naive(),
+            last_used_at=get_vietnam_time_naive()
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(blob)
+        except IntegrityError:
+            # Request khác vừa lưu cùng nội dung (file đích giống hệt nên bản vừa ghi vẫn đúng)
+            blob = StoredBlob.query.get(digest)
+        return blob
+
+    @staticmethod
+    def acquire(blob):
+        """Tăng số tham chiếu (gọi khi gắn blob vào bản ghi, trong cùng transaction)"""
+        StoredBlob.query.filter_by(sha256=blob.sha256).update(
+            {'ref_count': StoredBlob.ref_count + 1, 'last_used_at': get_vietnam_time_naive()},
+            synchronize_session=False
+        )
+
+    @staticmethod
+    def _touch(blob):
+        """Ghi last_used_at (khóa dòng tới hết transaction); False nếu blob không còn"""
+        return StoredBlob.query.filter_by(sha256=blob.sha256).update(
+            {'last_used_at': get_vietnam_time_naive()}, synchronize_session=False
+        ) == 1
+
+    @staticmethod
+    def _remove_after_commit(file_path):
+        if file_path:
+            db.session.info.setdefault(PENDING_DELETES_KEY, []).append(file_path)
+
+    @staticmethod
+    def release_path(file_path):
+        """Bỏ một tham chiếu tới file (trong transaction của bản ghi đang xóa).
+
+        Không xóa file ở đây: caller còn có thể rollback. Blob hết tham chiếu được giữ lại
+        với ref_count = 0 (upload trùng nội dung dùng lại được) và collect_garbage dọn sau;
+        file không thuộc kho (dữ liệu cũ) chỉ bị xóa sau khi transaction commit.
+        """
+        blob = StorageService.get_blob_by_path(file_path)
+        if not blob:
+            StorageService._remove_after_commit(file_path)
+            return
+
+        StoredBlob.query.filter(
+            StoredBlob.sha256 == blob.sha256,
+            StoredBlob.ref_count > 0
+        ).update({'ref_count': StoredBlob.ref_count - 1}, synchronize_session=False)
+        StorageService._touch(blob)
+
+    @staticmethod
+    def count_references(file_path):
+        return (TrainingVideo.query.filter_by(video_url=file_path).count() +
+                Exam.query.filter_by(reference_video_path=file_path).count())
+
+    @staticmethod
+    def collect_garbage():
+        """Đếm lại tham chiếu từ database (bản ghi bị xóa theo cascade không gọi release_path),
+        xóa blob không còn ai dùng và file mồ côi trong kho. Blob được dùng lại/giải phóng trong
+        ORPHAN_MIN_AGE_SECONDS gần đây được giữ tới lần chạy sau (upload đang gắn blob có thể chưa commit).
+
+        Returns:
+            dict: blobs_removed, files_removed, bytes_freed
+        """
+        driver = StorageService.driver()
+        freed = 0
+        cutoff = get_vietnam_time_naive() - timedelta(seconds=StorageService.ORPHAN_MIN_AGE_SECONDS)
+        unused = []
+        for blob in StoredBlob.query.all():
+            references = StorageService.count_references(blob.file_path)
+            if references:
+                blob.ref_count = references
+                continue
+            # Xóa có điều kiện trên bản mới nhất của dòng (chờ transaction đang dùng lại blob commit):
+            # blob vừa được dùng lại/giải phóng, có thể chưa thấy bản ghi tham chiếu, để lần sau
+            deleted = StoredBlob.query.filter(
+                StoredBlob.sha256 == blob.sha256,
+                func.coalesce(StoredBlob.last_used_at, StoredBlob.created_at) < cutoff
+            ).delete(synchronize_session=False)
+            if deleted:
+                db.session.expunge(blob)
+                unused.append(blob)
+        db.session.commit()
+
+        # Chỉ xóa file khi dòng đã thật sự bị xóa
+        for blob in unused:
+            freed += blob.size_bytes
+            StorageService._delete_blob_file(blob.file_path)
+            _remove_file(blob.cold_path)
+        removed = len(unused)
+
+        known = {path for (path,) in db.session.query(StoredBlob.file_path).all()}
+        cutoff = time.time() - StorageService.ORPHAN_MIN_AGE_SECONDS
+        folder = StorageService._folder().replace(os.sep, '/')
+        files_removed = 0
+        for key, size, mtime in driver.list(folder):
+            if key not in known and mtime < cutoff:
+                StorageService._delete_blob_file(key)
+                files_removed += 1
+                freed += size
+
+        if driver.remote:
+            # File tạm khi nhận upload nằm trên đĩa, không trong bucket
+            for path, size, mtime in _walk_files(os.path.join(folder, 'tmp')):
+                if mtime < cutoff:
+                    _remove_file(path)
+                    files_removed += 1
+                    freed += size
+            max_bytes = current_app.config.get('STORAGE_CACHE_MAX_MB', 10240) * 1024 * 1024
+            freed += driver.trim_cache(max_bytes)
+
+        return {'blobs_removed': removed, 'files_removed': files_removed, 'bytes_freed': freed}
+
+    @staticmethod
+    def import_existing():
+        """Chuyển video cũ (tên uuid, có thể trùng nội dung) vào kho và gộp bản trùng.
+
+        Returns:
+            dict: files_imported, duplicates_removed
+        """
+        imported, duplicates = 0, 0
+        folder = os.path.normpath(StorageService._folder())
+
+        for video in TrainingVideo.query.filter(TrainingVideo.content_sha256.is_(None)).all():
+            path = video.video_url
+            if not path or not os.path.isfile(path) or os.path.normpath(path).startswith(folder + os.sep):
+                continue
+            digest = StorageService._file_digest(path)
+            existed = StorageService.get_blob(digest) is not None
+            blob = StorageService.store_file(path, digest)
+            video.video_url = blob.file_path
+            video.content_sha256 = blob.sha256
+            StorageService.acquire(blob)
+            imported += 1
+            duplicates += 1 if existed else 0
+            db.session.commit()
+
+        exam_folder = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'instance/media'), 'exam_videos')
+        for exam in Exam.query.filter(Exam.video_upload_method == 'upload', Exam.reference_video_path.isnot(None)).all():
+            if '/' in exam.reference_video_path:
+                continue
+            path = os.path.join(exam_folder, exam.reference_video_path)
+            if not os.path.isfile(path):
+                continue
+            digest = StorageService._file_digest(path)
+            existed = StorageService.get_blob(digest) is not None
+            blob = StorageService.store_file(path, digest)
+            exam.reference_video_path = blob.file_path
+            StorageService.acquire(blob)
+            imported += 1
+            duplicates += 1 if existed else 0
+            db.session.commit()
+
+        return {'files_imported': imported, 'duplicates_removed': duplicates}
+
+    @staticmethod
+    def migrate_legacy_uploads(legacy_folder='static/uploads'):
+        """Chuyển file upload cũ khỏi static/ (Flask phục vụ công khai, bỏ qua kiểm tra quyền của /media)
+        sang UPLOAD_FOLDER và sửa đường dẫn lưu trong DB.
+
+        Chỉ sửa đường dẫn của file đã có ở chỗ mới: blob trên S3 (key không đổi) giữ nguyên.
+
+        Returns:
+            dict: files_moved, files_skipped, rows_updated
+        """
+        from app.models.martial_routine import MartialRoutine
+        from app.models.assignment import Assignment
+        from app.models.upload_session import UploadSession
+        from app.models.ai_analysis import AIAnalysisResult
+
+        legacy = legacy_folder.replace(os.sep, '/').strip('/')
+        target = current_app.config.get('UPLOAD_FOLDER', 'instance/media').replace(os.sep, '/').rstrip('/')
+        stats = {'files_moved': 0, 'files_skipped': 0, 'rows_updated': 0}
+        if os.path.normpath(legacy) == os.path.normpath(target):
+            return stats
+
+        # File đã được chuyển tay (hoặc lần chạy trước) thì chỉ sửa đường dẫn trong DB
+        for path, _, _ in list(_walk_files(legacy)):
+            dest = target + path[len(legacy):]
+            if os.path.exists(dest):
+                stats['files_skipped'] += 1
+                continue
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.move(path, dest)
+            stats['files_moved'] += 1
+
+        def moved(value):
+            """Đường dẫn mới (giữ dấu '/' đầu nếu có), None nếu không đổi"""
+            if not value or '://' in value or not value.lstrip('/').startswith(legacy + '/'):
+                return None
+            new_path = target + value.lstrip('/')[len(legacy):]
+            if not os.path.isfile(new_path):
+                return None
+            return ('/' if value.startswith('/') else '') + new_path
+
+        columns = (
+            (TrainingVideo, ('video_url', 'thumbnail_url', 'hls_url', 'proxy_url')),
+            (StoredBlob, ('file_path',)),
+            (Exam, ('reference_video_path',)),
+            (MartialRoutine, ('reference_video_url', 'thumbnail_url')),
+            (Assignment, ('instructor_video_url',)),
+            (UploadSession, ('file_path',)),
+        )
+        for model, names in columns:
+            condition = db.or_(*[getattr(model, name).like(f'%{legacy}/%') for name in names])
+            for row in model.query.filter(condition).all():
+                for name in names:
+                    new_path = moved(getattr(row, name))
+                    if new_path:
+                        setattr(row, name, new_path)
+                        stats['rows_updated'] += 1
+
+        for result in AIAnalysisResult.query.filter(AIAnalysisResult.key_frames.isnot(None)).all():
+            frames = [dict(frame) for frame in result.key_frames or []]
+            changed = False
+            for frame in frames:
+                new_path = moved(frame.get('image'))
+                if new_path:
+                    frame['image'] = new_path
+                    changed = True
+            if changed:
+                result.key_frames = frames
+                stats['rows_updated'] += 1
+
+        db.session.commit()
+        return stats
+
+    @staticmethod
+    def _file_digest(file_path):
+        from app.services.upload_service import UploadService
+        return UploadService.file_sha256(file_path)
+
+    @staticmethod
+    def _delete_blob_file(file_path):
+        try:
+            StorageService.driver().delete(file_path)
+        except Exception as e:
+            print(f"Error deleting stored file: {e}")
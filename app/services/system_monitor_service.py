@@ -0,0 +1,280 @@
+from app.models import db
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import os
+import shutil
+import threading
+import time
+
+# Bucket mặc định của Prometheus cho độ trễ (giây)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+JOB_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+
+
+class Histogram:
+    """Histogram kiểu Prometheus (bucket cộng dồn), mỗi bộ label một dãy đếm riêng"""
+
+    def __init__(self, name, documentation, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def set(self, labels, cumulative, total, count):
+        """Gán số liệu đã tổng hợp sẵn (bucket cộng dồn) cho một bộ label, vd tính từ database"""
+        counts = [value - previous for value, previous in zip(cumulative, (0,) + tuple(cumulative[:-1]))]
+        with self._lock:
+            self._series[tuple(labels)] = [counts, total, count]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(snapshot.items()):
+            base = _format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_merge_labels(base, _format_labels(('le',), (bound,)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_merge_labels(base, _format_labels(('le',), ('+Inf',)))} {count}")
+            lines.append(f"{self.name}_sum{_wrap(base)} {total:.6f}")
+            lines.append(f"{self.name}_count{_wrap(base)} {count}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _merge_labels(base, extra):
+    return '{' + (f"{base},{extra}" if base else extra) + '}'
+
+
+def _wrap(base):
+    return '{' + base + '}' if base else ''
+
+
+def _gauge(name, documentation, samples):
+    """samples: [(labels dict, value)]"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        label_text = _format_labels(labels.keys(), labels.values())
+        lines.append(f"{name}{_wrap(label_text)} {value}")
+    return lines
+
+
+# Số query/thời gian query của request hiện tại (mỗi thread xử lý một request)
+_request_state = threading.local()
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Thời gian xử lý request theo endpoint',
+                            ('endpoint', 'method', 'status'))
+REQUEST_QUERIES = Histogram('http_request_db_queries', 'Số câu SQL mỗi request theo endpoint',
+                            ('endpoint',), QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram('http_request_db_seconds', 'Tổng thời gian SQL mỗi request theo endpoint',
+                            ('endpoint',))
+QUERY_LATENCY = Histogram('db_query_duration_seconds', 'Thời gian từng câu SQL', ('statement',))
+
+
+class SystemMonitorService:
+    """Đo độ trễ request, số/thời gian query SQL, job phân tích và dung lượng thư mục upload.
+
+    Số liệu request/SQL giữ trong bộ nhớ của từng process (không cần thư viện ngoài) và xuất ở
+    /metrics theo định dạng text của Prometheus. Chạy nhiều process gunicorn thì mỗi process
+    có số liệu riêng. Số liệu job phân tích đọc từ bảng analysis_jobs lúc scrape nên worker
+    chạy riêng (`flask analysis-worker`) vẫn hiện ở /metrics của web.
+    """
+
+    _disk_cache = {'at': 0, 'lines': []}
+    _disk_lock = threading.Lock()
+    _installed = False
+
+    @staticmethod
+    def init_app(app):
+        """Gắn hook before/after request và event SQLAlchemy (gọi một lần trong create_app)"""
+        app.before_request(SystemMonitorService._before_request)
+        app.after_request(SystemMonitorService.record_response)
+        app.teardown_request(SystemMonitorService._teardown_request)
+
+        if not SystemMonitorService._installed:
+            # Gắn vào lớp Engine: áp dụng cho engine tạo sau này (Flask-SQLAlchemy tạo engine lười)
+            event.listen(Engine, 'before_cursor_execute', SystemMonitorService._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', SystemMonitorService._after_cursor_execute)
+            SystemMonitorService._installed = True
+
+    @staticmethod
+    def _before_request():
+        _request_state.started = time.perf_counter()
+        _request_state.queries = 0
+        _request_state.query_seconds = 0.0
+        _request_state.status = None
+
+    @staticmethod
+    def record_response(response):
+        _request_state.status = response.status_code
+        return response
+
+    @staticmethod
+    def _teardown_request(exc):
+        started = getattr(_request_state, 'started', None)
+        if started is None:
+            return
+        _request_state.started = None
+
+        endpoint = request.url_rule.endpoint if request.url_rule else 'unmatched'
+        status = 500 if exc is not None else (_request_state.status or 200)
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint, request.method, str(status))
+        REQUEST_QUERIES.observe(_request_state.queries, endpoint)
+        REQUEST_DB_TIME.observe(_request_state.query_seconds, endpoint)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('monitor_query_start', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('monitor_query_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        QUERY_LATENCY.observe(elapsed, statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER')
+        if getattr(_request_state, 'started', None) is not None:
+            _request_state.queries += 1
+            _request_state.query_seconds += elapsed
+
+    @staticmethod
+    def _queue_lines():
+        from app.models.analysis_job import AnalysisJob
+        from app.utils.helpers import get_vietnam_time_naive
+
+        counts = dict(db.session.query(AnalysisJob.job_status, db.func.count(AnalysisJob.job_id))
+                      .group_by(AnalysisJob.job_status).all())
+        oldest = db.session.query(db.func.min(AnalysisJob.run_after)).filter(
+            AnalysisJob.job_status == 'pending'
+        ).scalar()
+        age = max((get_vietnam_time_naive() - oldest).total_seconds(), 0) if oldest else 0
+
+        lines = _gauge('analysis_jobs', 'Số job phân tích theo trạng thái',
+                       [({'status': status}, counts.get(status, 0))
+                        for status in ('pending', 'running', 'completed', 'failed')])
+        lines += _gauge('analysis_queue_oldest_pending_seconds', 'Tuổi của job pending đến hạn lâu nhất',
+                        [({}, round(age, 3))])
+        return lines + SystemMonitorService._job_duration_lines()
+
+    @staticmethod
+    def _job_duration_lines():
+        """Histogram thời gian các bước của job đã kết thúc (lần chạy cuối), đếm bucket bằng SQL"""
+        from app.models.analysis_job import AnalysisJob
+
+        histogram = Histogram('analysis_job_duration_seconds', 'Thời gian các bước của job phân tích AI',
+                              ('stage', 'result'), JOB_BUCKETS)
+        for stage in ('transcode', 'inference', 'total'):
+            column = getattr(AnalysisJob, f'{stage}_seconds')
+            rows = db.session.query(
+                AnalysisJob.job_type,
+                AnalysisJob.job_status,
+                *[db.func.sum(db.case((column <= bound, 1), else_=0)) for bound in JOB_BUCKETS],
+                db.func.sum(column),
+                db.func.count(column)
+            ).filter(
+                AnalysisJob.job_status.in_(('completed', 'failed')),
+                column.isnot(None)
+            ).group_by(AnalysisJob.job_type, AnalysisJob.job_status).all()
+            for job_type, status, *values in rows:
+                label = 'reference_features' if job_type == 'reference_features' else stage
+                histogram.set((label, 'success' if status == 'completed' else 'failure'),
+                              tuple(int(v or 0) for v in values[:-2]), float(values[-2] or 0), int(values[-1]))
+        return histogram.render()
+
+    @staticmethod
+    def _folder_size(path):
+        total = 0
+        stack = [path]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                total += entry.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return total
+
+    @staticmethod
+    def _disk_lines():
+        """Dung lượng từng thư mục con của UPLOAD_FOLDER và các kho khác.
+
+        Duyệt cây thư mục tốn I/O nên kết quả được cache MONITOR_DISK_CACHE_SECONDS.
+        """
+        config = current_app.config
+        ttl = config.get('MONITOR_DISK_CACHE_SECONDS', 300)
+        cache = SystemMonitorService._disk_cache
+        if time.time() - cache['at'] < ttl:
+            return cache['lines']
+
+        with SystemMonitorService._disk_lock:
+            if time.time() - cache['at'] < ttl:
+                return cache['lines']
+
+            upload_folder = config.get('UPLOAD_FOLDER', 'instance/media')
+            folders = {}
+            if os.path.isdir(upload_folder):
+                for entry in os.scandir(upload_folder):
+                    if entry.is_dir(follow_symlinks=False):
+                        folders[entry.path.replace(os.sep, '/')] = entry.path
+            for key in ('COLD_STORAGE_FOLDER', 'STORAGE_CACHE_FOLDER', 'BACKUP_FOLDER'):
+                if config.get(key) and os.path.isdir(config[key]):
+                    folders[config[key]] = config[key]
+
+            samples = [({'path': name}, SystemMonitorService._folder_size(path)) for name, path in sorted(folders.items())]
+            lines = _gauge('upload_folder_bytes', 'Dung lượng thư mục lưu trữ', samples)
+            if os.path.isdir(upload_folder):
+                usage = shutil.disk_usage(upload_folder)
+                lines += _gauge('upload_filesystem_bytes', 'Dung lượng ổ đĩa chứa UPLOAD_FOLDER',
+                                [({'kind': 'total'}, usage.total), ({'kind': 'free'}, usage.free)])
+
+            cache['lines'] = lines
+            cache['at'] = time.time()
+            return lines
+
+    @staticmethod
+    def render_metrics():
+        """Toàn bộ số liệu theo định dạng text của Prometheus (0.0.4)"""
+        lines = []
+        for histogram in (REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_DB_TIME, QUERY_LATENCY):
+            lines += histogram.render()
+        try:
+            lines += SystemMonitorService._queue_lines()
+        except Exception as e:
+            print(f"Error collecting queue metrics: {e}")
+        cache = current_app.extensions.get('analytics_cache')
+        if cache is not None:
+            lines += _gauge('analytics_cache_lookups', 'Số lần đọc cache thống kê (từ lúc process khởi động)',
+                            [({'result': 'hit'}, cache.hits), ({'result': 'miss'}, cache.misses)])
+            lines += _gauge('analytics_cache_entries', 'Số entry trong cache của process', [({}, len(cache.local))])
+        lines += SystemMonitorService._disk_lines()
+        return '\n'.join(lines) + '\n'
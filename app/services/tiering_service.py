@@ -0,0 +1,201 @@
+from app.models import db
+from app.models.stored_blob import StoredBlob
+from app.models.training_video import TrainingVideo
+from app.models.manual_evaluation import ManualEvaluation
+from app.models.exam import Exam
+from app.services.storage_service import StorageService
+from app.utils.helpers import get_vietnam_time_naive
+from flask import current_app
+from datetime import timedelta
+import gzip
+import hashlib
+import os
+import threading
+import uuid
+
+
+class TieringService:
+    """Vòng đời lưu trữ video gốc: hot (kho của StorageService) -> cold (bản nén gzip ở COLD_STORAGE_FOLDER).
+
+    Chỉ chuyển video gốc đã được giảng viên chấm (có ManualEvaluation) và cũ hơn
+    COLD_ARCHIVE_AFTER_DAYS; thumbnail và bản chuyển mã (HLS/proxy) vẫn ở tầng hot nên
+    danh sách, trình phát HLS và phân tích lại không bị ảnh hưởng. Bản gốc được lấy lại
+    (rehydrate) khi có người mở kết quả hoặc tải file gốc.
+    """
+
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    @staticmethod
+    def _folder():
+        return current_app.config.get('COLD_STORAGE_FOLDER', 'instance/cold_storage')
+
+    @staticmethod
+    def _lock_for(digest):
+        with TieringService._locks_guard:
+            return TieringService._locks.setdefault(digest, threading.Lock())
+
+    @staticmethod
+    def cold_path(digest):
+        return os.path.join(TieringService._folder(), digest[:2], f"{digest}.gz").replace(os.sep, '/')
+
+    @staticmethod
+    def archive_candidates(cutoff):
+        """Blob hot mà mọi video dùng nó đều đã chấm và upload trước cutoff, không làm video mẫu của bài kiểm tra"""
+        graded = db.session.query(ManualEvaluation.video_id).filter(
+            ManualEvaluation.video_id == TrainingVideo.video_id
+        ).exists()
+        blocking = db.session.query(TrainingVideo.video_id).filter(
+            TrainingVideo.content_sha256 == StoredBlob.sha256,
+            db.or_(TrainingVideo.uploaded_at >= cutoff, ~graded)
+        ).exists()
+        in_exam = db.session.query(Exam.exam_id).filter(Exam.reference_video_path == StoredBlob.file_path).exists()
+        used_by_video = db.session.query(TrainingVideo.video_id).filter(
+            TrainingVideo.content_sha256 == StoredBlob.sha256
+        ).exists()
+
+        return StoredBlob.query.filter(
+            StoredBlob.storage_tier == 'hot',
+            StoredBlob.ref_count > 0,
+            used_by_video,
+            ~blocking,
+            ~in_exam
+        )
+
+    @staticmethod
+    def archive_blob(blob):
+        """Nén bản gốc sang tầng cold rồi xóa khỏi tầng hot.
+
+        Returns:
+            int: số byte nén (0 nếu không chuyển được)
+        """
+        path = TieringService.cold_path(blob.sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        level = current_app.config.get('COLD_STORAGE_COMPRESSLEVEL', 6)
+
+        hasher = hashlib.sha256()
+        try:
+            with StorageService.open(blob.file_path) as source, gzip.open(tmp_path, 'wb', compresslevel=level) as out:
+                for block in iter(lambda: source.read(StorageService.COPY_BUFFER_SIZE), b''):
+                    out.write(block)
+                    hasher.update(block)
+            if hasher.hexdigest() != blob.sha256:
+                raise ValueError('nội dung không khớp SHA-256')
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Error archiving blob {blob.sha256}: {e}")
+            TieringService._remove_file(tmp_path)
+            return 0
+
+        blob.storage_tier = 'cold'
+        blob.cold_path = path
+        blob.archived_at = get_vietnam_time_naive()
+        db.session.commit()
+
+        # Chỉ xóa bản hot sau khi bản ghi đã trỏ sang cold
+        StorageService._delete_blob_file(blob.file_path)
+        return os.path.getsize(path)
+
+    @staticmethod
+    def rehydrate(blob):
+        """Giải nén bản gốc từ tầng cold về lại file_path (chờ xong).
+
+        Returns:
+            bool: True nếu bản gốc đã ở tầng hot
+        """
+        with TieringService._lock_for(blob.sha256):
+            db.session.refresh(blob)
+            if blob.storage_tier == 'hot':
+                return True
+            if not blob.cold_path or not os.path.isfile(blob.cold_path):
+                print(f"Error rehydrating blob {blob.sha256}: missing {blob.cold_path}")
+                return False
+
+            try:
+                with gzip.open(blob.cold_path, 'rb') as source:
+                    StorageService.driver().put_stream(blob.file_path, source)
+            except Exception as e:
+                print(f"Error rehydrating blob {blob.sha256}: {e}")
+                return False
+
+            cold_path = blob.cold_path
+            blob.storage_tier = 'hot'
+            blob.cold_path = None
+            blob.archived_at = None
+            blob.last_accessed_at = get_vietnam_time_naive()
+            db.session.commit()
+            TieringService._remove_file(cold_path)
+            return True
+
+    @staticmethod
+    def ensure_hot(file_path):
+        """Lấy lại bản gốc nếu đang ở tầng cold (file không thuộc kho thì bỏ qua)"""
+        blob = StorageService.get_blob_by_path(file_path)
+        if not blob:
+            return True
+        if blob.storage_tier == 'cold':
+            return TieringService.rehydrate(blob)
+
+        # Video vừa được xem lại chưa nên chuyển đi ngay; chỉ ghi tối đa một lần mỗi ngày
+        now = get_vietnam_time_naive()
+        if blob.last_accessed_at is None or now - blob.last_accessed_at > timedelta(days=1):
+            blob.last_accessed_at = now
+            db.session.commit()
+        return True
+
+    @staticmethod
+    def run_lifecycle(days=None):
+        """Chuyển bản gốc cũ đã chấm sang tầng cold; nếu tầng hot vẫn vượt STORAGE_HOT_MAX_MB thì
+        chuyển tiếp video đã chấm ít được xem nhất (video chưa chấm luôn ở tầng hot).
+
+        Returns:
+            dict: blobs_archived, bytes_archived, bytes_compressed
+        """
+        config = current_app.config
+        if days is None:
+            days = config.get('COLD_ARCHIVE_AFTER_DAYS', 90)
+        now = get_vietnam_time_naive()
+        cutoff = now - timedelta(days=days)
+        stats = {'blobs_archived': 0, 'bytes_archived': 0, 'bytes_compressed': 0}
+
+        def archive(blob):
+            compressed = TieringService.archive_blob(blob)
+            if compressed:
+                stats['blobs_archived'] += 1
+                stats['bytes_archived'] += blob.size_bytes
+                stats['bytes_compressed'] += compressed
+            return compressed
+
+        candidates = TieringService.archive_candidates(cutoff)
+        for blob in candidates.filter(
+            db.or_(StoredBlob.last_accessed_at.is_(None), StoredBlob.last_accessed_at < cutoff)
+        ).all():
+            archive(blob)
+
+        max_mb = config.get('STORAGE_HOT_MAX_MB')
+        if max_mb:
+            hot_bytes = db.session.query(db.func.coalesce(db.func.sum(StoredBlob.size_bytes), 0)).filter(
+                StoredBlob.storage_tier == 'hot'
+            ).scalar()
+            over = hot_bytes - max_mb * 1024 * 1024
+            if over > 0:
+                # Bỏ điều kiện tuổi, giữ điều kiện đã chấm; ít được xem gần đây nhất đi trước
+                candidates = TieringService.archive_candidates(now).order_by(
+                    db.func.coalesce(StoredBlob.last_accessed_at, StoredBlob.created_at)
+                )
+                for blob in candidates.all():
+                    if over <= 0:
+                        break
+                    if archive(blob):
+                        over -= blob.size_bytes
+
+        return stats
+
+    @staticmethod
+    def _remove_file(file_path):
+        try:
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+        except OSError as e:
+            print(f"Error deleting cold file: {e}")
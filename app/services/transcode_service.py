@@ -0,0 +1,114 @@
+from app.models.training_video import TrainingVideo
+from app import db
+from app.services.storage_service import StorageService
+from app.services.tiering_service import TieringService
+from app.utils.transcoder import TranscodePool
+from flask import current_app
+import atexit
+import os
+import shutil
+import threading
+
+_pool_lock = threading.Lock()
+
+
+class TranscodeService:
+    """Chuyển mã video sau upload: HLS 360p/720p cho trình phát và proxy độ phân giải thấp cho AI.
+
+    Chạy như bước đầu của job phân tích (AnalysisQueueService.run_job), trước khi suy luận,
+    nên retry/backoff dùng chung với hàng đợi. Lỗi chuyển mã không làm hỏng job:
+    phân tích và trình phát quay về dùng file gốc.
+    """
+
+    @staticmethod
+    def get_pool():
+        """TranscodePool dùng chung của app (giới hạn số process ffmpeg đồng thời)"""
+        app = current_app._get_current_object()
+        pool = app.extensions.get('transcode_pool')
+        if pool is None:
+            with _pool_lock:
+                pool = app.extensions.get('transcode_pool')
+                if pool is None:
+                    config = app.config
+                    pool = TranscodePool(
+                        workers=config.get('TRANSCODE_WORKERS', 2),
+                        threads=config.get('TRANSCODE_THREADS', 0),
+                        timeout=config.get('TRANSCODE_TIMEOUT'),
+                        ffmpeg_bin=config.get('FFMPEG_BINARY', 'ffmpeg'),
+                        ffprobe_bin=config.get('FFPROBE_BINARY', 'ffprobe')
+                    )
+                    app.extensions['transcode_pool'] = pool
+                    atexit.register(pool.close)
+        return pool
+
+    @staticmethod
+    def output_dir(video_id):
+        folder = current_app.config.get('TRANSCODE_FOLDER', 'instance/media/renditions')
+        return os.path.join(folder, str(video_id))
+
+    @staticmethod
+    def _source_height(video):
+        try:
+            return int(video.resolution.lower().split('x')[1])
+        except (AttributeError, IndexError, ValueError):
+            return None
+
+    @staticmethod
+    def transcode_video(video_id):
+        """Tạo bản HLS + proxy cho video (chờ ffmpeg xong) và lưu đường dẫn vào TrainingVideo"""
+        video = TrainingVideo.query.get(video_id)
+        if not video or video.transcode_status in ('completed', 'skipped'):
+            return video
+
+        # Video trùng nội dung đã chuyển mã: dùng chung bản HLS/proxy
+        if video.content_sha256:
+            previous = TrainingVideo.query.filter(
+                TrainingVideo.content_sha256 == video.content_sha256,
+                TrainingVideo.video_id != video.video_id,
+                TrainingVideo.transcode_status == 'completed'
+            ).first()
+            if previous and previous.proxy_url and os.path.isfile(previous.proxy_url):
+                video.hls_url = previous.hls_url
+                video.proxy_url = previous.proxy_url
+                video.transcode_status = 'completed'
+                db.session.commit()
+                return video
+
+        pool = TranscodeService.get_pool()
+        if not current_app.config.get('TRANSCODE_ENABLED', True) or not pool.available:
+            video.transcode_status = 'skipped'
+            db.session.commit()
+            return video
+
+        video.transcode_status = 'processing'
+        db.session.commit()
+
+        output_dir = TranscodeService.output_dir(video.video_id)
+        shutil.rmtree(output_dir, ignore_errors=True)  # Bỏ kết quả dở của lần chạy trước
+        try:
+            result = pool.submit(
+                StorageService.local_path(video.video_url),
+                output_dir,
+                source_height=TranscodeService._source_height(video),
+                source_fps=float(video.fps) if video.fps else None
+            ).result()
+        except Exception as e:
+            print(f"Error transcoding video {video_id}: {e}")
+            shutil.rmtree(output_dir, ignore_errors=True)
+            video.transcode_status = 'failed'
+            db.session.commit()
+            return video
+
+        video.hls_url = result['hls_path'].replace(os.sep, '/')
+        video.proxy_url = result['proxy_path'].replace(os.sep, '/')
+        video.transcode_status = 'completed'
+        db.session.commit()
+        return video
+
+    @staticmethod
+    def analysis_path(video):
+        """File dùng cho phân tích AI: proxy nếu đã chuyển mã, ngược lại file gốc (tải về nếu ở driver s3)"""
+        if video.proxy_url and os.path.isfile(video.proxy_url):
+            return video.proxy_url
+        TieringService.ensure_hot(video.video_url)
+        return StorageService.local_path(video.video_url)
@@ -0,0 +1,257 @@
+from app.models import db
+from app.models.analytics_rollup import AnalyticsRollup
+from app.models.training_video import TrainingVideo
+from app.models.ai_analysis import AIAnalysisResult
+from app.models.manual_evaluation import ManualEvaluation
+from app.models.assignment import Assignment
+from app.utils.helpers import get_vietnam_time_naive
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+METRICS = ('upload_count', 'evaluation_count', 'score_count', 'score_sum')
+
+
+def _as_date(value):
+    """func.date() trả về chuỗi trên SQLite, date trên MySQL"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def _week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+class TrendRollupService:
+    """Rollup theo ngày/tuần cho biểu đồ xu hướng: số video upload, số lượt chấm và điểm
+    (toàn hệ thống, theo lớp, theo bài võ, theo giảng viên giao bài; lớp tách thêm theo học viên).
+
+    Bộ gom chạy tăng dần: chỉ tính lại những ngày có video/kết quả AI/lượt chấm mới kể từ
+    lần trước (cộng ANALYTICS_ROLLUP_LOOKBACK_SECONDS), rồi cộng các ngày đó lên bucket tuần.
+    Biểu đồ gọi refresh() (bỏ qua nếu vừa chạy trong ANALYTICS_ROLLUP_MAX_AGE giây) rồi chỉ đọc
+    bucket đã tính, nên 365 ngày tốn như 30 ngày. `flask analytics-rollup --rebuild` tính lại toàn bộ.
+    """
+
+    @staticmethod
+    def _video_scopes():
+        """(scope, scope_id, student_id, cần join Assignment) cho số liệu tính theo video"""
+        return (
+            ('system', literal(0), literal(0), False),
+            ('class', Assignment.assigned_to_class, literal(0), True),
+            ('class', Assignment.assigned_to_class, TrainingVideo.student_id, True),
+            ('routine', TrainingVideo.routine_id, literal(0), False),
+            ('instructor', Assignment.assigned_by, literal(0), True),
+        )
+
+    @staticmethod
+    def _in_days(column, days):
+        ranges = [db.and_(column >= datetime.combine(day, datetime.min.time()),
+                          column < datetime.combine(day + timedelta(days=1), datetime.min.time()))
+                  for day in sorted(days)]
+        return db.or_(*ranges)
+
+    @staticmethod
+    def _compute_days(days=None):
+        """Số liệu theo ngày từ bảng gốc (days=None: mọi ngày).
+
+        Returns:
+            dict: (ngày, scope, scope_id, student_id) -> [upload_count, evaluation_count, score_count, score_sum]
+        """
+        totals = {}
+
+        def add(key, index, value):
+            totals.setdefault(key, [0, 0, 0, 0])[index] += value or 0
+
+        # Điểm mỗi video: lượt chấm đầu tiên, chưa chấm thì điểm AI (như get_student_avg_for_class)
+        first_ids = db.session.query(
+            ManualEvaluation.video_id,
+            func.min(ManualEvaluation.evaluation_id).label('evaluation_id')
+        ).join(TrainingVideo, TrainingVideo.video_id == ManualEvaluation.video_id)
+        if days is not None:
+            first_ids = first_ids.filter(TrendRollupService._in_days(TrainingVideo.uploaded_at, days))
+        first_ids = first_ids.group_by(ManualEvaluation.video_id).subquery()
+        first_evaluation = aliased(ManualEvaluation)
+        scored = func.coalesce(first_evaluation.overall_score, AIAnalysisResult.overall_score)
+        upload_day = func.date(TrainingVideo.uploaded_at)
+        evaluation_day = func.date(ManualEvaluation.evaluated_at)
+
+        for scope, scope_id, student_id, needs_assignment in TrendRollupService._video_scopes():
+            videos = db.session.query(
+                upload_day, scope_id, student_id,
+                func.count(TrainingVideo.video_id), func.count(scored), func.sum(scored)
+            ).select_from(TrainingVideo).outerjoin(
+                AIAnalysisResult, AIAnalysisResult.video_id == TrainingVideo.video_id
+            ).outerjoin(
+                first_ids, first_ids.c.video_id == TrainingVideo.video_id
+            ).outerjoin(
+                first_evaluation, first_evaluation.evaluation_id == first_ids.c.evaluation_id
+            )
+            evaluations = db.session.query(
+                evaluation_day, scope_id, student_id, func.count(ManualEvaluation.evaluation_id)
+            ).join(TrainingVideo, TrainingVideo.video_id == ManualEvaluation.video_id)
+
+            if needs_assignment:
+                videos = videos.join(Assignment, Assignment.assignment_id == TrainingVideo.assignment_id).filter(scope_id.isnot(None))
+                evaluations = evaluations.join(Assignment, Assignment.assignment_id == TrainingVideo.assignment_id).filter(scope_id.isnot(None))
+            if days is not None:
+                videos = videos.filter(TrendRollupService._in_days(TrainingVideo.uploaded_at, days))
+                evaluations = evaluations.filter(TrendRollupService._in_days(ManualEvaluation.evaluated_at, days))
+
+            for day, key_id, key_student, uploads, score_count, score_sum in videos.group_by(upload_day, scope_id, student_id).all():
+                key = (_as_date(day), scope, key_id, key_student)
+                add(key, 0, uploads)
+                add(key, 2, score_count)
+                add(key, 3, score_sum)
+            for day, key_id, key_student, count in evaluations.group_by(evaluation_day, scope_id, student_id).all():
+                add((_as_date(day), scope, key_id, key_student), 1, count)
+
+        # Ngày không có hoạt động vẫn có dòng hệ thống (giá trị 0) để updated_at luôn tiến
+        for day in days or ():
+            totals.setdefault((day, 'system', 0, 0), [0, 0, 0, 0])
+        return totals
+
+    @staticmethod
+    def _write(bucket_type, totals, now):
+        for (day, scope, scope_id, student_id), values in totals.items():
+            row = AnalyticsRollup(bucket_type=bucket_type, bucket_start=day, scope=scope, scope_id=scope_id,
+                                  student_id=student_id, updated_at=now)
+            for name, value in zip(METRICS, values):
+                setattr(row, name, value)
+            db.session.add(row)
+
+    @staticmethod
+    def _rollup_weeks(week_starts, now):
+        """Tính lại bucket tuần từ bucket ngày (các số liệu đều cộng được)"""
+        if not week_starts:
+            return
+        week_days = [start + timedelta(days=i) for start in week_starts for i in range(7)]
+        AnalyticsRollup.query.filter(
+            AnalyticsRollup.bucket_type == 'week',
+            AnalyticsRollup.bucket_start.in_(week_starts)
+        ).delete(synchronize_session='fetch')
+
+        totals = {}
+        for row in AnalyticsRollup.query.filter(
+            AnalyticsRollup.bucket_type == 'day',
+            AnalyticsRollup.bucket_start.in_(week_days)
+        ).all():
+            values = totals.setdefault((_week_start(row.bucket_start), row.scope, row.scope_id, row.student_id), [0, 0, 0, 0])
+            for i, name in enumerate(METRICS):
+                values[i] += getattr(row, name)
+        TrendRollupService._write('week', totals, now)
+
+    @staticmethod
+    def _commit():
+        """Commit không expire các object khác trong session: biểu đồ gọi refresh() giữa request,
+        sau khi trang đã nạp User/Class, expire sẽ khiến mỗi object bị query lại"""
+        session = db.session()
+        expire_on_commit = session.expire_on_commit
+        session.expire_on_commit = False
+        try:
+            session.commit()
+        finally:
+            session.expire_on_commit = expire_on_commit
+
+    @staticmethod
+    def refresh_days(days):
+        """Tính lại bucket ngày (và tuần chứa chúng) cho các ngày chỉ định.
+
+        Returns:
+            int: số ngày đã tính lại
+        """
+        days = {_as_date(day) for day in days if day is not None}
+        if not days:
+            return 0
+
+        now = get_vietnam_time_naive()
+        try:
+            AnalyticsRollup.query.filter(
+                AnalyticsRollup.bucket_type == 'day',
+                AnalyticsRollup.bucket_start.in_(days)
+            ).delete(synchronize_session='fetch')
+            TrendRollupService._write('day', TrendRollupService._compute_days(days), now)
+            db.session.flush()
+            TrendRollupService._rollup_weeks({_week_start(day) for day in days}, now)
+            TrendRollupService._commit()
+        except IntegrityError:
+            # Request khác đang tính cùng các ngày này
+            db.session.rollback()
+            return 0
+        return len(days)
+
+    @staticmethod
+    def _changed_days(since):
+        """Ngày có số liệu thay đổi kể từ since: ngày upload/chấm mới và ngày upload của video vừa có điểm"""
+        upload_day = func.date(TrainingVideo.uploaded_at)
+        queries = (
+            db.session.query(upload_day).filter(TrainingVideo.uploaded_at >= since),
+            db.session.query(func.date(ManualEvaluation.evaluated_at)).filter(ManualEvaluation.evaluated_at >= since),
+            db.session.query(upload_day).join(
+                ManualEvaluation, ManualEvaluation.video_id == TrainingVideo.video_id
+            ).filter(ManualEvaluation.evaluated_at >= since),
+            db.session.query(upload_day).join(
+                AIAnalysisResult, AIAnalysisResult.video_id == TrainingVideo.video_id
+            ).filter(AIAnalysisResult.analyzed_at >= since),
+        )
+        return {_as_date(day) for query in queries for (day,) in query.distinct().all()}
+
+    @staticmethod
+    def refresh(force=False):
+        """Bộ gom tăng dần; bỏ qua nếu lần chạy gần nhất chưa quá ANALYTICS_ROLLUP_MAX_AGE giây.
+
+        Returns:
+            int: số ngày đã tính lại
+        """
+        config = current_app.config
+        now = get_vietnam_time_naive()
+        last = db.session.query(func.max(AnalyticsRollup.updated_at)).scalar()
+        if last is None:
+            return TrendRollupService.rebuild()
+        if not force and (now - last).total_seconds() < config.get('ANALYTICS_ROLLUP_MAX_AGE', 300):
+            return 0
+
+        since = last - timedelta(seconds=config.get('ANALYTICS_ROLLUP_LOOKBACK_SECONDS', 600))
+        return TrendRollupService.refresh_days(TrendRollupService._changed_days(since) | {now.date()})
+
+    @staticmethod
+    def rebuild():
+        """Xóa và tính lại toàn bộ rollup từ bảng gốc.
+
+        Returns:
+            int: số ngày có số liệu
+        """
+        now = get_vietnam_time_naive()
+        AnalyticsRollup.query.delete(synchronize_session=False)
+        totals = TrendRollupService._compute_days()
+        totals.setdefault((now.date(), 'system', 0, 0), [0, 0, 0, 0])
+        TrendRollupService._write('day', totals, now)
+        db.session.flush()
+        days = {key[0] for key in totals}
+        TrendRollupService._rollup_weeks({_week_start(day) for day in days}, now)
+        TrendRollupService._commit()
+        return len(days)
+
+    @staticmethod
+    def get_buckets(bucket_type, scope, scope_id=0, start=None, end=None, student_id=0):
+        """Các bucket đã tính của một scope, theo thời gian tăng dần.
+
+        Args:
+            student_id: 0 = cả scope; None = mọi học viên (chỉ scope 'class')
+        """
+        query = AnalyticsRollup.query.filter(
+            AnalyticsRollup.bucket_type == bucket_type,
+            AnalyticsRollup.scope == scope,
+            AnalyticsRollup.scope_id == scope_id
+        )
+        if student_id is not None:
+            query = query.filter(AnalyticsRollup.student_id == student_id)
+        if start is not None:
+            query = query.filter(AnalyticsRollup.bucket_start >= start)
+        if end is not None:
+            query = query.filter(AnalyticsRollup.bucket_start <= end)
+        return query.order_by(AnalyticsRollup.bucket_start, AnalyticsRollup.student_id).all()
@@ -0,0 +1,258 @@
+from app.models import db
+from app.models.upload_session import UploadSession
+from app.utils.helpers import get_vietnam_time_naive
+from datetime import timedelta
+from flask import current_app
+from werkzeug.utils import secure_filename
+import hashlib
+import os
+import uuid
+
+
+class UploadService:
+    """Upload video theo chunk, có thể resume.
+
+    Chunk được ghi nối thẳng vào file đích (không spool qua file tạm của Werkzeug),
+    offset hiện tại luôn lấy từ kích thước file trên đĩa nên client chỉ cần hỏi
+    lại trạng thái rồi gửi tiếp từ offset đó khi mất kết nối. Kiểm tra offset và ghi
+    chunk nằm trong khóa dòng UploadSession (SELECT ... FOR UPDATE), nên một request
+    gửi lại chunk chạy song song với request gốc không ghi nối hai lần.
+    """
+
+    COPY_BUFFER_SIZE = 1024 * 1024  # 1MB
+
+    # Thư mục đích theo mục đích upload (tương đối với UPLOAD_FOLDER)
+    PURPOSE_FOLDERS = {
+        'training': 'videos',
+        'exam': 'videos',
+        'exam_reference': 'exam_videos',
+    }
+    # Định dạng được nhận theo mục đích: cùng danh sách với form nhận file sau khi upload xong
+    PURPOSE_EXTENSIONS = {
+        'training': 'ALLOWED_VIDEO_EXTENSIONS',
+        'exam': 'ALLOWED_EXAM_VIDEO_EXTENSIONS',
+        'exam_reference': 'ALLOWED_VIDEO_EXTENSIONS',
+    }
+
+    @staticmethod
+    def init_upload(user_id, filename, total_size, purpose='training', expected_sha256=None):
+        """Tạo phiên upload mới và file đích rỗng"""
+        if purpose not in UploadService.PURPOSE_FOLDERS:
+            return {'success': False, 'message': 'Mục đích upload không hợp lệ'}
+
+        filename = secure_filename(filename or '')
+        ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        allowed = current_app.config[UploadService.PURPOSE_EXTENSIONS[purpose]]
+        if ext not in allowed:
+            return {'success': False, 'message': f"Định dạng không hợp lệ (chỉ chấp nhận {', '.join(sorted(allowed)).upper()})"}
+
+        max_size = current_app.config.get('MAX_VIDEO_SIZE', 500 * 1024 * 1024)
+        if not total_size or total_size <= 0:
+            return {'success': False, 'message': 'Kích thước file không hợp lệ'}
+        if total_size > max_size:
+            return {'success': False, 'message': f'File quá lớn (tối đa {max_size // (1024 * 1024)}MB)'}
+
+        if expected_sha256:
+            expected_sha256 = UploadService._normalize_sha256(expected_sha256)
+            if not expected_sha256:
+                return {'success': False, 'message': 'Checksum SHA-256 không hợp lệ'}
+
+        upload_folder = os.path.join(
+            current_app.config.get('UPLOAD_FOLDER', 'instance/media'),
+            UploadService.PURPOSE_FOLDERS[purpose]
+        )
+        os.makedirs(upload_folder, exist_ok=True)
+
+        upload_id = uuid.uuid4().hex
+        file_path = os.path.join(upload_folder, f"{upload_id}.{ext}")
+        open(file_path, 'wb').close()
+
+        now = get_vietnam_time_naive()
+        upload = UploadSession(
+            upload_id=upload_id,
+            user_id=user_id,
+            purpose=purpose,
+            original_filename=filename,
+            file_path=file_path,
+            total_size=total_size,
+            received_bytes=0,
+            expected_sha256=expected_sha256 or None,
+            upload_status='uploading',
+            created_at=now,
+            updated_at=now
+        )
+        db.session.add(upload)
+        db.session.commit()
+        return {'success': True, 'upload': upload}
+
+    @staticmethod
+    def get_upload(upload_id, user_id):
+        return UploadSession.query.filter_by(upload_id=upload_id, user_id=user_id).first()
+
+    @staticmethod
+    def _lock_upload(upload_id, user_id):
+        """Phiên upload kèm khóa dòng đến hết transaction (commit/rollback)"""
+        return UploadSession.query.filter_by(upload_id=upload_id, user_id=user_id).with_for_update().first()
+
+    @staticmethod
+    def _normalize_sha256(value):
+        value = (value or '').strip().lower()
+        if len(value) != 64 or any(c not in '0123456789abcdef' for c in value):
+            return None
+        return value
+
+    @staticmethod
+    def _fail(result):
+        """Trả lỗi và nhả khóa dòng"""
+        db.session.rollback()
+        return result
+
+    @staticmethod
+    def current_offset(upload):
+        """Offset thật trên đĩa (nguồn sự thật khi resume)"""
+        try:
+            return os.path.getsize(upload.file_path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def append_chunk(upload_id, user_id, offset, stream, length, chunk_sha256=None):
+        """Ghi nối một chunk từ stream vào file đích.
+
+        Trả về offset mới. Nếu offset client gửi lệch với file trên đĩa, trả về
+        offset đúng để client gửi lại từ đó.
+        """
+        upload = UploadService._lock_upload(upload_id, user_id)
+        if not upload:
+            return UploadService._fail({'success': False, 'message': 'Không tìm thấy phiên upload', 'status': 404})
+        if upload.upload_status != 'uploading':
+            return UploadService._fail({'success': False, 'message': 'Phiên upload đã kết thúc', 'status': 409})
+
+        current = UploadService.current_offset(upload)
+        if offset != current:
+            return UploadService._fail({'success': False, 'message': 'Offset không khớp', 'status': 409, 'offset': current})
+
+        max_chunk = current_app.config.get('UPLOAD_CHUNK_MAX_SIZE', 16 * 1024 * 1024)
+        if length is None or length <= 0 or length > max_chunk:
+            return UploadService._fail({'success': False, 'message': 'Kích thước chunk không hợp lệ', 'status': 400, 'offset': current})
+        if offset + length > upload.total_size:
+            return UploadService._fail({'success': False, 'message': 'Chunk vượt quá kích thước file', 'status': 400, 'offset': current})
+
+        hasher = hashlib.sha256() if chunk_sha256 else None
+        written = 0
+        with open(upload.file_path, 'ab') as f:
+            try:
+                while written < length:
+                    block = stream.read(min(UploadService.COPY_BUFFER_SIZE, length - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    if hasher:
+                        hasher.update(block)
+                    written += len(block)
+            finally:
+                f.flush()
+
+            # Chunk hỏng (checksum sai hoặc thiếu byte): cắt bỏ, client gửi lại chunk này
+            corrupted = hasher is not None and (written != length or hasher.hexdigest() != chunk_sha256.lower())
+            if corrupted:
+                f.truncate(offset)
+
+        if corrupted:
+            return UploadService._fail({'success': False, 'message': 'Checksum chunk không khớp', 'status': 400, 'offset': offset})
+
+        upload.received_bytes = offset + written
+        upload.updated_at = get_vietnam_time_naive()
+        db.session.commit()
+        return {'success': True, 'upload': upload, 'offset': upload.received_bytes}
+
+    @staticmethod
+    def finalize_upload(upload_id, user_id, sha256=None):
+        """Kiểm tra đủ byte và checksum toàn file.
+
+        Checksum bắt buộc: client gửi lúc init (expected_sha256) hoặc lúc finalize (sha256).
+        """
+        upload = UploadService._lock_upload(upload_id, user_id)
+        if not upload:
+            return UploadService._fail({'success': False, 'message': 'Không tìm thấy phiên upload', 'status': 404})
+        if upload.upload_status == 'completed':
+            db.session.commit()
+            return {'success': True, 'upload': upload}
+        if upload.upload_status != 'uploading':
+            return UploadService._fail({'success': False, 'message': 'Phiên upload đã kết thúc', 'status': 409})
+
+        expected = upload.expected_sha256
+        if sha256:
+            expected = UploadService._normalize_sha256(sha256)
+            if not expected:
+                return UploadService._fail({'success': False, 'message': 'Checksum SHA-256 không hợp lệ', 'status': 400})
+            if upload.expected_sha256 and expected != upload.expected_sha256:
+                return UploadService._fail({'success': False, 'message': 'Checksum không khớp với lúc khởi tạo', 'status': 400})
+        if not expected:
+            return UploadService._fail({'success': False, 'message': 'Thiếu checksum SHA-256 của file', 'status': 400})
+
+        current = UploadService.current_offset(upload)
+        if current != upload.total_size:
+            return UploadService._fail({'success': False, 'message': 'Chưa nhận đủ dữ liệu', 'status': 409, 'offset': current})
+
+        digest = UploadService.file_sha256(upload.file_path)
+        if digest != expected:
+            upload.upload_status = 'failed'
+            upload.updated_at = get_vietnam_time_naive()
+            db.session.commit()
+            UploadService._remove_file(upload.file_path)
+            return {'success': False, 'message': 'Checksum file không khớp, vui lòng upload lại', 'status': 422}
+
+        now = get_vietnam_time_naive()
+        upload.checksum_sha256 = digest
+        upload.received_bytes = current
+        upload.upload_status = 'completed'
+        upload.updated_at = now
+        upload.completed_at = now
+        db.session.commit()
+        return {'success': True, 'upload': upload}
+
+    @staticmethod
+    def consume_upload(upload_id, user_id, purpose):
+        """Dùng file đã upload xong cho một bản ghi (video/exam). Mỗi upload chỉ dùng được một lần."""
+        upload = UploadService.get_upload(upload_id, user_id)
+        if not upload or upload.purpose != purpose:
+            return {'success': False, 'message': 'Không tìm thấy file đã upload'}
+        if upload.upload_status != 'completed':
+            return {'success': False, 'message': 'File chưa upload xong'}
+
+        upload.upload_status = 'consumed'
+        upload.updated_at = get_vietnam_time_naive()
+        return {'success': True, 'upload': upload, 'file_path': upload.file_path}
+
+    @staticmethod
+    def file_sha256(file_path):
+        hasher = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(UploadService.COPY_BUFFER_SIZE), b''):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def cleanup_stale_uploads(max_age_hours=None):
+        """Xóa các phiên upload dang dở quá hạn cùng file của chúng"""
+        if max_age_hours is None:
+            max_age_hours = current_app.config.get('UPLOAD_SESSION_TTL_HOURS', 24)
+        cutoff = get_vietnam_time_naive() - timedelta(hours=max_age_hours)
+        stale = UploadSession.query.filter(
+            UploadSession.upload_status.in_(['uploading', 'completed', 'failed']),
+            UploadSession.updated_at < cutoff
+        ).all()
+        for upload in stale:
+            UploadService._remove_file(upload.file_path)
+            db.session.delete(upload)
+        db.session.commit()
+        return len(stale)
+
+    @staticmethod
+    def _remove_file(file_path):
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except OSError as e:
+            print(f"Error deleting upload file: {e}")
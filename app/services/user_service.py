@@ -1,14 +1,25 @@
 from app.models import db
 from app.models.user import User
 from app.models.role import Role
+from app.utils.cache import cached
+from app.utils.loader_profiles import loader_options
+from app.utils.pagination import keyset_paginate
 from datetime import datetime, timedelta
 from sqlalchemy import func
 
 class UserService:
     
     @staticmethod
-    def get_all_users():
-        return User.query.all()
+    def get_all_users(profile=None, after=None, before=None, per_page=None):
+        """Một trang người dùng, mới tạo trước (KeysetPage)"""
+        query = User.query.options(*loader_options(profile))
+        return keyset_paginate(query, User.created_at, User.user_id, after, before, per_page)
+    
+    @staticmethod
+    @cached(tags=('users',))
+    def count_all_users():
+        """Tổng số người dùng (kể cả tài khoản bị khóa)"""
+        return db.session.query(func.count(User.user_id)).scalar()
     
     @staticmethod
     def get_user_by_id(user_id):
@@ -81,11 +92,13 @@ class UserService:
         return {'success': True}
     
     @staticmethod
+    @cached(tags=('users',))
     def get_total_users_count():
         """Get total number of users"""
         return User.query.filter(User.is_active == True).count()
     
     @staticmethod
+    @cached(tags=('users',))
     def get_users_count_by_role(role_code):
         """Get count of users by role code"""
         return db.session.query(User).join(Role).filter(
@@ -102,6 +115,7 @@ class UserService:
         ).order_by(User.created_at.desc()).limit(limit).all()
     
     @staticmethod
+    @cached(tags=('users',))
     def get_user_stats_by_role():
         """Get user statistics grouped by role"""
         stats = db.session.query(
@@ -115,6 +129,7 @@ class UserService:
         return {stat.role_code: {'name': stat.role_name, 'count': stat.count} for stat in stats}
     
     @staticmethod
+    @cached(tags=('users',))
     def get_user_growth_percentage(days=30):
         """Get user growth percentage compared to previous period"""
         try:
@@ -2,20 +2,21 @@ from app.models.training_video import TrainingVideo
 from app.models.ai_analysis import AIAnalysisResult
 from app import db
 from app.utils.helpers import get_vietnam_time
+from app.utils.video_probe import probe_video
+from app.utils.loader_profiles import loader_options
+from app.utils.pagination import keyset_paginate
 from datetime import datetime
+from flask import current_app
 import uuid
 from werkzeug.utils import secure_filename
 import os
-import random
 import time
-import cv2
 import json
 
 class VideoService:
     
     @staticmethod
-    def get_student_videos(student_id, routine_id=None, status=None):
-        """Lấy danh sách video của học viên"""
+    def _student_videos_query(student_id, routine_id=None, status=None):
         query = TrainingVideo.query.filter_by(student_id=student_id)
         
         if routine_id:
@@ -24,61 +25,108 @@ class VideoService:
         if status:
             query = query.filter_by(processing_status=status)
         
-        return query.order_by(TrainingVideo.uploaded_at.desc()).all()
+        return query
+    
+    @staticmethod
+    def get_student_videos(student_id, routine_id=None, status=None, profile=None, after=None, before=None, per_page=None):
+        """Lấy một trang video của học viên, mới nhất trước (profile: tên loader profile của trang danh sách)
+        
+        Returns:
+            KeysetPage: duyệt như list; next_cursor/prev_cursor cho trang sau/trước
+        """
+        query = VideoService._student_videos_query(student_id, routine_id, status).options(*loader_options(profile))
+        return keyset_paginate(query, TrainingVideo.uploaded_at, TrainingVideo.video_id, after, before, per_page)
+    
+    @staticmethod
+    def count_student_videos(student_id, routine_id=None, status=None):
+        """Tổng số video của học viên theo cùng bộ lọc"""
+        return VideoService._student_videos_query(student_id, routine_id, status).count()
     
     @staticmethod
     def save_video(file, student_id, routine_id, assignment_id=None, notes=None):
         """Lưu video và metadata"""
+        from app.services.storage_service import StorageService
+        
         try:
-            # Tạo tên file ngẫu nhiên, giữ nguyên phần mở rộng
+            # Giữ nguyên phần mở rộng; file được băm trong lúc ghi và lưu theo nội dung
             filename = secure_filename(file.filename)
             ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'mp4'
-            unique_filename = f"{uuid.uuid4().hex}.{ext}"
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            
-            # Tạo đường dẫn lưu trữ
-            upload_folder = os.path.join('static', 'uploads', 'videos')
-            os.makedirs(upload_folder, exist_ok=True)
-            
-            filepath = os.path.join(upload_folder, unique_filename)
             try:
-                file.save(filepath)
+                blob = StorageService.save_stream(file.stream, ext)
             except Exception as e:
                 # Avoid non-ASCII in error message to prevent codec issues on some consoles
                 raise Exception(f"Save file error: {repr(e)}")
             
-            # Trích xuất metadata từ video (fallback to simple method if cv2 fails)
-            try:
-                metadata = VideoService.extract_video_metadata(filepath)
-                thumbnail_path = VideoService.generate_thumbnail(filepath)
-            except:
-                # Fallback to simple metadata extraction
-                file_size_bytes = os.path.getsize(filepath)
-                file_size_mb = round(file_size_bytes / (1024 * 1024), 2)
+        except Exception as e:
+            raise Exception(f"Lỗi khi lưu video: {str(e)}")
+        
+        return VideoService.register_video(blob.file_path, student_id, routine_id, assignment_id, notes, digest=blob.sha256)
+    
+    @staticmethod
+    def save_uploaded_video(upload_id, student_id, routine_id, assignment_id=None, notes=None, purpose='training'):
+        """Tạo video từ file đã upload theo chunk (file đã nằm sẵn ở thư mục videos)"""
+        from app.services.upload_service import UploadService
+        
+        consumed = UploadService.consume_upload(upload_id, student_id, purpose)
+        if not consumed['success']:
+            raise Exception(consumed['message'])
+        
+        return VideoService.register_video(consumed['file_path'], student_id, routine_id, assignment_id, notes,
+                                           digest=consumed['upload'].checksum_sha256)
+    
+    @staticmethod
+    def register_video(filepath, student_id, routine_id, assignment_id=None, notes=None, digest=None):
+        """Đưa file vào kho (gộp nội dung trùng), trích xuất metadata và lưu bản ghi video"""
+        from app.services.storage_service import StorageService
+        from app.services.score_summary_service import ScoreSummaryService
+        
+        try:
+            blob = StorageService.store_file(filepath, digest)
+            
+            # Cùng nội dung đã có video trước đó: dùng lại metadata + thumbnail, không probe lại
+            previous = TrainingVideo.query.filter_by(content_sha256=blob.sha256).order_by(TrainingVideo.video_id).first()
+            if previous:
                 metadata = {
-                    'duration_seconds': random.randint(30, 180),
-                    'file_size_mb': file_size_mb,
-                    'resolution': '1920x1080',
-                    'fps': 30
+                    'duration_seconds': previous.duration_seconds,
+                    'file_size_mb': previous.file_size_mb,
+                    'resolution': previous.resolution,
+                    'fps': previous.fps,
+                    'codec': previous.codec,
+                    'thumbnail_path': previous.thumbnail_url,
                 }
-                thumbnail_path = None
+            else:
+                # Probe video một lần: metadata + thumbnail (fallback nếu cv2 không đọc được)
+                thumb_folder = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'instance/media'), 'thumbnails')
+                metadata = probe_video(StorageService.local_path(blob.file_path), thumbnail_folder=thumb_folder,
+                                       ffprobe_bin=current_app.config.get('FFPROBE_BINARY', 'ffprobe'))
+            # Điểm timing dùng độ dài video: không đọc được thì từ chối, không ghi giá trị đoán
+            # (blob chưa được tham chiếu, collect_garbage sẽ dọn)
+            if not metadata:
+                raise Exception('Không đọc được file video')
+            if metadata['duration_seconds'] <= 0:
+                raise Exception('Không xác định được thời lượng video')
             
             # Lưu vào database
             video = TrainingVideo(
                 student_id=student_id,
                 routine_id=routine_id,
                 assignment_id=assignment_id,
-                video_url=filepath,
-                thumbnail_url=thumbnail_path,
+                video_url=blob.file_path,
+                content_sha256=blob.sha256,
+                thumbnail_url=metadata.get('thumbnail_path'),
                 file_size_mb=metadata['file_size_mb'],
                 duration_seconds=metadata['duration_seconds'],
                 resolution=metadata['resolution'],
+                fps=metadata.get('fps') or None,
+                codec=metadata.get('codec'),
                 upload_status='completed',
                 processing_status='pending',
                 uploaded_at=get_vietnam_time()
             )
             
+            ScoreSummaryService.record_video(video)
             db.session.add(video)
+            StorageService.acquire(blob)
             db.session.commit()
             
             # Goals feature removed: no-op
@@ -89,70 +137,6 @@ class VideoService:
             db.session.rollback()
             raise Exception(f"Lỗi khi lưu video: {str(e)}")
     
-    @staticmethod
-    def extract_video_metadata(filepath):
-        """Trích xuất metadata từ video"""
-        try:
-            cap = cv2.VideoCapture(filepath)
-            
-            # Lấy thông tin video
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            duration = int(frame_count / fps) if fps > 0 else 0
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            
-            cap.release()
-            
-            # Lấy kích thước file
-            file_size_bytes = os.path.getsize(filepath)
-            file_size_mb = round(file_size_bytes / (1024 * 1024), 2)
-            
-            return {
-                'duration_seconds': duration,
-                'file_size_mb': file_size_mb,
-                'resolution': f"{width}x{height}",
-                'fps': fps
-            }
-        except:
-            # Fallback nếu không đọc được video
-            file_size_mb = round(os.path.getsize(filepath) / (1024 * 1024), 2)
-            return {
-                'duration_seconds': 60,  # Default
-                'file_size_mb': file_size_mb,
-                'resolution': '1920x1080',
-                'fps': 30
-            }
-    
-    @staticmethod
-    def generate_thumbnail(video_path):
-        """Tạo thumbnail từ video"""
-        try:
-            cap = cv2.VideoCapture(video_path)
-            
-            # Lấy frame đầu tiên
-            ret, frame = cap.read()
-            cap.release()
-            
-            if ret:
-                # Tạo đường dẫn thumbnail
-                thumb_folder = os.path.join('static', 'uploads', 'thumbnails')
-                os.makedirs(thumb_folder, exist_ok=True)
-                # Tạo tên thumbnail ngẫu nhiên
-                thumb_filename = f"{uuid.uuid4().hex}.jpg"
-                thumb_path = os.path.join(thumb_folder, thumb_filename)
-                
-                # Lưu thumbnail
-                try:
-                    cv2.imwrite(thumb_path, frame)
-                except Exception as _e:
-                    return None
-                return thumb_path
-            
-            return None
-        except:
-            return None
-    
     @staticmethod
     def get_video_by_id(video_id):
         """Lấy video theo ID"""
@@ -0,0 +1,317 @@
+"""Cache cho các hàm thống kê (AnalyticsService, ClassService.get_statistics, UserService).
+
+Ba tầng: trong request (flask.g) -> trong process (TTL + LRU) -> tầng chia sẻ (Redis khi đặt
+CACHE_REDIS_URL; không đặt thì bảng cache_tag_versions trong database, chỉ giữ phiên bản tag).
+
+Mỗi hàm khai báo các tag nó phụ thuộc, vd 'student:{student_id}'. Khi session commit bản ghi
+thuộc model tương ứng (video, điểm, ghi danh, lớp, user...), các tag bị đổi phiên bản nên mọi
+entry cũ tự hết hiệu lực ở mọi tầng; TTL chỉ là giới hạn trên. Phiên bản tag nằm ở tầng chia
+sẻ nên mọi process (worker gunicorn, `flask analysis-worker`) thấy ngay thay đổi của nhau.
+Trong một request mỗi tag chỉ được đọc phiên bản một lần.
+
+Giá trị cache phải là dữ liệu thuần (dict/list/số), không phải object ORM.
+"""
+from flask import current_app, g, has_app_context, has_request_context
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+import functools
+import inspect
+import pickle
+import threading
+import time
+
+_MISS = object()
+
+
+class LocalCache:
+    """TTL + LRU trong bộ nhớ process"""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (hết hạn lúc, giá trị)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISS
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return _MISS
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DatabaseSharedStore:
+    """Tầng chia sẻ khi không có Redis: phiên bản tag ở bảng cache_tag_versions, giá trị chỉ cache trong process.
+
+    Dùng kết nối riêng (không qua db.session): bump chạy trong after_commit, lúc session không được
+    chạy SQL nữa, và đọc phiên bản không bị giữ trong snapshot transaction của request.
+    """
+
+    remote = False
+
+    @staticmethod
+    def _table():
+        from app.models.cache_tag_version import CacheTagVersion
+        return CacheTagVersion.__table__
+
+    @staticmethod
+    def _engine():
+        from app.models import db
+        return db.engine
+
+    def versions(self, tags):
+        if not tags:
+            return []
+        table = self._table()
+        with self._engine().connect() as conn:
+            known = dict(conn.execute(select(table.c.tag, table.c.version).where(table.c.tag.in_(tags))).all())
+        return [known.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        table = self._table()
+        with self._engine().begin() as conn:
+            known = set(conn.execute(select(table.c.tag).where(table.c.tag.in_(tags))).scalars())
+            conn.execute(update(table).where(table.c.tag.in_(tags)).values(version=table.c.version + 1))
+            for tag in tags:
+                if tag in known:
+                    continue
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(table).values(tag=tag, version=1))
+                except IntegrityError:
+                    # Process khác vừa tạo tag: tăng phiên bản của dòng đó
+                    conn.execute(update(table).where(table.c.tag == tag).values(version=table.c.version + 1))
+
+    def get(self, key):
+        return _MISS
+
+    def set(self, key, value, ttl):
+        pass
+
+
+class RedisSharedStore:
+    """Tầng chia sẻ trên Redis: phiên bản tag (INCR) và giá trị (pickle, SETEX)"""
+
+    remote = True
+
+    def __init__(self, url, prefix='wrts:cache:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('CACHE_REDIS_URL cần thư viện redis (pip install redis)') from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def versions(self, tags):
+        values = self.client.mget([f"{self.prefix}v:{tag}" for tag in tags]) if tags else []
+        return [int(value) if value is not None else 0 for value in values]
+
+    def bump(self, tags):
+        pipe = self.client.pipeline(transaction=False)
+        for tag in tags:
+            pipe.incr(f"{self.prefix}v:{tag}")
+        pipe.execute()
+
+    def get(self, key):
+        data = self.client.get(self.prefix + key)
+        return _MISS if data is None else pickle.loads(data)
+
+    def set(self, key, value, ttl):
+        self.client.setex(self.prefix + key, int(ttl), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class AnalyticsCache:
+    """Gắn vào app bằng AnalyticsCache.init_app(app) (create_app gọi sẵn)"""
+
+    _installed = False
+
+    def __init__(self, config):
+        self.default_ttl = config.get('CACHE_DEFAULT_TTL', 300)
+        self.local = LocalCache(config.get('CACHE_MAX_ENTRIES', 2048))
+        redis_url = config.get('CACHE_REDIS_URL')
+        self.shared = RedisSharedStore(redis_url) if redis_url else DatabaseSharedStore()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def init_app(app):
+        if not app.config.get('CACHE_ENABLED', True):
+            return
+        app.extensions['analytics_cache'] = AnalyticsCache(app.config)
+
+        if not AnalyticsCache._installed:
+            event.listen(Session, 'after_flush', AnalyticsCache._after_flush)
+            event.listen(Session, 'after_commit', AnalyticsCache._after_commit)
+            event.listen(Session, 'after_soft_rollback', AnalyticsCache._after_soft_rollback)
+            AnalyticsCache._installed = True
+
+    @staticmethod
+    def current():
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('analytics_cache')
+
+    def get_or_compute(self, name, func, arguments, tags, ttl):
+        arg_key = repr(sorted(arguments.items()))
+        request_cache = g.setdefault('analytics_cache', {}) if has_request_context() else None
+        if request_cache is not None and (name, arg_key) in request_cache:
+            return request_cache[(name, arg_key)]
+
+        tag_names = [tag.format(**arguments) for tag in tags]
+        try:
+            versions = self._tag_versions(tag_names)
+        except Exception as e:
+            # Không đọc được phiên bản tag thì không biết entry nào còn đúng: tính trực tiếp
+            print(f"Error reading cache versions: {e}")
+            return func(**arguments)
+        key = f"{name}:{arg_key}:{'.'.join(map(str, versions))}"
+
+        value = self.local.get(key)
+        if value is _MISS and self.shared.remote:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                print(f"Error reading shared cache: {e}")
+            if value is not _MISS:
+                self.local.set(key, value, ttl or self.default_ttl)
+
+        if value is _MISS:
+            self.misses += 1
+            value = func(**arguments)
+            self.local.set(key, value, ttl or self.default_ttl)
+            if self.shared.remote:
+                try:
+                    self.shared.set(key, value, ttl or self.default_ttl)
+                except Exception as e:
+                    print(f"Error writing shared cache: {e}")
+        else:
+            self.hits += 1
+
+        if request_cache is not None:
+            request_cache[(name, arg_key)] = value
+        return value
+
+    def _tag_versions(self, tags):
+        """Phiên bản các tag; trong một request mỗi tag chỉ đọc từ tầng chia sẻ một lần"""
+        known = g.setdefault('analytics_cache_versions', {}) if has_request_context() else {}
+        missing = [tag for tag in dict.fromkeys(tags) if tag not in known]
+        if missing:
+            known.update(zip(missing, self.shared.versions(missing)))
+        return [known[tag] for tag in tags]
+
+    def invalidate(self, *tags):
+        """Đổi phiên bản các tag: mọi entry phụ thuộc chúng hết hiệu lực"""
+        if tags:
+            try:
+                self.shared.bump(sorted(set(tags)))
+            except Exception as e:
+                # Không đổi được phiên bản ở tầng chia sẻ: xóa tầng process để ít nhất process này không trả dữ liệu cũ
+                print(f"Error invalidating shared cache: {e}")
+                self.local.clear()
+        if has_request_context():
+            g.pop('analytics_cache', None)
+            g.pop('analytics_cache_versions', None)
+
+    # ============ DOMAIN EVENTS (session SQLAlchemy) ============
+
+    @staticmethod
+    def _video_student(session, video_id):
+        from app.models.training_video import TrainingVideo
+        video = session.identity_map.get(Session.identity_key(TrainingVideo, video_id))
+        if video is not None:
+            return video.student_id
+        return session.connection().execute(
+            select(TrainingVideo.__table__.c.student_id).where(TrainingVideo.__table__.c.video_id == video_id)
+        ).scalar()
+
+    @staticmethod
+    def _tags_for(session, obj):
+        """Tag bị ảnh hưởng khi bản ghi obj được thêm/sửa/xóa"""
+        from app.models import (User, Class, ClassEnrollment, TrainingVideo, AIAnalysisResult, ManualEvaluation,
+                                Assignment, Exam, ExamResult, MartialRoutine)
+
+        if isinstance(obj, TrainingVideo):
+            return {'scores', f'student:{obj.student_id}'}
+        if isinstance(obj, (AIAnalysisResult, ManualEvaluation)):
+            return {'scores', f'student:{AnalyticsCache._video_student(session, obj.video_id)}'}
+        if isinstance(obj, ClassEnrollment):
+            return {'enrollments', f'student:{obj.student_id}', f'class:{obj.class_id}'}
+        if isinstance(obj, Class):
+            return {'classes', f'class:{obj.class_id}'}
+        if isinstance(obj, User):
+            return {'users'}
+        if isinstance(obj, Assignment):
+            return {'assignments', f'class:{obj.assigned_to_class}'}
+        if isinstance(obj, Exam):
+            return {'exams'}
+        if isinstance(obj, ExamResult):
+            return {f'student:{obj.student_id}'}
+        if isinstance(obj, MartialRoutine):
+            return {'routines'}
+        return set()
+
+    @staticmethod
+    def _after_flush(session, flush_context):
+        from app.models import TrainingVideo
+
+        tags = session.info.setdefault('analytics_cache_tags', set())
+        for obj in list(session.new) + list(session.deleted):
+            tags |= AnalyticsCache._tags_for(session, obj)
+        for obj in session.dirty:
+            # Trạng thái xử lý video đổi liên tục nhưng không ảnh hưởng số liệu
+            if not isinstance(obj, TrainingVideo) and session.is_modified(obj):
+                tags |= AnalyticsCache._tags_for(session, obj)
+
+    @staticmethod
+    def _after_commit(session):
+        tags = session.info.pop('analytics_cache_tags', None)
+        cache = AnalyticsCache.current()
+        if tags and cache is not None:
+            cache.invalidate(*tags)
+
+    @staticmethod
+    def _after_soft_rollback(session, previous_transaction):
+        if not previous_transaction.nested:
+            session.info.pop('analytics_cache_tags', None)
+
+
+def cached(tags=(), ttl=None, name=None):
+    """Cache kết quả hàm thống kê theo tham số; tags là chuỗi format theo tên tham số, vd 'student:{student_id}'.
+
+    Đặt dưới @staticmethod. Gọi hàm gốc (bỏ qua cache) bằng .uncached.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        cache_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = AnalyticsCache.current()
+            if cache is None:
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return cache.get_or_compute(cache_name, func, dict(bound.arguments), tags, ttl)
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,79 @@
+"""Bộ loader options đặt tên cho các trang danh sách.
+
+Trang danh sách chọn profile khớp với những quan hệ template dùng, service gắn options vào
+query (TrainingVideo.query.options(*loader_options('submission_list'))). Quan hệ many-to-one
+dùng joinedload (cùng câu SQL), quan hệ một-nhiều dùng selectinload (một câu IN cho cả trang),
+nên số query của trang không đổi theo số dòng. Thêm quan hệ vào template thì thêm vào profile,
+nếu không profiler SQL sẽ báo N+1 / vượt SQL_QUERY_BUDGETS.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+
+
+def _video_history():
+    from app.models.training_video import TrainingVideo
+    # Lịch sử video của học viên: tên/mã bài võ, điểm AI
+    return (
+        joinedload(TrainingVideo.routine),
+        selectinload(TrainingVideo.ai_analysis),
+    )
+
+
+def _submission_list():
+    from app.models.training_video import TrainingVideo
+    # Bài nộp của giảng viên: học viên, bài võ, điểm AI, lượt chấm (cả thống kê đầu trang)
+    return (
+        joinedload(TrainingVideo.student),
+        joinedload(TrainingVideo.routine),
+        selectinload(TrainingVideo.ai_analysis),
+        selectinload(TrainingVideo.manual_evaluations),
+    )
+
+
+def _user_list():
+    from app.models.user import User
+    return (joinedload(User.role),)
+
+
+def _feedback_list():
+    from app.models.feedback import Feedback
+    return (joinedload(Feedback.user),)
+
+
+def _class_list():
+    from app.models.class_model import Class
+    return (joinedload(Class.instructor),)
+
+
+def _assignment_list():
+    from app.models.assignment import Assignment
+    # Bài võ + đối tượng được giao (học viên hoặc lớp)
+    return (
+        joinedload(Assignment.routine),
+        joinedload(Assignment.student),
+        joinedload(Assignment.class_obj),
+    )
+
+
+def _exam_result_list():
+    from app.models.exam_result import ExamResult
+    return (joinedload(ExamResult.student),)
+
+
+LOADER_PROFILES = {
+    'video_history': _video_history,
+    'submission_list': _submission_list,
+    'user_list': _user_list,
+    'feedback_list': _feedback_list,
+    'class_list': _class_list,
+    'assignment_list': _assignment_list,
+    'exam_result_list': _exam_result_list,
+}
+
+
+def loader_options(profile):
+    """Options của profile (None: không nạp sẵn gì, giữ lazy load như cũ)"""
+    if profile is None:
+        return ()
+    if profile not in LOADER_PROFILES:
+        raise ValueError(f"Không có loader profile '{profile}'")
+    return LOADER_PROFILES[profile]()
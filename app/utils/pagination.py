@@ -0,0 +1,111 @@
+"""Phân trang keyset (cursor) cho các trang danh sách.
+
+Không dùng OFFSET (database phải đọc rồi bỏ mọi dòng trước trang cần xem, trang càng sau càng chậm):
+trang kế tiếp lọc theo (cột sắp xếp, khóa chính) của dòng cuối trang trước rồi LIMIT, nên với index
+trên cột sắp xếp mọi trang tốn như nhau dù bảng có bao nhiêu dòng. Danh sách luôn mới nhất trước.
+
+Cursor là chuỗi base64 của [giá trị cột sắp xếp, khóa chính], truyền qua query string
+?after=... (trang sau) hoặc ?before=... (trang trước). Cursor sai/hết hạn thì quay về trang đầu.
+"""
+from flask import current_app, request
+from sqlalchemy import and_, or_
+from datetime import datetime
+import base64
+import binascii
+import json
+
+MAX_PAGE_SIZE = 200
+
+
+class KeysetPage:
+    """Một trang kết quả; duyệt/len/bool như list các dòng của trang"""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def encode_cursor(sort_value, key):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, key], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(giá trị cột sắp xếp, khóa chính) hoặc None nếu cursor không hợp lệ"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, key = json.loads(raw)
+        return datetime.fromisoformat(sort_value), int(key)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+def cursor_args():
+    """after/before của request hiện tại, truyền thẳng vào hàm service: Service.get_x(**cursor_args())"""
+    return {
+        'after': request.args.get('after') or None,
+        'before': request.args.get('before') or None,
+    }
+
+
+def keyset_paginate(query, sort_column, key_column, after=None, before=None, per_page=None):
+    """Một trang của query (chưa order_by), mới nhất trước theo (sort_column, key_column).
+
+    Args:
+        after: cursor dòng cuối trang đang xem -> trang sau
+        before: cursor dòng đầu trang đang xem -> trang trước
+        per_page: số dòng mỗi trang (mặc định LIST_PAGE_SIZE)
+    """
+    per_page = min(max(per_page or current_app.config.get('LIST_PAGE_SIZE', 50), 1), MAX_PAGE_SIZE)
+    after, before = decode_cursor(after), decode_cursor(before)
+
+    if before is not None:
+        # Đi ngược: lấy các dòng mới hơn dòng đầu trang, gần nhất trước, rồi đảo lại
+        sort_value, key = before
+        query = query.filter(or_(sort_column > sort_value, and_(sort_column == sort_value, key_column > key)))
+        rows = query.order_by(sort_column.asc(), key_column.asc()).limit(per_page + 1).all()
+        has_prev, has_next = len(rows) > per_page, True
+        rows = rows[:per_page][::-1]
+    else:
+        if after is not None:
+            sort_value, key = after
+            query = query.filter(or_(sort_column < sort_value, and_(sort_column == sort_value, key_column < key)))
+        rows = query.order_by(sort_column.desc(), key_column.desc()).limit(per_page + 1).all()
+        has_prev, has_next = after is not None, len(rows) > per_page
+        rows = rows[:per_page]
+
+    if not rows:
+        return KeysetPage(rows, per_page)
+
+    def cursor(row):
+        return encode_cursor(getattr(row, sort_column.key), getattr(row, key_column.key))
+
+    return KeysetPage(
+        rows, per_page,
+        next_cursor=cursor(rows[-1]) if has_next else None,
+        prev_cursor=cursor(rows[0]) if has_prev else None,
+    )
+
@@ -0,0 +1,186 @@
+"""Profiler SQL theo request (chế độ debug): gom câu SQL cùng dạng, phát hiện N+1, kiểm tra ngân sách query.
+
+Bật khi app chạy debug hoặc SQL_PROFILER_ENABLED. Mỗi request có câu SELECT cùng dạng lặp lại
+từ SQL_PROFILER_N1_THRESHOLD lần trở lên (thường là lazy load hoặc query trong vòng lặp) được
+in ra console và ghi một dòng JSON vào SQL_PROFILER_REPORT, kèm dòng code/template phát sinh.
+
+Ngân sách: SQL_QUERY_BUDGET (mọi endpoint) hoặc SQL_QUERY_BUDGETS {'endpoint': số query}.
+Khi SQL_PROFILER_FAIL_ON_BUDGET bật (nên bật khi TESTING), request vượt ngân sách raise
+QueryBudgetExceeded để test thất bại.
+"""
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import Counter
+import json
+import os
+import re
+import sys
+import time
+
+_WHITESPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))+\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Request chạy nhiều câu SQL hơn ngân sách cho phép"""
+
+
+def statement_shape(statement):
+    """Dạng chuẩn hóa của câu SQL: bỏ khác biệt về hằng số, danh sách IN và khoảng trắng"""
+    shape = _STRING.sub('?', statement)
+    shape = _NUMBER.sub('?', shape)
+    shape = _IN_LIST.sub('(?+)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class _RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.shapes = {}  # shape -> {'count', 'seconds', 'origins': Counter}
+
+    def record(self, statement, seconds, origin):
+        self.queries += 1
+        self.query_seconds += seconds
+        entry = self.shapes.get(statement)
+        if entry is None:
+            entry = self.shapes[statement] = {'count': 0, 'seconds': 0.0, 'origins': Counter()}
+        entry['count'] += 1
+        entry['seconds'] += seconds
+        entry['origins'][origin] += 1
+
+
+class SQLProfiler:
+    """Gắn vào app bằng SQLProfiler.init_app(app) (create_app gọi sẵn)"""
+
+    _installed = False
+    _project_root = None
+
+    @staticmethod
+    def init_app(app):
+        SQLProfiler._project_root = os.path.dirname(app.root_path) + os.sep
+        app.before_request(SQLProfiler._before_request)
+        app.after_request(SQLProfiler._after_request)
+
+        if not SQLProfiler._installed:
+            event.listen(Engine, 'before_cursor_execute', SQLProfiler._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', SQLProfiler._after_cursor_execute)
+            SQLProfiler._installed = True
+
+    @staticmethod
+    def enabled(app):
+        return app.debug or app.config.get('SQL_PROFILER_ENABLED', False)
+
+    @staticmethod
+    def _before_request():
+        if SQLProfiler.enabled(current_app) and request.endpoint != 'static':
+            g.sql_profile = _RequestProfile()
+
+    @staticmethod
+    def _active_profile():
+        if not has_request_context():
+            return None
+        return g.get('sql_profile')
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if SQLProfiler._active_profile() is not None:
+            conn.info.setdefault('profiler_query_start', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = SQLProfiler._active_profile()
+        starts = conn.info.get('profiler_query_start')
+        if profile is None or not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        profile.record(statement_shape(statement), elapsed, SQLProfiler._origin())
+
+    @staticmethod
+    def _origin():
+        """Dòng code (hoặc template) của project gần nhất trên stack đã phát sinh câu SQL"""
+        root = SQLProfiler._project_root
+        frame = sys._getframe(2)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(root) and 'site-packages' not in filename and filename != __file__:
+                return f"{os.path.relpath(filename, root)}:{frame.f_lineno} ({frame.f_code.co_name})"
+            frame = frame.f_back
+        return 'unknown'
+
+    @staticmethod
+    def _budget(endpoint):
+        config = current_app.config
+        budgets = config.get('SQL_QUERY_BUDGETS') or {}
+        return budgets.get(endpoint, config.get('SQL_QUERY_BUDGET'))
+
+    @staticmethod
+    def build_report(profile, endpoint, threshold):
+        """Tóm tắt profile của một request: tổng query, nhóm nghi N+1 (kèm nơi phát sinh)"""
+        suspects = []
+        for shape, entry in sorted(profile.shapes.items(), key=lambda item: item[1]['count'], reverse=True):
+            if entry['count'] < threshold or not shape.upper().startswith('SELECT'):
+                continue
+            suspects.append({
+                'statement': shape[:500],
+                'count': entry['count'],
+                'seconds': round(entry['seconds'], 6),
+                'origins': [f"{origin} x{count}" for origin, count in entry['origins'].most_common(3)],
+            })
+
+        return {
+            'endpoint': endpoint,
+            'path': request.full_path.rstrip('?'),
+            'method': request.method,
+            'duration_seconds': round(time.perf_counter() - profile.started, 6),
+            'queries': profile.queries,
+            'query_seconds': round(profile.query_seconds, 6),
+            'distinct_statements': len(profile.shapes),
+            'n_plus_one': suspects,
+        }
+
+    @staticmethod
+    def _after_request(response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+
+        config = current_app.config
+        endpoint = request.endpoint or 'unmatched'
+        report = SQLProfiler.build_report(profile, endpoint, config.get('SQL_PROFILER_N1_THRESHOLD', 5))
+        budget = SQLProfiler._budget(endpoint)
+        report['budget'] = budget
+        over_budget = budget is not None and profile.queries > budget
+
+        response.headers['X-SQL-Queries'] = str(profile.queries)
+        if report['n_plus_one'] or over_budget:
+            print(f"[SQL] {report['method']} {report['path']} ({endpoint}): {profile.queries} query, "
+                  f"{profile.query_seconds * 1000:.1f}ms" + (f" > ngân sách {budget}" if over_budget else ''))
+            for suspect in report['n_plus_one']:
+                print(f"[SQL]   N+1 x{suspect['count']}: {suspect['statement'][:120]}")
+                for origin in suspect['origins']:
+                    print(f"[SQL]       tại {origin}")
+            SQLProfiler._write_report(report)
+
+        if over_budget and config.get('SQL_PROFILER_FAIL_ON_BUDGET', False):
+            raise QueryBudgetExceeded(
+                f"{endpoint} chạy {profile.queries} query (ngân sách {budget}); "
+                f"N+1: {[s['origins'][0] for s in report['n_plus_one']]}"
+            )
+        return response
+
+    @staticmethod
+    def _write_report(report):
+        path = current_app.config.get('SQL_PROFILER_REPORT')
+        if not path:
+            return
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(report, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"Error writing SQL profile: {e}")
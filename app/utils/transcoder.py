@@ -0,0 +1,144 @@
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# Các bản HLS cho trình phát (không upscale: bỏ bản cao hơn video gốc)
+RENDITIONS = (
+    {'name': '360p', 'height': 360, 'video_bitrate': 800, 'audio_bitrate': 96},
+    {'name': '720p', 'height': 720, 'video_bitrate': 2800, 'audio_bitrate': 128},
+)
+HLS_SEGMENT_SECONDS = 4
+MASTER_PLAYLIST = 'master.m3u8'
+PROXY_FILENAME = 'proxy.mp4'
+# Bản proxy cho AI: pose/silhouette/weapon đều thu nhỏ về < 320px nên 360p là đủ;
+# keyframe mỗi giây để read_at() seek rẻ
+PROXY_HEIGHT = 360
+PROXY_MAX_FPS = 30
+
+
+class TranscodeError(RuntimeError):
+    pass
+
+
+def ffmpeg_available(ffmpeg_bin='ffmpeg'):
+    return shutil.which(ffmpeg_bin) is not None
+
+
+def has_audio(video_path, ffprobe_bin='ffprobe'):
+    """Video có track âm thanh không (không có ffprobe thì coi như không)"""
+    if not shutil.which(ffprobe_bin):
+        return False
+    result = subprocess.run(
+        [ffprobe_bin, '-v', 'error', '-select_streams', 'a', '-show_entries', 'stream=index', '-of', 'csv=p=0', video_path],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=60
+    )
+    return result.returncode == 0 and bool(result.stdout.strip())
+
+
+def select_renditions(source_height):
+    """Các bản HLS không cao hơn video gốc; video nhỏ hơn 360p vẫn có một bản ở độ phân giải gốc"""
+    selected = [r for r in RENDITIONS if not source_height or r['height'] <= source_height]
+    if not selected:
+        height = source_height - source_height % 2
+        selected = [dict(RENDITIONS[0], name=f"{height}p", height=height)]
+    return selected
+
+
+def build_command(video_path, output_dir, renditions, source_fps=None, audio=False, threads=0, ffmpeg_bin='ffmpeg'):
+    """Lệnh ffmpeg decode video gốc một lần và ghi ra cả các bản HLS lẫn proxy cho AI"""
+    count = len(renditions)
+    splits = ''.join(f"[v{i}]" for i in range(count))
+    filters = [f"[0:v]split={count + 1}{splits}[vproxy]"]
+    for i, rendition in enumerate(renditions):
+        filters.append(f"[v{i}]scale=w=-2:h={rendition['height']}[out{i}]")
+    proxy_filter = f"scale=w=-2:h='min({PROXY_HEIGHT},ih)'"
+    if source_fps and source_fps > PROXY_MAX_FPS:
+        proxy_filter = f"fps={PROXY_MAX_FPS}," + proxy_filter
+    filters.append(f"[vproxy]{proxy_filter}[proxy]")
+    thread_args = ['-threads', str(threads)] if threads else []
+
+    cmd = [ffmpeg_bin, '-hide_banner', '-nostdin', '-y', '-loglevel', 'error',
+           '-i', video_path, '-filter_complex', ';'.join(filters)]
+
+    # Output 1: HLS nhiều bitrate, segment cắt đúng keyframe
+    stream_map = []
+    for i, rendition in enumerate(renditions):
+        bitrate = rendition['video_bitrate']
+        cmd += ['-map', f"[out{i}]",
+                f"-b:v:{i}", f"{bitrate}k", f"-maxrate:v:{i}", f"{int(bitrate * 1.07)}k", f"-bufsize:v:{i}", f"{bitrate * 2}k"]
+        entry = f"v:{i}"
+        if audio:
+            cmd += ['-map', '0:a:0', f"-b:a:{i}", f"{rendition['audio_bitrate']}k"]
+            entry += f",a:{i}"
+        stream_map.append(f"{entry},name:{rendition['name']}")
+    cmd += thread_args
+    cmd += ['-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main', '-pix_fmt', 'yuv420p',
+            '-force_key_frames', f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})", '-sc_threshold', '0']
+    if audio:
+        cmd += ['-c:a', 'aac', '-ac', '2']
+    cmd += ['-f', 'hls', '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+            '-hls_segment_filename', os.path.join(output_dir, '%v', 'seg_%05d.ts'),
+            '-master_pl_name', MASTER_PLAYLIST, '-var_stream_map', ' '.join(stream_map),
+            os.path.join(output_dir, '%v', 'index.m3u8')]
+
+    # Output 2: proxy không tiếng cho phân tích
+    cmd += ['-map', '[proxy]', '-an'] + thread_args
+    cmd += ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '26', '-pix_fmt', 'yuv420p',
+            '-force_key_frames', 'expr:gte(t,n_forced*1)', '-movflags', '+faststart',
+            os.path.join(output_dir, PROXY_FILENAME)]
+    return cmd
+
+
+def transcode(video_path, output_dir, source_height=None, source_fps=None, threads=0, timeout=None, ffmpeg_bin='ffmpeg', ffprobe_bin='ffprobe'):
+    """Tạo HLS + proxy trong output_dir.
+
+    Returns:
+        dict: hls_path (master playlist), proxy_path, renditions (tên các bản)
+    """
+    renditions = select_renditions(source_height)
+    for rendition in renditions:
+        os.makedirs(os.path.join(output_dir, rendition['name']), exist_ok=True)
+
+    cmd = build_command(video_path, output_dir, renditions, source_fps=source_fps,
+                        audio=has_audio(video_path, ffprobe_bin),
+                        threads=threads, ffmpeg_bin=ffmpeg_bin)
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise TranscodeError(f"ffmpeg timed out after {timeout}s")
+    if result.returncode != 0:
+        raise TranscodeError(result.stderr.decode('utf-8', 'replace')[-2000:] or f"ffmpeg exited with {result.returncode}")
+
+    return {
+        'hls_path': os.path.join(output_dir, MASTER_PLAYLIST),
+        'proxy_path': os.path.join(output_dir, PROXY_FILENAME),
+        'renditions': [r['name'] for r in renditions],
+    }
+
+
+class TranscodePool:
+    """Giới hạn số process ffmpeg chạy đồng thời; mỗi job là một subprocess ffmpeg
+    do một thread của pool chờ (thread chỉ đợi I/O, phần nặng nằm trong ffmpeg)"""
+
+    def __init__(self, workers=2, threads=0, timeout=None, ffmpeg_bin='ffmpeg', ffprobe_bin='ffprobe'):
+        self.threads = threads
+        self.timeout = timeout
+        self.ffmpeg_bin = ffmpeg_bin
+        self.ffprobe_bin = ffprobe_bin
+        self._executor = ThreadPoolExecutor(max_workers=max(int(workers), 1), thread_name_prefix='transcode')
+
+    @property
+    def available(self):
+        return ffmpeg_available(self.ffmpeg_bin)
+
+    def submit(self, video_path, output_dir, source_height=None, source_fps=None):
+        """Đưa video vào hàng đợi, trả về Future của transcode()"""
+        return self._executor.submit(
+            transcode, video_path, output_dir, source_height, source_fps,
+            threads=self.threads, timeout=self.timeout,
+            ffmpeg_bin=self.ffmpeg_bin, ffprobe_bin=self.ffprobe_bin
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,7 @@
+from wtforms.validators import Regexp
+import re
+
+
+def http_url(message='Chỉ chấp nhận link http:// hoặc https://'):
+    """Link video ngoài (YouTube, Vimeo...): không nhận đường dẫn file trên server"""
+    return Regexp(r'^https?://[^\s/]+\S*$', flags=re.IGNORECASE, message=message)
@@ -0,0 +1,145 @@
+import os
+import shutil
+import subprocess
+import time
+import uuid
+import cv2
+
+# Vị trí (tỷ lệ độ dài video) thử lấy thumbnail; bỏ đầu/cuối vì hay là frame đen
+THUMBNAIL_CANDIDATES = (0.1, 0.25, 0.4, 0.55, 0.7)
+THUMBNAIL_MAX_WIDTH = 640
+MIN_BRIGHTNESS = 20  # Frame tối hơn mức này coi như frame đen
+# Video GOP dài (quay màn hình...) làm mỗi lần seek phải decode lại từ keyframe xa;
+# dừng thử thêm vị trí khi đã vượt ngân sách thời gian này
+THUMBNAIL_TIME_BUDGET = 0.5
+
+
+def _fourcc_to_codec(fourcc):
+    """Chuyển CAP_PROP_FOURCC (số) sang chuỗi codec, ví dụ 'avc1'"""
+    code = int(fourcc)
+    if code <= 0:
+        return None
+    chars = [chr((code >> (8 * i)) & 0xFF) for i in range(4)]
+    codec = ''.join(chars).strip('\x00 ').lower()
+    return codec if codec.isprintable() and codec else None
+
+
+def _frame_quality(frame):
+    """Độ nét (phương sai Laplacian) trên ảnh thu nhỏ, 0 nếu frame quá tối"""
+    small = cv2.resize(frame, (160, int(160 * frame.shape[0] / frame.shape[1])), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    if gray.mean() < MIN_BRIGHTNESS:
+        return 0.0
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def _pick_thumbnail_frame(cap, frame_count):
+    """Seek tới một số vị trí (decoder nhảy về keyframe gần nhất) và chọn frame nét nhất"""
+    best_frame, best_score = None, -1.0
+    if frame_count > 0:
+        started = time.monotonic()
+        for ratio in THUMBNAIL_CANDIDATES:
+            if best_frame is not None and time.monotonic() - started > THUMBNAIL_TIME_BUDGET:
+                break
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_count * ratio))
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                continue
+            score = _frame_quality(frame)
+            if score > best_score:
+                best_frame, best_score = frame, score
+
+    if best_frame is None:
+        # Container không cho seek / không biết số frame: lấy frame đầu tiên đọc được
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        ret, frame = cap.read()
+        best_frame = frame if ret else None
+    return best_frame
+
+
+def _save_thumbnail(frame, thumbnail_folder):
+    height, width = frame.shape[:2]
+    if width > THUMBNAIL_MAX_WIDTH:
+        frame = cv2.resize(frame, (THUMBNAIL_MAX_WIDTH, int(height * THUMBNAIL_MAX_WIDTH / width)), interpolation=cv2.INTER_AREA)
+
+    os.makedirs(thumbnail_folder, exist_ok=True)
+    thumb_path = os.path.join(thumbnail_folder, f"{uuid.uuid4().hex}.jpg")
+    if not cv2.imwrite(thumb_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 85]):
+        return None
+    return thumb_path
+
+
+def _ffprobe_duration(filepath, ffprobe_bin):
+    """Độ dài (giây) theo ffprobe: đọc header container/stream, đúng cả với webm/mkv không ghi số frame"""
+    if not ffprobe_bin or not shutil.which(ffprobe_bin):
+        return 0.0
+    try:
+        result = subprocess.run(
+            [ffprobe_bin, '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', filepath],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=60
+        )
+        return float(result.stdout.strip() or 0) if result.returncode == 0 else 0.0
+    except (subprocess.SubprocessError, ValueError, OSError):
+        return 0.0
+
+
+def _count_frames(cap):
+    """Đếm frame bằng grab() (không chuyển màu) khi container không ghi CAP_PROP_FRAME_COUNT"""
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    count = 0
+    while cap.grab():
+        count += 1
+    return count
+
+
+def _whole_seconds(seconds):
+    """Làm tròn độ dài; clip ngắn hơn 1 giây vẫn là 1 giây (0 nghĩa là không xác định)"""
+    return max(1, int(round(seconds))) if seconds > 0 else 0
+
+
+def probe_video(filepath, thumbnail_folder=None, ffprobe_bin='ffprobe'):
+    """Mở video một lần duy nhất, trả về metadata (+ thumbnail nếu có thumbnail_folder).
+
+    Returns:
+        dict: duration_seconds, fps, width, height, resolution, codec, frame_count,
+              file_size_mb, thumbnail_path; hoặc None nếu không đọc được video.
+              duration_seconds = 0 nếu cả số frame, ffprobe lẫn đếm frame đều không cho kết quả.
+    """
+    cap = cv2.VideoCapture(filepath)
+    try:
+        if not cap.isOpened():
+            return None
+
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        codec = _fourcc_to_codec(cap.get(cv2.CAP_PROP_FOURCC))
+        duration = _whole_seconds(frame_count / fps) if fps > 0 and frame_count > 0 else 0
+
+        if not duration:
+            # Container không ghi số frame (vd: webm): hỏi ffprobe, không có thì đếm frame
+            duration = _whole_seconds(_ffprobe_duration(filepath, ffprobe_bin))
+        if not duration and fps > 0:
+            frame_count = _count_frames(cap)
+            duration = _whole_seconds(frame_count / fps)
+
+        thumbnail_path = None
+        if thumbnail_folder:
+            frame = _pick_thumbnail_frame(cap, frame_count)
+            if frame is not None:
+                thumbnail_path = _save_thumbnail(frame, thumbnail_folder)
+    finally:
+        cap.release()
+
+    return {
+        'duration_seconds': duration,
+        'fps': round(float(fps), 2),
+        'width': width,
+        'height': height,
+        'resolution': f"{width}x{height}",
+        'codec': codec,
+        'frame_count': frame_count,
+        'file_size_mb': round(os.path.getsize(filepath) / (1024 * 1024), 2),
+        'thumbnail_path': thumbnail_path,
+    }
@@ -0,0 +1,28 @@
+/**
+ * Phát bản HLS (360p/720p) của video nếu đã chuyển mã.
+ *
+ * Dùng cho <video data-hls-src="<master.m3u8>">; thẻ <source> bên trong là file gốc,
+ * được giữ lại khi trình duyệt không phát được HLS (không có hls.js / MSE).
+ */
+(function () {
+    'use strict';
+
+    function attach(video) {
+        const src = video.dataset.hlsSrc;
+        if (!src) {
+            return;
+        }
+        if (video.canPlayType('application/vnd.apple.mpegurl')) {
+            // Safari / iOS phát HLS trực tiếp
+            video.src = src;
+        } else if (window.Hls && window.Hls.isSupported()) {
+            const hls = new window.Hls({ capLevelToPlayerSize: true });
+            hls.loadSource(src);
+            hls.attachMedia(video);
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('video[data-hls-src]').forEach(attach);
+    });
+})();
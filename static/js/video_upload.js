@@ -0,0 +1,292 @@
+/**
+ * Upload video theo chunk, có thể resume (API /uploads).
+ *
+ * Dùng cho form có thuộc tính data-chunked-upload="<purpose>" và
+ * data-file-input="<tên input file>". Khi submit: file được gửi từng chunk
+ * thẳng vào file đích trên server, sau đó form chỉ gửi upload_id.
+ */
+(function () {
+    'use strict';
+
+    const MAX_RETRIES = 5;
+
+    function csrfToken(form) {
+        const input = form.querySelector('input[name="csrf_token"]');
+        return input ? input.value : '';
+    }
+
+    function resumeKey(file, purpose) {
+        return ['chunked-upload', purpose, file.name, file.size, file.lastModified].join(':');
+    }
+
+    // SHA-256 tăng dần cho cả file: WebCrypto chỉ băm được một buffer trọn vẹn,
+    // không đọc cả file vào bộ nhớ nên băm dần theo từng chunk đã gửi
+    const SHA256_K = new Uint32Array([
+        0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+        0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+        0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+        0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+        0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+        0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+        0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+        0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2
+    ]);
+
+    function Sha256() {
+        this.state = new Uint32Array([
+            0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19
+        ]);
+        this.words = new Uint32Array(64);
+        this.pending = new Uint8Array(64);
+        this.pendingLength = 0;
+        this.length = 0;
+    }
+
+    Sha256.prototype._block = function (bytes, start) {
+        const w = this.words;
+        const s = this.state;
+        for (let t = 0; t < 16; t++) {
+            const i = start + t * 4;
+            w[t] = (bytes[i] << 24) | (bytes[i + 1] << 16) | (bytes[i + 2] << 8) | bytes[i + 3];
+        }
+        for (let t = 16; t < 64; t++) {
+            const a = w[t - 15], b = w[t - 2];
+            const s0 = ((a >>> 7) | (a << 25)) ^ ((a >>> 18) | (a << 14)) ^ (a >>> 3);
+            const s1 = ((b >>> 17) | (b << 15)) ^ ((b >>> 19) | (b << 13)) ^ (b >>> 10);
+            w[t] = (w[t - 16] + s0 + w[t - 7] + s1) | 0;
+        }
+        let a = s[0], b = s[1], c = s[2], d = s[3], e = s[4], f = s[5], g = s[6], h = s[7];
+        for (let t = 0; t < 64; t++) {
+            const S1 = ((e >>> 6) | (e << 26)) ^ ((e >>> 11) | (e << 21)) ^ ((e >>> 25) | (e << 7));
+            const t1 = (h + S1 + ((e & f) ^ (~e & g)) + SHA256_K[t] + w[t]) | 0;
+            const S0 = ((a >>> 2) | (a << 30)) ^ ((a >>> 13) | (a << 19)) ^ ((a >>> 22) | (a << 10));
+            const t2 = (S0 + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+            h = g; g = f; f = e; e = (d + t1) | 0;
+            d = c; c = b; b = a; a = (t1 + t2) | 0;
+        }
+        s[0] += a; s[1] += b; s[2] += c; s[3] += d; s[4] += e; s[5] += f; s[6] += g; s[7] += h;
+    };
+
+    Sha256.prototype.update = function (buffer) {
+        const bytes = new Uint8Array(buffer);
+        let i = 0;
+        this.length += bytes.length;
+        if (this.pendingLength) {
+            const take = Math.min(64 - this.pendingLength, bytes.length);
+            this.pending.set(bytes.subarray(0, take), this.pendingLength);
+            this.pendingLength += take;
+            i = take;
+            if (this.pendingLength < 64) {
+                return this;
+            }
+            this._block(this.pending, 0);
+            this.pendingLength = 0;
+        }
+        for (; i + 64 <= bytes.length; i += 64) {
+            this._block(bytes, i);
+        }
+        this.pending.set(bytes.subarray(i), 0);
+        this.pendingLength = bytes.length - i;
+        return this;
+    };
+
+    Sha256.prototype.hex = function () {
+        const bits = this.length * 8;
+        const tail = new Uint8Array(this.pendingLength < 56 ? 64 : 128);
+        tail.set(this.pending.subarray(0, this.pendingLength));
+        tail[this.pendingLength] = 0x80;
+        const view = new DataView(tail.buffer);
+        view.setUint32(tail.length - 8, Math.floor(bits / 0x100000000));
+        view.setUint32(tail.length - 4, bits >>> 0);
+        for (let i = 0; i < tail.length; i += 64) {
+            this._block(tail, i);
+        }
+        return Array.from(this.state).map(x => x.toString(16).padStart(8, '0')).join('');
+    };
+
+    async function sha256Hex(buffer) {
+        if (!window.crypto || !window.crypto.subtle) {
+            return null;
+        }
+        const digest = await window.crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async function requestJson(url, options) {
+        const response = await fetch(url, Object.assign({ credentials: 'same-origin' }, options));
+        let body = {};
+        try {
+            body = await response.json();
+        } catch (e) {
+            body = { message: 'Phản hồi không hợp lệ từ máy chủ' };
+        }
+        return { ok: response.ok, status: response.status, body: body };
+    }
+
+    async function initOrResume(file, purpose, token) {
+        const key = resumeKey(file, purpose);
+        const savedId = window.localStorage.getItem(key);
+        if (savedId) {
+            const status = await requestJson('/uploads/' + savedId, { method: 'GET' });
+            if (status.ok && (status.body.status === 'uploading' || status.body.status === 'completed')) {
+                return status.body;
+            }
+            window.localStorage.removeItem(key);
+        }
+
+        const created = await requestJson('/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'X-CSRFToken': token },
+            body: JSON.stringify({ filename: file.name, size: file.size, purpose: purpose })
+        });
+        if (!created.ok) {
+            throw new Error(created.body.message || 'Không thể khởi tạo upload');
+        }
+        window.localStorage.setItem(key, created.body.upload_id);
+        return created.body;
+    }
+
+    async function uploadFile(file, purpose, token, onProgress) {
+        const session = await initOrResume(file, purpose, token);
+        const uploadId = session.upload_id;
+        const chunkSize = session.chunk_size || 8 * 1024 * 1024;
+        let offset = session.offset || 0;
+        let retries = 0;
+
+        // Checksum toàn file gửi lúc finalize; resume thì băm lại phần đã gửi trước đó
+        const fileHash = new Sha256();
+        let hashed = 0;
+        async function hashUpTo(end) {
+            while (hashed < end) {
+                const next = Math.min(hashed + chunkSize, end);
+                fileHash.update(await file.slice(hashed, next).arrayBuffer());
+                hashed = next;
+            }
+        }
+
+        while (session.status !== 'completed' && offset < file.size) {
+            const end = Math.min(offset + chunkSize, file.size);
+            const chunk = await file.slice(offset, end).arrayBuffer();
+            const headers = {
+                'Content-Type': 'application/octet-stream',
+                'Content-Range': 'bytes ' + offset + '-' + (end - 1) + '/' + file.size,
+                'X-CSRFToken': token
+            };
+            const digest = await sha256Hex(chunk);
+            if (digest) {
+                headers['X-Chunk-SHA256'] = digest;
+            }
+
+            let result;
+            try {
+                result = await requestJson('/uploads/' + uploadId, { method: 'PUT', headers: headers, body: chunk });
+            } catch (e) {
+                result = { ok: false, status: 0, body: {} };
+            }
+
+            if (result.ok) {
+                if (offset === hashed && result.body.offset === end) {
+                    fileHash.update(chunk);
+                    hashed = end;
+                }
+                offset = result.body.offset;
+                retries = 0;
+                onProgress(offset / file.size);
+                continue;
+            }
+            if (typeof result.body.offset === 'number') {
+                // Server báo offset thật, gửi tiếp từ đó
+                offset = result.body.offset;
+            }
+            retries += 1;
+            if (retries > MAX_RETRIES || result.status === 403 || result.status === 404) {
+                throw new Error(result.body.message || 'Upload bị gián đoạn, vui lòng thử lại');
+            }
+            await sleep(1000 * Math.pow(2, retries - 1));
+        }
+
+        await hashUpTo(file.size);
+        const finalized = await requestJson('/uploads/' + uploadId + '/finalize', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'X-CSRFToken': token },
+            body: JSON.stringify({ sha256: fileHash.hex() })
+        });
+        if (!finalized.ok) {
+            if (finalized.status === 422) {
+                window.localStorage.removeItem(resumeKey(file, purpose));
+            }
+            throw new Error(finalized.body.message || 'Không thể hoàn tất upload');
+        }
+        window.localStorage.removeItem(resumeKey(file, purpose));
+        onProgress(1);
+        return uploadId;
+    }
+
+    function progressElement(form) {
+        let bar = form.querySelector('.chunked-upload-progress');
+        if (!bar) {
+            bar = document.createElement('div');
+            bar.className = 'progress mb-3 chunked-upload-progress';
+            bar.innerHTML = '<div class="progress-bar progress-bar-striped progress-bar-animated" role="progressbar" style="width: 0%">0%</div>';
+            const submit = form.querySelector('[type="submit"]');
+            (submit ? submit.parentNode : form).insertAdjacentElement('beforebegin', bar);
+        }
+        return bar.querySelector('.progress-bar');
+    }
+
+    function bindForm(form) {
+        const purpose = form.dataset.chunkedUpload;
+        const fileInput = form.querySelector('input[type="file"][name="' + form.dataset.fileInput + '"]');
+        if (!purpose || !fileInput || !window.fetch || !window.Blob || !Blob.prototype.arrayBuffer) {
+            return;  // Trình duyệt cũ: giữ upload form thông thường
+        }
+
+        form.addEventListener('submit', async function (e) {
+            // Bỏ qua khi submit đã bị hủy, chưa chọn file hoặc ô file đang bị ẩn
+            if (e.defaultPrevented || !fileInput.files || !fileInput.files.length || fileInput.offsetParent === null) {
+                return;
+            }
+            e.preventDefault();
+
+            const submit = form.querySelector('[type="submit"]');
+            if (submit) {
+                submit.disabled = true;
+            }
+            const bar = progressElement(form);
+
+            try {
+                const uploadId = await uploadFile(fileInput.files[0], purpose, csrfToken(form), function (ratio) {
+                    const percent = Math.round(ratio * 100) + '%';
+                    bar.style.width = percent;
+                    bar.textContent = percent;
+                });
+
+                let hidden = form.querySelector('input[name="upload_id"]');
+                if (!hidden) {
+                    hidden = document.createElement('input');
+                    hidden.type = 'hidden';
+                    hidden.name = 'upload_id';
+                    form.appendChild(hidden);
+                }
+                hidden.value = uploadId;
+                // Không gửi lại nội dung file trong form
+                fileInput.required = false;
+                fileInput.disabled = true;
+                form.submit();
+            } catch (err) {
+                alert(err.message);
+                if (submit) {
+                    submit.disabled = false;
+                }
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('form[data-chunked-upload]').forEach(bindForm);
+    });
+})();
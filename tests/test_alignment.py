@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from ai_models.alignment import banded_dtw
+
+
+def _full_dtw_cost(x, y):
+    """DTW đầy đủ O(n·m) để so với bản band"""
+    n, m = len(x), len(y)
+    cost = np.linalg.norm(x[:, None, :] - y[None, :, :], axis=-1)
+    total = np.full((n + 1, m + 1), np.inf)
+    total[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            total[i, j] = cost[i - 1, j - 1] + min(total[i - 1, j - 1], total[i - 1, j], total[i, j - 1])
+    return total[n, m]
+
+
+def _assert_valid_path(path_x, path_y, n, m):
+    assert (path_x[0], path_y[0]) == (0, 0)
+    assert (path_x[-1], path_y[-1]) == (n - 1, m - 1)
+    step_x, step_y = np.diff(path_x), np.diff(path_y)
+    assert np.all((step_x >= 0) & (step_x <= 1))
+    assert np.all((step_y >= 0) & (step_y <= 1))
+    assert np.all(step_x + step_y >= 1)
+
+
+@pytest.mark.parametrize('n, m, max_shift', [
+    (6, 2890, 30),   # clip học viên rất ngắn so với video mẫu đầy đủ
+    (2890, 6, 30),
+    (2, 5000, 1),
+    (300, 3000, 90),
+    (1000, 1010, 30),
+])
+def test_banded_dtw_very_unequal_lengths(n, m, max_shift):
+    rng = np.random.default_rng(0)
+    x = rng.random((n, 4), dtype=np.float32)
+    y = rng.random((m, 4), dtype=np.float32)
+
+    path_x, path_y, cost = banded_dtw(x, y, max_shift)
+
+    _assert_valid_path(path_x, path_y, n, m)
+    assert np.isfinite(cost)
+
+
+def test_banded_dtw_matches_full_dtw_when_band_covers_matrix():
+    rng = np.random.default_rng(1)
+    x = rng.random((8, 3), dtype=np.float32)
+    y = rng.random((60, 3), dtype=np.float32)
+
+    _, _, cost = banded_dtw(x, y, max_shift=100)
+
+    assert cost == pytest.approx(_full_dtw_cost(x, y), rel=1e-5)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from ai_models.alignment import align
+from ai_models.motion_analysis import MotionFeatures
+from ai_models.score_calculator import calculate_scores
+
+
+def _features(stability_scale=1.0, frames=200, seed=0):
+    rng = np.random.default_rng(seed)
+    return MotionFeatures(
+        sample_fps=10,
+        timestamps=np.arange(frames) / 10.0,
+        keypoints=rng.random((frames, 17, 2)),
+        confidence=np.full((frames, 17), 0.9),
+        velocity=rng.random((frames, 17)),
+        angles=rng.random((frames, 8)) * 180.0,
+        stability=rng.random(frames) * 0.6 * stability_scale,
+        energy=rng.random(frames),
+    )
+
+
+@pytest.mark.parametrize('aligned', [False, True])
+def test_clip_against_itself_scores_full_marks(aligned):
+    features = _features()
+    alignment = align(features, features, total_moves=4) if aligned else None
+
+    scores = calculate_scores(features, features, alignment=alignment)
+
+    assert scores['posture_score'] == pytest.approx(100.0)
+    assert scores['overall_score'] == pytest.approx(100.0)
+    assert scores['passed']
+
+
+def test_less_stable_than_reference_lowers_posture_only():
+    reference = _features()
+    student = _features(stability_scale=0.3)
+
+    scores = calculate_scores(student, reference, alignment=align(student, reference, total_moves=4))
+
+    assert scores['posture_score'] < 100.0
+    assert scores['technique_score'] == pytest.approx(100.0)